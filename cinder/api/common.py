@@ -24,6 +24,7 @@ import webob
 
 from cinder.api.openstack import wsgi
 from cinder.api import xmlutil
+from cinder.common import sqlalchemyutils
 from cinder.i18n import _
 from cinder.openstack.common import log as logging
 from cinder import utils
@@ -240,7 +241,7 @@ class ViewBuilder(object):
                             str(identifier))
 
     def _get_collection_links(self, request, items, collection_name,
-                              id_key="uuid"):
+                              id_key="uuid", sort_key=None):
         """Retrieve 'next' link, if applicable.
 
         The next link is included if:
@@ -256,6 +257,10 @@ class ViewBuilder(object):
                                 next link for a pagination query
         :param id_key: Attribute key used to retrieve the unique ID, used
                        to generate the next link marker for a pagination query
+        :param sort_key: Key the collection was sorted by. When given, the
+                         next link marker holds the sort key values of the
+                         last item instead of its ID, so the next page can
+                         be read without looking that item up again
         :returns links
         """
         links = []
@@ -264,7 +269,11 @@ class ViewBuilder(object):
             CONF.osapi_max_limit)
         if max_items and max_items == len(items):
             last_item = items[-1]
-            if id_key in last_item:
+            if sort_key is not None:
+                last_item_id = sqlalchemyutils.encode_marker(
+                    sqlalchemyutils.get_paging_sort_keys(sort_key),
+                    last_item)
+            elif id_key in last_item:
                 last_item_id = last_item[id_key]
             else:
                 last_item_id = last_item["id"]
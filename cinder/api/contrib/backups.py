@@ -205,6 +205,19 @@ class BackupsController(wsgi.Controller):
         """Returns a list of backups, transformed through view builder."""
         context = req.environ['cinder.context']
         filters = req.params.copy()
+        params = common.get_pagination_params(req)
+        marker = params.get('marker')
+        limit = params.get('limit')
+        filters.pop('marker', None)
+        filters.pop('limit', None)
+        # The backups are always sorted, the view builder pages through
+        # them by the sort key.
+        sort_key = filters.pop('sort_key', 'created_at')
+        sort_dir = filters.pop('sort_dir', 'desc')
+        if filters.pop('offset', None) is not None:
+            # The offset is applied by common.limited() below, so the
+            # database has to return the rows it skips as well.
+            limit = None
 
         utils.remove_invalid_filter_options(context,
                                             filters,
@@ -214,7 +227,11 @@ class BackupsController(wsgi.Controller):
             filters['display_name'] = filters['name']
             del filters['name']
 
-        backups = self.backup_api.get_all(context, search_opts=filters)
+        backups = self.backup_api.get_all(context, search_opts=filters,
+                                          marker=marker, limit=limit,
+                                          sort_key=sort_key,
+                                          sort_dir=sort_dir,
+                                          use_slave=True)
         limited_list = common.limited(backups, req)
         req.cache_db_backups(limited_list)
 
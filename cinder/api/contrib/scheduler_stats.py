@@ -49,6 +49,15 @@ class SchedulerStatsController(wsgi.Controller):
 
         return self._view_builder.pools(req, pools, detail)
 
+    def get_traces(self, req):
+        """List the traces of recent scheduling decisions."""
+        context = req.environ['cinder.context']
+        authorize(context, 'get_traces')
+
+        traces = self.scheduler_api.get_traces(context)
+
+        return self._view_builder.traces(req, traces)
+
 
 class Scheduler_stats(extensions.ExtensionDescriptor):
     """Scheduler stats support."""
@@ -63,7 +72,8 @@ class Scheduler_stats(extensions.ExtensionDescriptor):
         res = extensions.ResourceExtension(
             Scheduler_stats.alias,
             SchedulerStatsController(),
-            collection_actions={"get_pools": "GET"})
+            collection_actions={"get_pools": "GET",
+                                "get_traces": "GET"})
 
         resources.append(res)
 
@@ -33,52 +33,63 @@ class VolumeImageMetadataController(wsgi.Controller):
         super(VolumeImageMetadataController, self).__init__(*args, **kwargs)
         self.volume_api = volume.API()
 
-    def _get_all_images_metadata(self, context):
-        """Returns the image metadata for all volumes."""
+    def _get_image_metadata(self, context, volume):
+        """Returns the image metadata for the given volume."""
         try:
-            all_metadata = self.volume_api.get_volumes_image_metadata(context)
+            return self.volume_api.get_volume_image_metadata(context, volume)
+        except Exception as e:
+            LOG.debug('Problem retrieving volume image metadata. '
+                      'It will be skipped. Error: %s', e)
+            return {}
+
+    def _get_images_metadata(self, context, volume_ids, use_slave=False):
+        """Returns the image metadata for the given volumes."""
+        try:
+            all_metadata = self.volume_api.get_list_volumes_image_metadata(
+                context, volume_ids, use_slave=use_slave)
         except Exception as e:
             LOG.debug('Problem retrieving volume image metadata. '
                       'It will be skipped. Error: %s', e)
             all_metadata = {}
         return all_metadata
 
-    def _add_image_metadata(self, context, resp_volume, image_meta=None):
-        """Appends the image metadata to the given volume.
+    def _add_image_metadata(self, context, resp_volume_list,
+                            use_slave=False):
+        """Appends the image metadata to the given volumes.
+
+        The image metadata of all the volumes is read with one query.
 
         :param context: the request context
-        :param resp_volume: the response volume
-        :param image_meta: The image metadata to append, if None is provided it
-                           will be retrieved from the database. An empty dict
-                           means there is no metadata and it should not be
-                           retrieved from the db.
+        :param resp_volume_list: the response volumes
+        :param use_slave: if True, read from the slave database
         """
-        if image_meta is None:
-            try:
-                image_meta = self.volume_api.get_volume_image_metadata(
-                    context, resp_volume)
-            except Exception:
-                return
-        if image_meta:
-            resp_volume['volume_image_metadata'] = dict(
-                image_meta.iteritems())
+        image_metas = self._get_images_metadata(
+            context, [vol['id'] for vol in resp_volume_list],
+            use_slave=use_slave)
+        for vol in resp_volume_list:
+            image_meta = image_metas.get(vol['id'])
+            if image_meta:
+                vol['volume_image_metadata'] = dict(image_meta.iteritems())
 
     @wsgi.extends
     def show(self, req, resp_obj, id):
         context = req.environ['cinder.context']
         if authorize(context):
             resp_obj.attach(xml=VolumeImageMetadataTemplate())
-            self._add_image_metadata(context, resp_obj.obj['volume'])
+            resp_volume = resp_obj.obj['volume']
+            image_meta = self._get_image_metadata(context, resp_volume)
+            if image_meta:
+                resp_volume['volume_image_metadata'] = dict(
+                    image_meta.iteritems())
 
     @wsgi.extends
     def detail(self, req, resp_obj):
         context = req.environ['cinder.context']
         if authorize(context):
             resp_obj.attach(xml=VolumesImageMetadataTemplate())
-            all_meta = self._get_all_images_metadata(context)
-            for vol in list(resp_obj.obj.get('volumes', [])):
-                image_meta = all_meta.get(vol['id'], {})
-                self._add_image_metadata(context, vol, image_meta)
+            self._add_image_metadata(context,
+                                     list(resp_obj.obj.get('volumes', [])),
+                                     use_slave=True)
 
 
 class Volume_image_metadata(extensions.ExtensionDescriptor):
@@ -151,7 +151,8 @@ class SnapshotsController(wsgi.Controller):
                                             allowed_search_options)
 
         snapshots = self.volume_api.get_all_snapshots(context,
-                                                      search_opts=search_opts)
+                                                      search_opts=search_opts,
+                                                      use_slave=True)
         limited_list = common.limited(snapshots, req)
         req.cache_db_snapshots(limited_list)
         res = [entity_maker(context, snapshot) for snapshot in limited_list]
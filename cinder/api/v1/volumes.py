@@ -284,7 +284,8 @@ class VolumeController(wsgi.Controller):
         volumes = self.volume_api.get_all(context, marker=None, limit=None,
                                           sort_key='created_at',
                                           sort_dir='desc', filters=search_opts,
-                                          viewable_admin_meta=True)
+                                          viewable_admin_meta=True,
+                                          use_slave=True)
 
         volumes = [dict(vol.iteritems()) for vol in volumes]
 
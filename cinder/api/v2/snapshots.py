@@ -15,6 +15,8 @@
 
 """The volumes snapshots api."""
 
+import ast
+
 from oslo_utils import strutils
 import webob
 from webob import exc
@@ -143,13 +145,22 @@ class SnapshotsController(wsgi.Controller):
         """Returns a list of snapshots, transformed through entity_maker."""
         context = req.environ['cinder.context']
 
-        #pop out limit and offset , they are not search_opts
+        # pop out paging parameters, they are not search_opts
         search_opts = req.GET.copy()
+        params = common.get_pagination_params(req)
+        marker = params.get('marker')
+        limit = params.get('limit')
+        sort_key = search_opts.pop('sort_key', None)
+        sort_dir = search_opts.pop('sort_dir', None)
+        search_opts.pop('marker', None)
         search_opts.pop('limit', None)
-        search_opts.pop('offset', None)
+        if search_opts.pop('offset', None) is not None:
+            # The offset is applied by common.limited() below, so the
+            # database has to return the rows it skips as well.
+            limit = None
 
         #filter out invalid option
-        allowed_search_options = ('status', 'volume_id', 'name')
+        allowed_search_options = ('status', 'volume_id', 'name', 'metadata')
         utils.remove_invalid_filter_options(context, search_opts,
                                             allowed_search_options)
 
@@ -158,8 +169,21 @@ class SnapshotsController(wsgi.Controller):
             search_opts['display_name'] = search_opts['name']
             del search_opts['name']
 
+        if 'metadata' in search_opts:
+            try:
+                search_opts['metadata'] = ast.literal_eval(
+                    search_opts['metadata'])
+            except (ValueError, SyntaxError):
+                msg = _("'metadata' filter must be a dictionary")
+                raise exc.HTTPBadRequest(explanation=msg)
+
         snapshots = self.volume_api.get_all_snapshots(context,
-                                                      search_opts=search_opts)
+                                                      search_opts=search_opts,
+                                                      marker=marker,
+                                                      limit=limit,
+                                                      sort_key=sort_key,
+                                                      sort_dir=sort_dir,
+                                                      use_slave=True)
         limited_list = common.limited(snapshots, req)
         req.cache_db_snapshots(limited_list)
         res = [entity_maker(context, snapshot) for snapshot in limited_list]
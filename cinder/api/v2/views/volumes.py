@@ -128,9 +128,9 @@ class ViewBuilder(common.ViewBuilder):
         :returns: Volume data in dictionary format
         """
         volumes_list = [func(request, volume)['volume'] for volume in volumes]
-        volumes_links = self._get_collection_links(request,
-                                                   volumes,
-                                                   coll_name)
+        volumes_links = self._get_collection_links(
+            request, volumes, coll_name,
+            sort_key=request.params.get('sort_key', 'created_at'))
         volumes_dict = dict(volumes=volumes_list)
 
         if volumes_links:
@@ -238,7 +238,8 @@ class VolumeController(wsgi.Controller):
 
         volumes = self.volume_api.get_all(context, marker, limit, sort_key,
                                           sort_dir, filters,
-                                          viewable_admin_meta=True)
+                                          viewable_admin_meta=True,
+                                          use_slave=True)
 
         volumes = [dict(vol.iteritems()) for vol in volumes]
 
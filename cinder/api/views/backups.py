@@ -79,9 +79,9 @@ class ViewBuilder(common.ViewBuilder):
     def _list_view(self, func, request, backups):
         """Provide a view for a list of backups."""
         backups_list = [func(request, backup)['backup'] for backup in backups]
-        backups_links = self._get_collection_links(request,
-                                                   backups,
-                                                   self._collection_name)
+        backups_links = self._get_collection_links(
+            request, backups, self._collection_name,
+            sort_key=request.params.get('sort_key', 'created_at'))
         backups_dict = dict(backups=backups_list)
 
         if backups_links:
@@ -51,3 +51,7 @@ class ViewBuilder(common.ViewBuilder):
         pools_dict = dict(pools=plist)
 
         return pools_dict
+
+    def traces(self, request, traces):
+        """View of the traces of recent scheduling decisions."""
+        return dict(traces=traces)
@@ -237,14 +237,30 @@ class DbCommands(object):
 
     @args('age_in_days', type=int,
           help='Purge deleted rows older than age in days')
-    def purge(self, age_in_days):
+    @args('--batch_size', type=int, default=1000,
+          help='Number of rows deleted in each transaction')
+    @args('--sleep_interval', type=float, default=0,
+          help='Seconds to sleep between batches')
+    def purge(self, age_in_days, batch_size=1000, sleep_interval=0):
         """Purge deleted rows older than a given age from cinder tables."""
         age_in_days = int(age_in_days)
         if age_in_days <= 0:
             print(_("Must supply a positive, non-zero value for age"))
             exit(1)
+        if batch_size <= 0:
+            print(_("Must supply a positive, non-zero value for batch size"))
+            exit(1)
+
+        def progress(table, rows_purged):
+            print(_("Purged %(rows)d rows from table %(table)s") %
+                  {'rows': rows_purged, 'table': table})
+
         ctxt = context.get_admin_context()
-        db.purge_deleted_rows(ctxt, age_in_days)
+        purged = db.purge_deleted_rows(ctxt, age_in_days,
+                                       batch_size=batch_size,
+                                       sleep_interval=sleep_interval,
+                                       progress=progress)
+        print(_("Purged %d rows in total") % sum(purged.values()))
 
 
 class VersionCommands(object):
@@ -35,12 +35,16 @@
 from __future__ import print_function
 
 from datetime import datetime
+import json
+import os
 import sys
 import traceback
 import warnings
 
 warnings.simplefilter('once', DeprecationWarning)
 
+import eventlet
+eventlet.monkey_patch()
 from oslo_config import cfg
 
 from cinder import i18n
@@ -71,10 +75,127 @@ script_opts = [
                 default=False,
                 help="Send the volume and snapshot create and delete "
                      "notifications generated in the specified period."),
+    cfg.IntOpt('batch_size',
+               default=1000,
+               help="Number of volumes or snapshots read from the database "
+                    "at a time."),
+    cfg.IntOpt('notification_concurrency',
+               default=1,
+               help="Number of volumes or snapshots whose notifications "
+                    "are sent concurrently."),
+    cfg.StrOpt('checkpoint_file',
+               default=None,
+               help="If this option is specified then the progress of the "
+                    "audit is saved to this file after each batch, and an "
+                    "interrupted audit of the same period resumes after "
+                    "the last saved batch. The file is removed when the "
+                    "audit completes."),
 ]
 CONF.register_cli_opts(script_opts)
 
 
+def _load_checkpoint(begin, end):
+    """Return the saved progress of the audit of the given period."""
+    if not CONF.checkpoint_file or not os.path.exists(CONF.checkpoint_file):
+        return {}
+    with open(CONF.checkpoint_file) as checkpoint_file:
+        checkpoint = json.load(checkpoint_file)
+    if (checkpoint.get('begin') != str(begin) or
+            checkpoint.get('end') != str(end)):
+        return {}
+    return checkpoint
+
+
+def _save_checkpoint(begin, end, resource, marker):
+    if not CONF.checkpoint_file:
+        return
+    checkpoint = {'begin': str(begin), 'end': str(end),
+                  'resource': resource, 'marker': marker}
+    # Write a new file and rename it, so that an interruption never
+    # leaves a partly written checkpoint behind.
+    tmp_file = CONF.checkpoint_file + '.tmp'
+    with open(tmp_file, 'w') as checkpoint_file:
+        json.dump(checkpoint, checkpoint_file)
+    os.rename(tmp_file, CONF.checkpoint_file)
+
+
+def _get_active_by_window(get_active_by_window, admin_context, begin, end,
+                          marker):
+    """Yield the rows active during the period, in batches."""
+    while True:
+        rows = get_active_by_window(admin_context, begin, end,
+                                    marker=marker, limit=CONF.batch_size,
+                                    use_slave=True)
+        if not rows:
+            return
+        yield rows
+        if len(rows) < CONF.batch_size:
+            return
+        marker = rows[-1].id
+
+
+def _notify(LOG, notify, admin_context, obj_ref, event_type, extra_info,
+            resource):
+    try:
+        notify(admin_context, obj_ref, event_type,
+               extra_usage_info=extra_info)
+    except Exception as e:
+        LOG.error(_LE("Failed to send %(event_type)s notification for "
+                      "%(resource)s %(id)s."),
+                  {'event_type': event_type, 'resource': resource,
+                   'id': obj_ref.id})
+        print(traceback.format_exc(e))
+
+
+def _notify_usage(LOG, notify, admin_context, obj_ref, begin, end,
+                  extra_info, resource):
+    """Send the usage notifications of a volume or snapshot."""
+    _notify(LOG, notify, admin_context, obj_ref, 'exists', extra_info,
+            resource)
+    if not CONF.send_actions:
+        return
+
+    for action, at in (('create', obj_ref.created_at),
+                       ('delete', obj_ref.deleted_at)):
+        if at and at > begin and at < end:
+            local_extra_info = {
+                'audit_period_beginning': str(at),
+                'audit_period_ending': str(at),
+            }
+            try:
+                notify(admin_context, obj_ref, action + '.start',
+                       extra_usage_info=local_extra_info)
+                notify(admin_context, obj_ref, action + '.end',
+                       extra_usage_info=local_extra_info)
+            except Exception as e:
+                LOG.error(_LE("Failed to send %(action)s notification for "
+                              "%(resource)s %(id)s."),
+                          {'action': action, 'resource': resource,
+                           'id': obj_ref.id})
+                print(traceback.format_exc(e))
+
+
+def _audit(LOG, admin_context, begin, end, extra_info, resource,
+           get_active_by_window, notify, marker):
+    """Send the notifications of a resource, a batch at a time.
+
+    Returns the number of volumes or snapshots notified about.
+    """
+    pool = eventlet.GreenPool(CONF.notification_concurrency)
+    count = 0
+    for rows in _get_active_by_window(get_active_by_window, admin_context,
+                                      begin, end, marker):
+        for obj_ref in rows:
+            pool.spawn_n(_notify_usage, LOG, notify, admin_context, obj_ref,
+                         begin, end, extra_info, resource)
+        pool.waitall()
+        count += len(rows)
+        LOG.debug("Sent notifications for %(count)d %(resource)ss.",
+                  {'count': count, 'resource': resource})
+        _save_checkpoint(begin, end, resource, rows[-1].id)
+    return count
+
+
 def main():
     admin_context = context.get_admin_context()
     CONF(sys.argv[1:], project='cinder',
@@ -103,155 +224,24 @@ def main():
         'audit_period_ending': str(end),
     }
 
-    volumes = db.volume_get_active_by_window(admin_context,
-                                             begin,
-                                             end)
-    print(_("Found %d volumes") % len(volumes))
-    for volume_ref in volumes:
-        try:
-            LOG.debug("Send exists notification for <volume_id: "
-                      "%(volume_id)s> <project_id %(project_id)s> "
-                      "<%(extra_info)s>" %
-                      {'volume_id': volume_ref.id,
-                       'project_id': volume_ref.project_id,
-                       'extra_info': extra_info})
-            cinder.volume.utils.notify_about_volume_usage(
-                admin_context,
-                volume_ref,
-                'exists', extra_usage_info=extra_info)
-        except Exception as e:
-            LOG.error(_LE("Failed to send exists notification"
-                          " for volume %s.") %
-                      volume_ref.id)
-            print(traceback.format_exc(e))
-
-        if (CONF.send_actions and
-                volume_ref.created_at > begin and
-                volume_ref.created_at < end):
-            try:
-                local_extra_info = {
-                    'audit_period_beginning': str(volume_ref.created_at),
-                    'audit_period_ending': str(volume_ref.created_at),
-                }
-                LOG.debug("Send create notification for "
-                          "<volume_id: %(volume_id)s> "
-                          "<project_id %(project_id)s> <%(extra_info)s>" %
-                          {'volume_id': volume_ref.id,
-                           'project_id': volume_ref.project_id,
-                           'extra_info': local_extra_info})
-                cinder.volume.utils.notify_about_volume_usage(
-                    admin_context,
-                    volume_ref,
-                    'create.start', extra_usage_info=local_extra_info)
-                cinder.volume.utils.notify_about_volume_usage(
-                    admin_context,
-                    volume_ref,
-                    'create.end', extra_usage_info=local_extra_info)
-            except Exception as e:
-                LOG.error(_LE("Failed to send create notification for "
-                              "volume %s.") % volume_ref.id)
-                print(traceback.format_exc(e))
-
-        if (CONF.send_actions and volume_ref.deleted_at and
-                volume_ref.deleted_at > begin and
-                volume_ref.deleted_at < end):
-            try:
-                local_extra_info = {
-                    'audit_period_beginning': str(volume_ref.deleted_at),
-                    'audit_period_ending': str(volume_ref.deleted_at),
-                }
-                LOG.debug("Send delete notification for "
-                          "<volume_id: %(volume_id)s> "
-                          "<project_id %(project_id)s> <%(extra_info)s>" %
-                          {'volume_id': volume_ref.id,
-                           'project_id': volume_ref.project_id,
-                           'extra_info': local_extra_info})
-                cinder.volume.utils.notify_about_volume_usage(
-                    admin_context,
-                    volume_ref,
-                    'delete.start', extra_usage_info=local_extra_info)
-                cinder.volume.utils.notify_about_volume_usage(
-                    admin_context,
-                    volume_ref,
-                    'delete.end', extra_usage_info=local_extra_info)
-            except Exception as e:
-                LOG.error(_LE("Failed to send delete notification for volume "
-                              "%s.") % volume_ref.id)
-                print(traceback.format_exc(e))
-
-    snapshots = db.snapshot_get_active_by_window(admin_context,
-                                                 begin,
-                                                 end)
-    print(_("Found %d snapshots") % len(snapshots))
-    for snapshot_ref in snapshots:
-        try:
-            LOG.debug("Send notification for <snapshot_id: %(snapshot_id)s> "
-                      "<project_id %(project_id)s> <%(extra_info)s>" %
-                      {'snapshot_id': snapshot_ref.id,
-                       'project_id': snapshot_ref.project_id,
-                       'extra_info': extra_info})
-            cinder.volume.utils.notify_about_snapshot_usage(admin_context,
-                                                            snapshot_ref,
-                                                            'exists',
-                                                            extra_info)
-        except Exception as e:
-            LOG.error(_LE("Failed to send exists notification "
-                          "for snapshot %s.")
-                      % snapshot_ref.id)
-            print(traceback.format_exc(e))
-
-        if (CONF.send_actions and
-                snapshot_ref.created_at > begin and
-                snapshot_ref.created_at < end):
-            try:
-                local_extra_info = {
-                    'audit_period_beginning': str(snapshot_ref.created_at),
-                    'audit_period_ending': str(snapshot_ref.created_at),
-                }
-                LOG.debug("Send create notification for "
-                          "<snapshot_id: %(snapshot_id)s> "
-                          "<project_id %(project_id)s> <%(extra_info)s>" %
-                          {'snapshot_id': snapshot_ref.id,
-                           'project_id': snapshot_ref.project_id,
-                           'extra_info': local_extra_info})
-                cinder.volume.utils.notify_about_snapshot_usage(
-                    admin_context,
-                    snapshot_ref,
-                    'create.start', extra_usage_info=local_extra_info)
-                cinder.volume.utils.notify_about_snapshot_usage(
-                    admin_context,
-                    snapshot_ref,
-                    'create.end', extra_usage_info=local_extra_info)
-            except Exception as e:
-                LOG.error(_LE("Failed to send create notification for snapshot"
-                              "%s.") % snapshot_ref.id)
-                print(traceback.format_exc(e))
-
-        if (CONF.send_actions and snapshot_ref.deleted_at and
-                snapshot_ref.deleted_at > begin and
-                snapshot_ref.deleted_at < end):
-            try:
-                local_extra_info = {
-                    'audit_period_beginning': str(snapshot_ref.deleted_at),
-                    'audit_period_ending': str(snapshot_ref.deleted_at),
-                }
-                LOG.debug("Send delete notification for "
-                          "<snapshot_id: %(snapshot_id)s> "
-                          "<project_id %(project_id)s> <%(extra_info)s>" %
-                          {'snapshot_id': snapshot_ref.id,
-                           'project_id': snapshot_ref.project_id,
-                           'extra_info': local_extra_info})
-                cinder.volume.utils.notify_about_snapshot_usage(
-                    admin_context,
-                    snapshot_ref,
-                    'delete.start', extra_usage_info=local_extra_info)
-                cinder.volume.utils.notify_about_snapshot_usage(
-                    admin_context,
-                    snapshot_ref,
-                    'delete.end', extra_usage_info=local_extra_info)
-            except Exception as e:
-                LOG.error(_LE("Failed to send delete notification for snapshot"
-                              "%s.") % snapshot_ref.id)
-                print(traceback.format_exc(e))
-
+    checkpoint = _load_checkpoint(begin, end)
+    if checkpoint:
+        print(_("Resuming after %(resource)s %(marker)s") % checkpoint)
+
+    if checkpoint.get('resource') != 'snapshot':
+        count = _audit(LOG, admin_context, begin, end, extra_info, 'volume',
+                       db.volume_get_active_by_window,
+                       cinder.volume.utils.notify_about_volume_usage,
+                       checkpoint.get('marker'))
+        print(_("Found %d volumes") % count)
+        checkpoint = {}
+
+    count = _audit(LOG, admin_context, begin, end, extra_info, 'snapshot',
+                   db.snapshot_get_active_by_window,
+                   cinder.volume.utils.notify_about_snapshot_usage,
+                   checkpoint.get('marker'))
+    print(_("Found %d snapshots") % count)
+
+    if CONF.checkpoint_file and os.path.exists(CONF.checkpoint_file):
+        os.remove(CONF.checkpoint_file)
     print(_("Volume usage audit completed"))
@@ -18,6 +18,10 @@
 
 """Implementation of paginate query."""
 
+import base64
+
+from oslo_serialization import jsonutils
+from oslo_utils import timeutils
 import sqlalchemy
 
 from cinder import exception
@@ -28,9 +32,58 @@ from cinder.openstack.common import log as logging
 LOG = logging.getLogger(__name__)
 
 
+def get_paging_sort_keys(sort_key):
+    """Return the sort keys used to page through results sorted by sort_key.
+
+    created_at and id are appended so that the ordering is total.
+    """
+    sort_keys = [sort_key]
+    for key in ('created_at', 'id'):
+        if key not in sort_keys:
+            sort_keys.append(key)
+    return sort_keys
+
+
+def encode_marker(sort_keys, item):
+    """Return an opaque marker continuing a listing after item.
+
+    The marker holds the values of the sort keys for item, so the next page
+    can be fetched without looking the item up again.
+    """
+    values = [jsonutils.to_primitive(item[key]) for key in sort_keys]
+    marker = jsonutils.dumps({'k': sort_keys, 'v': values})
+    return base64.urlsafe_b64encode(marker)
+
+
+def decode_marker(marker, model, sort_keys):
+    """Return the sort key values held in a marker from encode_marker().
+
+    Returns None if marker is not such a marker, e.g. a plain id.
+    """
+    try:
+        decoded = jsonutils.loads(base64.urlsafe_b64decode(str(marker)))
+        keys = decoded['k']
+        values = decoded['v']
+    except (TypeError, ValueError, KeyError, UnicodeError):
+        return None
+    if keys != sort_keys or len(values) != len(sort_keys):
+        raise exception.InvalidInput(
+            reason=_('The marker does not match the sort keys.'))
+
+    for index, sort_key in enumerate(sort_keys):
+        column_type = getattr(getattr(model, sort_key, None), 'type', None)
+        if (values[index] is not None and
+                isinstance(column_type, sqlalchemy.DateTime)):
+            try:
+                values[index] = timeutils.parse_strtime(values[index])
+            except (TypeError, ValueError):
+                raise exception.InvalidInput(reason=_('Invalid marker.'))
+    return values
+
+
 # copied from glance/db/sqlalchemy/api.py
 def paginate_query(query, model, limit, sort_keys, marker=None,
-                   sort_dir=None, sort_dirs=None):
+                   sort_dir=None, sort_dirs=None, marker_values=None):
     """Returns a query with sorting / pagination criteria added.
 
     Pagination works by requiring a unique sort_key, specified by sort_keys.
@@ -46,7 +99,11 @@ def paginate_query(query, model, limit, sort_keys, marker=None,
 
     Typically, the id of the last row is used as the client-facing pagination
     marker, then the actual marker object must be fetched from the db and
-    passed in to us as marker.
+    passed in to us as marker.  Alternatively the values of the sort keys
+    of the last row, e.g. from decode_marker(), are passed as marker_values.
+
+    The criteria above are also bounded by k1 >= X1 (or k1 <= X1), so that
+    the database can answer them with a range scan of an index on k1.
 
     :param query: the query object to which we should add paging/sorting
     :param model: the ORM model class
@@ -56,6 +113,8 @@ def paginate_query(query, model, limit, sort_keys, marker=None,
                     results after this value.
     :param sort_dir: direction in which results should be sorted (asc, desc)
     :param sort_dirs: per-column array of sort_dirs, corresponding to sort_keys
+    :param marker_values: values of sort_keys for the last item of the
+                          previous page, used instead of marker
 
     :rtype: sqlalchemy.orm.query.Query
     :return: The query with sorting/pagination added.
@@ -98,6 +157,7 @@ def paginate_query(query, model, limit, sort_keys, marker=None,
             v = getattr(marker, sort_key)
             marker_values.append(v)
 
+    if marker_values is not None:
         # Build up an array of sort criteria as in the docstring
         criteria_list = []
         for i in xrange(0, len(sort_keys)):
@@ -121,6 +181,15 @@ def paginate_query(query, model, limit, sort_keys, marker=None,
         f = sqlalchemy.sql.or_(*criteria_list)
         query = query.filter(f)
 
+        # Redundant with the criteria, but lets the leading key be used
+        # for an index range scan.
+        if marker_values[0] is not None:
+            model_attr = getattr(model, sort_keys[0])
+            if sort_dirs[0] == 'desc':
+                query = query.filter(model_attr <= marker_values[0])
+            else:
+                query = query.filter(model_attr >= marker_values[0])
+
     if limit is not None:
         query = query.limit(limit)
 
@@ -103,9 +103,10 @@ def service_get_all(context, disabled=None):
     return IMPL.service_get_all(context, disabled)
 
 
-def service_get_all_by_topic(context, topic, disabled=None):
+def service_get_all_by_topic(context, topic, disabled=None, use_slave=False):
     """Get all services for a given topic."""
-    return IMPL.service_get_all_by_topic(context, topic, disabled=disabled)
+    return IMPL.service_get_all_by_topic(context, topic, disabled=disabled,
+                                         use_slave=use_slave)
 
 
 def service_get_by_args(context, host, binary):
@@ -127,6 +128,15 @@ def service_update(context, service_id, values):
     return IMPL.service_update(context, service_id, values)
 
 
+def service_heartbeat(context, service_id, availability_zone):
+    """Record a state report of a service.
+
+    Raises ServiceNotFound if service does not exist.
+
+    """
+    return IMPL.service_heartbeat(context, service_id, availability_zone)
+
+
 ###################
 
 
@@ -167,6 +177,11 @@ def volume_data_get_for_host(context, host, count_only=False):
                                          count_only)
 
 
+def volume_count_get_by_host(context, hosts):
+    """Get a dict of host to volume_count for the given hosts."""
+    return IMPL.volume_count_get_by_host(context, hosts)
+
+
 def volume_data_get_for_project(context, project_id):
     """Get (volume_count, gigabytes) for project."""
     return IMPL.volume_data_get_for_project(context, project_id)
@@ -193,10 +208,10 @@ def volume_get(context, volume_id):
 
 
 def volume_get_all(context, marker, limit, sort_key, sort_dir,
-                   filters=None):
+                   filters=None, use_slave=False):
     """Get all volumes."""
     return IMPL.volume_get_all(context, marker, limit, sort_key, sort_dir,
-                               filters=filters)
+                               filters=filters, use_slave=use_slave)
 
 
 def volume_get_all_by_host(context, host):
@@ -210,10 +225,11 @@ def volume_get_all_by_group(context, group_id):
 
 
 def volume_get_all_by_project(context, project_id, marker, limit, sort_key,
-                              sort_dir, filters=None):
+                              sort_dir, filters=None, use_slave=False):
     """Get all volumes belonging to a project."""
     return IMPL.volume_get_all_by_project(context, project_id, marker, limit,
-                                          sort_key, sort_dir, filters=filters)
+                                          sort_key, sort_dir, filters=filters,
+                                          use_slave=use_slave)
 
 
 def volume_get_iscsi_target_num(context, volume_id):
@@ -248,14 +264,23 @@ def snapshot_get(context, snapshot_id):
     return IMPL.snapshot_get(context, snapshot_id)
 
 
-def snapshot_get_all(context):
+def snapshot_get_all(context, filters=None, marker=None, limit=None,
+                     sort_key=None, sort_dir=None, use_slave=False):
     """Get all snapshots."""
-    return IMPL.snapshot_get_all(context)
+    return IMPL.snapshot_get_all(context, filters=filters, marker=marker,
+                                 limit=limit, sort_key=sort_key,
+                                 sort_dir=sort_dir, use_slave=use_slave)
 
 
-def snapshot_get_all_by_project(context, project_id):
+def snapshot_get_all_by_project(context, project_id, filters=None,
+                                marker=None, limit=None, sort_key=None,
+                                sort_dir=None, use_slave=False):
     """Get all snapshots belonging to a project."""
-    return IMPL.snapshot_get_all_by_project(context, project_id)
+    return IMPL.snapshot_get_all_by_project(context, project_id,
+                                            filters=filters, marker=marker,
+                                            limit=limit, sort_key=sort_key,
+                                            sort_dir=sort_dir,
+                                            use_slave=use_slave)
 
 
 def snapshot_get_all_for_cgsnapshot(context, project_id):
@@ -284,12 +309,16 @@ def snapshot_data_get_for_project(context, project_id, volume_type_id=None):
                                               volume_type_id)
 
 
-def snapshot_get_active_by_window(context, begin, end=None, project_id=None):
+def snapshot_get_active_by_window(context, begin, end=None, project_id=None,
+                                  marker=None, limit=None, use_slave=False):
     """Get all the snapshots inside the window.
 
-    Specifying a project_id will filter for a certain project.
+    Specifying a project_id will filter for a certain project.  Snapshots
+    are ordered by id, marker and limit allow getting them in batches.
     """
-    return IMPL.snapshot_get_active_by_window(context, begin, end, project_id)
+    return IMPL.snapshot_get_active_by_window(context, begin, end, project_id,
+                                              marker=marker, limit=limit,
+                                              use_slave=use_slave)
 
 
 ####################
@@ -435,12 +464,16 @@ def volume_type_destroy(context, id):
     return IMPL.volume_type_destroy(context, id)
 
 
-def volume_get_active_by_window(context, begin, end=None, project_id=None):
+def volume_get_active_by_window(context, begin, end=None, project_id=None,
+                                marker=None, limit=None, use_slave=False):
     """Get all the volumes inside the window.
 
-    Specifying a project_id will filter for a certain project.
+    Specifying a project_id will filter for a certain project.  Volumes are
+    ordered by id, marker and limit allow getting them in batches.
     """
-    return IMPL.volume_get_active_by_window(context, begin, end, project_id)
+    return IMPL.volume_get_active_by_window(context, begin, end, project_id,
+                                            marker=marker, limit=limit,
+                                            use_slave=use_slave)
 
 
 def volume_type_access_get_all(context, type_id):
@@ -590,6 +623,12 @@ def volume_glance_metadata_get_all(context):
     return IMPL.volume_glance_metadata_get_all(context)
 
 
+def volume_glance_metadata_list_get(context, volume_id_list, use_slave=False):
+    """Return the glance metadata for the specified volumes."""
+    return IMPL.volume_glance_metadata_list_get(context, volume_id_list,
+                                                use_slave=use_slave)
+
+
 def volume_glance_metadata_get(context, volume_id):
     """Return the glance metadata for a volume."""
     return IMPL.volume_glance_metadata_get(context, volume_id)
@@ -765,9 +804,12 @@ def backup_get(context, backup_id):
     return IMPL.backup_get(context, backup_id)
 
 
-def backup_get_all(context, filters=None):
+def backup_get_all(context, filters=None, marker=None, limit=None,
+                   sort_key=None, sort_dir=None, use_slave=False):
     """Get all backups."""
-    return IMPL.backup_get_all(context, filters=filters)
+    return IMPL.backup_get_all(context, filters=filters, marker=marker,
+                               limit=limit, sort_key=sort_key,
+                               sort_dir=sort_dir, use_slave=use_slave)
 
 
 def backup_get_all_by_host(context, host):
@@ -780,10 +822,15 @@ def backup_create(context, values):
     return IMPL.backup_create(context, values)
 
 
-def backup_get_all_by_project(context, project_id, filters=None):
+def backup_get_all_by_project(context, project_id, filters=None, marker=None,
+                              limit=None, sort_key=None, sort_dir=None,
+                              use_slave=False):
     """Get all backups belonging to a project."""
     return IMPL.backup_get_all_by_project(context, project_id,
-                                          filters=filters)
+                                          filters=filters, marker=marker,
+                                          limit=limit, sort_key=sort_key,
+                                          sort_dir=sort_dir,
+                                          use_slave=use_slave)
 
 
 def backup_update(context, backup_id, values):
@@ -909,10 +956,61 @@ def cgsnapshot_destroy(context, cgsnapshot_id):
     return IMPL.cgsnapshot_destroy(context, cgsnapshot_id)
 
 
-def purge_deleted_rows(context, age_in_days):
+###################
+
+
+def image_volume_cache_create(context, host, image_id, image_updated_at,
+                              volume_id, size, image_checksum=None):
+    """Create a new image volume cache entry."""
+    return IMPL.image_volume_cache_create(context,
+                                          host,
+                                          image_id,
+                                          image_updated_at,
+                                          volume_id,
+                                          size,
+                                          image_checksum=image_checksum)
+
+
+def image_volume_cache_delete(context, volume_id):
+    """Delete an image volume cache entry specified by volume id."""
+    return IMPL.image_volume_cache_delete(context, volume_id)
+
+
+def image_volume_cache_get_and_update_last_used(context, image_id, host):
+    """Query for an image volume cache entry and mark it as used."""
+    return IMPL.image_volume_cache_get_and_update_last_used(context,
+                                                            image_id,
+                                                            host)
+
+
+def image_volume_cache_get_by_volume_id(context, volume_id):
+    """Query to see if a volume id is an image-volume contained in the cache"""
+    return IMPL.image_volume_cache_get_by_volume_id(context, volume_id)
+
+
+def image_volume_cache_get_all_for_host(context, host):
+    """Query for all image volume cache entries for a host.
+
+    Entries are ordered by last use, most recently used first.
+    """
+    return IMPL.image_volume_cache_get_all_for_host(context, host)
+
+
+###################
+
+
+def purge_deleted_rows(context, age_in_days, batch_size=1000,
+                       sleep_interval=0, progress=None):
     """Purge deleted rows older than given age from cinder tables
 
-    Raises InvalidParameterValue if age_in_days is incorrect.
-    :returns: number of deleted rows
+    Rows are deleted batch_size at a time, sleeping sleep_interval seconds
+    between batches. progress, if given, is called with the table name and
+    the number of rows purged from it so far after each batch.
+
+    Raises InvalidParameterValue if age_in_days or batch_size is incorrect.
+    :returns: dict of the number of deleted rows by table
     """
-    return IMPL.purge_deleted_rows(context, age_in_days=age_in_days)
+    return IMPL.purge_deleted_rows(context, age_in_days=age_in_days,
+                                   batch_size=batch_size,
+                                   sleep_interval=sleep_interval,
+                                   progress=progress)
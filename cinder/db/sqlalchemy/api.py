@@ -37,11 +37,13 @@ from oslo_utils import uuidutils
 import osprofiler.sqlalchemy
 import six
 import sqlalchemy
+from sqlalchemy import and_
 from sqlalchemy import MetaData
 from sqlalchemy import or_
 from sqlalchemy.orm import joinedload, joinedload_all
 from sqlalchemy.orm import RelationshipProperty
 from sqlalchemy.schema import Table
+from sqlalchemy.sql.expression import desc
 from sqlalchemy.sql.expression import literal_column
 from sqlalchemy.sql.expression import true
 from sqlalchemy.sql import func
@@ -68,6 +70,8 @@ def _create_facade_lazily():
     with _LOCK:
         global _FACADE
         if _FACADE is None:
+            # The options include slave_connection, which when set gives the
+            # facade a second engine for get_session(use_slave=True).
             _FACADE = db_session.EngineFacade(
                 CONF.database.connection,
                 **dict(CONF.database.iteritems())
@@ -82,14 +86,21 @@ def _create_facade_lazily():
         return _FACADE
 
 
-def get_engine():
+def get_engine(use_slave=False):
     facade = _create_facade_lazily()
-    return facade.get_engine()
+    return facade.get_engine(use_slave=use_slave)
 
 
-def get_session(**kwargs):
+def get_session(use_slave=False, **kwargs):
+    """Return a session, on the slave database if asked for and configured.
+
+    Sessions on the slave database, set with the slave_connection option of
+    the database group, may see data that is behind the primary by the
+    replication lag, so they must only be used for reads whose result is
+    not used to write back to the database.
+    """
     facade = _create_facade_lazily()
-    return facade.get_session(**kwargs)
+    return facade.get_session(use_slave=use_slave, **kwargs)
 
 _DEFAULT_QUOTA_NAME = 'default'
 
@@ -233,8 +244,11 @@ def model_query(context, *args, **kwargs):
     :param read_deleted: if present, overrides context's read_deleted field.
     :param project_only: if present and context is user-type, then restrict
             query to match the context's project_id.
+    :param use_slave: if True and no session is given, query the slave
+            database, see get_session().
     """
-    session = kwargs.get('session') or get_session()
+    session = kwargs.get('session') or get_session(
+        use_slave=kwargs.get('use_slave', False))
     read_deleted = kwargs.get('read_deleted') or context.read_deleted
     project_only = kwargs.get('project_only')
 
@@ -366,9 +380,9 @@ def service_get_all(context, disabled=None):
 
 
 @require_admin_context
-def service_get_all_by_topic(context, topic, disabled=None):
+def service_get_all_by_topic(context, topic, disabled=None, use_slave=False):
     query = model_query(
-        context, models.Service, read_deleted="no").\
+        context, models.Service, read_deleted="no", use_slave=use_slave).\
         filter_by(topic=topic)
 
     if disabled is not None:
@@ -438,6 +452,24 @@ def service_update(context, service_id, values):
         return service_ref
 
 
+@require_admin_context
+def service_heartbeat(context, service_id, availability_zone):
+    """Record a state report of a service.
+
+    The report count and update time of the service are bumped, and its
+    availability zone set, by a single UPDATE statement, without reading
+    the row first.
+    """
+    updated = model_query(context, models.Service, read_deleted="no").\
+        filter_by(id=service_id).\
+        update({'report_count': models.Service.report_count + 1,
+                'updated_at': timeutils.utcnow(),
+                'availability_zone': availability_zone},
+               synchronize_session=False)
+    if not updated:
+        raise exception.ServiceNotFound(service_id=service_id)
+
+
 ###################
 
 
@@ -726,17 +758,31 @@ def _reservation_create(context, uuid, usage, project_id, resource, delta,
 # NOTE(johannes): The quota code uses SQL locking to ensure races don't
 # cause under or over counting of resources. To avoid deadlocks, this
 # code always acquires the lock on quota_usages before acquiring the lock
-# on reservations.
+# on reservations. Only the quota_usages rows of the resources being
+# changed are locked, so that requests touching other resources of the
+# same project do not wait on each other.
 
-def _get_quota_usages(context, session, project_id):
+def _get_quota_usages(context, session, project_id, resources=None):
     # Broken out for testability
-    rows = model_query(context, models.QuotaUsage,
+    query = model_query(context, models.QuotaUsage,
+                        read_deleted="no",
+                        session=session).\
+        filter_by(project_id=project_id)
+    if resources is not None:
+        query = query.filter(models.QuotaUsage.resource.in_(resources))
+    rows = query.with_lockmode('update').all()
+    return dict((row.resource, row) for row in rows)
+
+
+def _get_reservation_resources(context, session, reservations):
+    """Return the resources the given reservations are for, unlocked."""
+    rows = model_query(context, models.Reservation.resource,
                        read_deleted="no",
                        session=session).\
-        filter_by(project_id=project_id).\
-        with_lockmode('update').\
+        filter(models.Reservation.uuid.in_(reservations)).\
+        distinct().\
         all()
-    return dict((row.resource, row) for row in rows)
+    return set(row.resource for row in rows)
 
 
 @require_context
@@ -749,8 +795,9 @@ def quota_reserve(context, resources, quotas, deltas, expire,
         if project_id is None:
             project_id = context.project_id
 
-        # Get the current usages
-        usages = _get_quota_usages(context, session, project_id)
+        # Get the current usages of the resources being reserved
+        usages = _get_quota_usages(context, session, project_id,
+                                   resources=deltas.keys())
 
         # Handle usage refresh
         work = set(deltas.keys())
@@ -896,7 +943,10 @@ def _quota_reservations(session, context, reservations):
 def reservation_commit(context, reservations, project_id=None):
     session = get_session()
     with session.begin():
-        usages = _get_quota_usages(context, session, project_id)
+        resources = _get_reservation_resources(context, session,
+                                               reservations)
+        usages = _get_quota_usages(context, session, project_id,
+                                   resources=resources)
 
         for reservation in _quota_reservations(session, context, reservations):
             usage = usages[reservation.resource]
@@ -912,7 +962,10 @@ def reservation_commit(context, reservations, project_id=None):
 def reservation_rollback(context, reservations, project_id=None):
     session = get_session()
     with session.begin():
-        usages = _get_quota_usages(context, session, project_id)
+        resources = _get_reservation_resources(context, session,
+                                               reservations)
+        usages = _get_quota_usages(context, session, project_id,
+                                   resources=resources)
 
         for reservation in _quota_reservations(session, context, reservations):
             usage = usages[reservation.resource]
@@ -1034,6 +1087,20 @@ def volume_data_get_for_host(context, host, count_only=False):
         return (result[0] or 0, result[1] or 0)
 
 
+@require_admin_context
+def volume_count_get_by_host(context, hosts):
+    if not hosts:
+        return {}
+    result = model_query(context,
+                         models.Volume.host,
+                         func.count(models.Volume.id),
+                         read_deleted="no").\
+        filter(models.Volume.host.in_(hosts)).\
+        group_by(models.Volume.host).\
+        all()
+    return dict(result)
+
+
 @require_admin_context
 def _volume_data_get_for_project(context, project_id, volume_type_id=None,
                                  session=None):
@@ -1185,7 +1252,7 @@ def volume_get(context, volume_id):
 
 @require_admin_context
 def volume_get_all(context, marker, limit, sort_key, sort_dir,
-                   filters=None):
+                   filters=None, use_slave=False):
     """Retrieves all volumes.
 
     :param context: context to query under
@@ -1198,9 +1265,10 @@ def volume_get_all(context, marker, limit, sort_key, sort_dir,
                     'no_migration_targets'=True causes volumes with either
                     a NULL 'migration_status' or a 'migration_status' that
                     does not start with 'target:' to be retrieved.
+    :param use_slave: if True, read from the slave database
     :returns: list of matching volumes
     """
-    session = get_session()
+    session = get_session(use_slave=use_slave)
     with session.begin():
         # Generate the query
         query = _generate_paginate_query(context, session, marker, limit,
@@ -1224,8 +1292,12 @@ def volume_get_all_by_host(context, host):
         session = get_session()
         with session.begin():
             host_attr = getattr(models.Volume, 'host')
+            # 'Host#...' is matched as the range ['Host#', 'Host$') rather
+            # than with LIKE, which any database can answer from an index
+            # on host and which is not confused by '_' in host names.
             conditions = [host_attr == host,
-                          host_attr.op('LIKE')(host + '#%')]
+                          and_(host_attr >= host + '#',
+                               host_attr < host + '$')]
             result = _volume_get_query(context).filter(or_(*conditions)).all()
             return result
     elif not host:
@@ -1240,7 +1312,7 @@ def volume_get_all_by_group(context, group_id):
 
 @require_context
 def volume_get_all_by_project(context, project_id, marker, limit, sort_key,
-                              sort_dir, filters=None):
+                              sort_dir, filters=None, use_slave=False):
     """"Retrieves all volumes in a project.
 
     :param context: context to query under
@@ -1254,9 +1326,10 @@ def volume_get_all_by_project(context, project_id, marker, limit, sort_key,
                     'no_migration_targets'=True causes volumes with either
                     a NULL 'migration_status' or a 'migration_status' that
                     does not start with 'target:' to be retrieved.
+    :param use_slave: if True, read from the slave database
     :returns: list of matching volumes
     """
-    session = get_session()
+    session = get_session(use_slave=use_slave)
     with session.begin():
         authorize_project_context(context, project_id)
         # Add in the project filter without modifying the given filters
@@ -1362,16 +1435,45 @@ def _generate_paginate_query(context, session, marker, limit, sort_key,
         if filter_dict:
             query = query.filter_by(**filter_dict)
 
-    marker_volume = None
-    if marker is not None:
-        marker_volume = _volume_get(context, marker, session)
+    sort_keys = sqlalchemyutils.get_paging_sort_keys(sort_key)
+    marker_values = _get_marker_values(context, session, models.Volume,
+                                       marker, sort_keys)
+    if marker is not None and marker_values is None:
+        raise exception.VolumeNotFound(volume_id=marker)
 
     return sqlalchemyutils.paginate_query(query, models.Volume, limit,
-                                          [sort_key, 'created_at', 'id'],
-                                          marker=marker_volume,
+                                          sort_keys,
+                                          marker_values=marker_values,
                                           sort_dir=sort_dir)
 
 
+def _get_marker_values(context, session, model, marker, sort_keys):
+    """Return the values of sort_keys for a pagination marker.
+
+    The marker is either an opaque marker holding the values, as built by
+    sqlalchemyutils.encode_marker(), or the id of the last item of the
+    previous page, in which case only the sort key columns of that item are
+    read.  Returns None if there is no marker or no such item.
+    """
+    for sort_key in sort_keys:
+        if not hasattr(model, sort_key):
+            raise exception.InvalidInput(reason='Invalid sort key')
+
+    if marker is None:
+        return None
+
+    marker_values = sqlalchemyutils.decode_marker(marker, model, sort_keys)
+    if marker_values is not None:
+        return marker_values
+
+    columns = [getattr(model, sort_key) for sort_key in sort_keys]
+    row = model_query(context, *columns, session=session,
+                      project_only=True).\
+        filter(model.id == marker).\
+        first()
+    return list(row) if row is not None else None
+
+
 @require_admin_context
 def volume_get_iscsi_target_num(context, volume_id):
     result = model_query(context, models.IscsiTarget, read_deleted="yes").\
@@ -1650,10 +1752,96 @@ def snapshot_get(context, snapshot_id):
 
 
 @require_admin_context
-def snapshot_get_all(context):
-    return model_query(context, models.Snapshot).\
-        options(joinedload('snapshot_metadata')).\
-        all()
+def snapshot_get_all(context, filters=None, marker=None, limit=None,
+                     sort_key=None, sort_dir=None, use_slave=False):
+    """Retrieves all snapshots.
+
+    If any of marker, limit, sort_key or sort_dir is given, the result is
+    paged as for volume_get_all(), sorting by created_at in descending order
+    by default.
+
+    :param filters: dictionary of filters; keys are snapshot columns,
+                    values that are lists, tuples, sets, or frozensets
+                    cause an 'IN' test to be performed, while exact
+                    matching is used for other values; 'metadata' must be
+                    a dict of key/value pairs the snapshot metadata has to
+                    contain
+    :param use_slave: if True, read from the slave database
+    """
+    session = get_session(use_slave=use_slave)
+    with session.begin():
+        query = model_query(context, models.Snapshot, session=session).\
+            options(joinedload('snapshot_metadata'))
+        query = _process_snapshot_filters(query, filters)
+        # No snapshots would match, return empty list
+        if query is None:
+            return []
+        query = _paginate_snapshot_query(context, session, query, marker,
+                                         limit, sort_key, sort_dir)
+        return query.all()
+
+
+def _process_snapshot_filters(query, filters):
+    """Apply snapshot filters to query.
+
+    Returns None if the filters will not yield any results.
+    """
+    if not filters:
+        return query
+
+    filters = filters.copy()
+    metadata = filters.pop('metadata', None)
+    # Ensure that the filter keys are columns of the model
+    for key in filters:
+        try:
+            column_attr = getattr(models.Snapshot, key)
+            # Do not allow relationship properties since those require
+            # schema specific knowledge
+            prop = getattr(column_attr, 'property')
+            if isinstance(prop, RelationshipProperty):
+                LOG.debug("'%s' filter key is not valid, it maps to a "
+                          "relationship.", key)
+                return None
+        except AttributeError:
+            LOG.debug("'%s' filter key is not valid.", key)
+            return None
+
+    filter_dict = {}
+    for key, value in filters.iteritems():
+        if isinstance(value, (list, tuple, set, frozenset)):
+            column_attr = getattr(models.Snapshot, key)
+            query = query.filter(column_attr.in_(value))
+        else:
+            filter_dict[key] = value
+    if filter_dict:
+        query = query.filter_by(**filter_dict)
+
+    if metadata is not None:
+        if not isinstance(metadata, dict):
+            LOG.debug("'metadata' filter value is not valid.")
+            return None
+        for k, v in metadata.iteritems():
+            query = query.filter(
+                models.Snapshot.snapshot_metadata.any(key=k, value=v))
+    return query
+
+
+def _paginate_snapshot_query(context, session, query, marker, limit,
+                             sort_key, sort_dir):
+    if marker is None and limit is None and sort_key is None and \
+            sort_dir is None:
+        return query
+
+    sort_keys = sqlalchemyutils.get_paging_sort_keys(sort_key or 'created_at')
+    marker_values = _get_marker_values(context, session, models.Snapshot,
+                                       marker, sort_keys)
+    if marker is not None and marker_values is None:
+        raise exception.SnapshotNotFound(snapshot_id=marker)
+
+    return sqlalchemyutils.paginate_query(query, models.Snapshot, limit,
+                                          sort_keys,
+                                          marker_values=marker_values,
+                                          sort_dir=sort_dir or 'desc')
 
 
 @require_context
@@ -1676,12 +1864,23 @@ def snapshot_get_all_for_cgsnapshot(context, cgsnapshot_id):
 
 
 @require_context
-def snapshot_get_all_by_project(context, project_id):
+def snapshot_get_all_by_project(context, project_id, filters=None,
+                                marker=None, limit=None, sort_key=None,
+                                sort_dir=None, use_slave=False):
+    """Retrieves all snapshots in a project, as snapshot_get_all()."""
     authorize_project_context(context, project_id)
-    return model_query(context, models.Snapshot).\
-        filter_by(project_id=project_id).\
-        options(joinedload('snapshot_metadata')).\
-        all()
+    session = get_session(use_slave=use_slave)
+    with session.begin():
+        query = model_query(context, models.Snapshot, session=session).\
+            filter_by(project_id=project_id).\
+            options(joinedload('snapshot_metadata'))
+        query = _process_snapshot_filters(query, filters)
+        # No snapshots would match, return empty list
+        if query is None:
+            return []
+        query = _paginate_snapshot_query(context, session, query, marker,
+                                         limit, sort_key, sort_dir)
+        return query.all()
 
 
 @require_context
@@ -1710,10 +1909,16 @@ def snapshot_data_get_for_project(context, project_id, volume_type_id=None):
 
 
 @require_context
-def snapshot_get_active_by_window(context, begin, end=None, project_id=None):
-    """Return snapshots that were active during window."""
+def snapshot_get_active_by_window(context, begin, end=None, project_id=None,
+                                  marker=None, limit=None, use_slave=False):
+    """Return snapshots that were active during window.
+
+    Snapshots are returned ordered by id; marker and limit allow reading
+    them in batches, as for volume_get_active_by_window().
+    """
 
-    query = model_query(context, models.Snapshot, read_deleted="yes")
+    query = model_query(context, models.Snapshot, read_deleted="yes",
+                        use_slave=use_slave)
     query = query.filter(or_(models.Snapshot.deleted_at == None,  # noqa
                              models.Snapshot.deleted_at > begin))
     query = query.options(joinedload(models.Snapshot.volume))
@@ -1721,8 +1926,10 @@ def snapshot_get_active_by_window(context, begin, end=None, project_id=None):
         query = query.filter(models.Snapshot.created_at < end)
     if project_id:
         query = query.filter_by(project_id=project_id)
+    if marker is not None:
+        query = query.filter(models.Snapshot.id > marker)
 
-    return query.all()
+    return query.order_by(models.Snapshot.id).limit(limit).all()
 
 
 @require_context
@@ -2148,17 +2355,30 @@ def volume_type_destroy(context, id):
 def volume_get_active_by_window(context,
                                 begin,
                                 end=None,
-                                project_id=None):
-    """Return volumes that were active during window."""
-    query = model_query(context, models.Volume, read_deleted="yes")
+                                project_id=None,
+                                marker=None,
+                                limit=None,
+                                use_slave=False):
+    """Return volumes that were active during window.
+
+    Volumes are returned ordered by id.  Given a marker, only the volumes
+    with a greater id are returned, so that with a limit the volumes can be
+    read in batches, each starting after the last volume of the previous.
+    """
+    query = model_query(context, models.Volume, read_deleted="yes",
+                        use_slave=use_slave)
     query = query.filter(or_(models.Volume.deleted_at == None,  # noqa
                              models.Volume.deleted_at > begin))
     if end:
         query = query.filter(models.Volume.created_at < end)
     if project_id:
         query = query.filter_by(project_id=project_id)
+    if marker is not None:
+        query = query.filter(models.Volume.id > marker)
 
-    return query.all()
+    # Without an explicit order the rows come back in whatever order the
+    # index picked by the database yields them.
+    return query.order_by(models.Volume.id).limit(limit).all()
 
 
 def _volume_type_access_query(context, session=None):
@@ -2661,6 +2881,22 @@ def volume_glance_metadata_get_all(context):
     return _volume_glance_metadata_get_all(context)
 
 
+@require_context
+def volume_glance_metadata_list_get(context, volume_id_list, use_slave=False):
+    """Return the Glance metadata for the specified volumes."""
+    if not volume_id_list:
+        return []
+
+    query = model_query(context, models.VolumeGlanceMetadata,
+                        use_slave=use_slave).\
+        filter(models.VolumeGlanceMetadata.volume_id.in_(volume_id_list))
+    if is_user_context(context):
+        query = query.filter(
+            models.Volume.id == models.VolumeGlanceMetadata.volume_id,
+            models.Volume.project_id == context.project_id)
+    return query.all()
+
+
 @require_context
 @require_volume_exists
 def _volume_glance_metadata_get(context, volume_id, session=None):
@@ -2839,20 +3075,39 @@ def backup_get(context, backup_id):
     return result
 
 
-def _backup_get_all(context, filters=None):
-    session = get_session()
+def _backup_get_all(context, filters=None, marker=None, limit=None,
+                    sort_key=None, sort_dir=None, use_slave=False):
+    session = get_session(use_slave=use_slave)
     with session.begin():
         # Generate the query
-        query = model_query(context, models.Backup)
+        query = model_query(context, models.Backup, session=session)
         if filters:
             query = query.filter_by(**filters)
 
+        sort_keys = sqlalchemyutils.get_paging_sort_keys(
+            sort_key or 'created_at')
+        marker_values = _get_marker_values(context, session, models.Backup,
+                                           marker, sort_keys)
+        if marker is not None and marker_values is None:
+            raise exception.BackupNotFound(backup_id=marker)
+
+        query = sqlalchemyutils.paginate_query(query, models.Backup, limit,
+                                               sort_keys,
+                                               marker_values=marker_values,
+                                               sort_dir=sort_dir or 'desc')
         return query.all()
 
 
 @require_admin_context
-def backup_get_all(context, filters=None):
-    return _backup_get_all(context, filters)
+def backup_get_all(context, filters=None, marker=None, limit=None,
+                   sort_key=None, sort_dir=None, use_slave=False):
+    """Retrieves all backups.
+
+    The result is sorted and paged as for volume_get_all(), sorting by
+    created_at in descending order by default.
+    """
+    return _backup_get_all(context, filters, marker, limit, sort_key,
+                           sort_dir, use_slave=use_slave)
 
 
 @require_admin_context
@@ -2861,7 +3116,10 @@ def backup_get_all_by_host(context, host):
 
 
 @require_context
-def backup_get_all_by_project(context, project_id, filters=None):
+def backup_get_all_by_project(context, project_id, filters=None, marker=None,
+                              limit=None, sort_key=None, sort_dir=None,
+                              use_slave=False):
+    """Retrieves all backups in a project, paged as backup_get_all()."""
 
     authorize_project_context(context, project_id)
     if not filters:
@@ -2871,7 +3129,8 @@ def backup_get_all_by_project(context, project_id, filters=None):
 
     filters['project_id'] = project_id
 
-    return _backup_get_all(context, filters)
+    return _backup_get_all(context, filters, marker, limit, sort_key,
+                           sort_dir, use_slave=use_slave)
 
 
 @require_context
@@ -3231,9 +3490,85 @@ def cgsnapshot_destroy(context, cgsnapshot_id):
                     'updated_at': literal_column('updated_at')})
 
 
+###############################
+
+
 @require_admin_context
-def purge_deleted_rows(context, age_in_days):
-    """Purge deleted rows older than age from cinder tables."""
+def image_volume_cache_create(context, host, image_id, image_updated_at,
+                              volume_id, size, image_checksum=None):
+    session = get_session()
+    with session.begin():
+        cache_entry = models.ImageVolumeCacheEntry()
+        cache_entry.host = host
+        cache_entry.image_id = image_id
+        cache_entry.image_updated_at = image_updated_at
+        cache_entry.image_checksum = image_checksum
+        cache_entry.volume_id = volume_id
+        cache_entry.size = size
+        session.add(cache_entry)
+        return cache_entry
+
+
+@require_admin_context
+def image_volume_cache_delete(context, volume_id):
+    session = get_session()
+    with session.begin():
+        session.query(models.ImageVolumeCacheEntry).\
+            filter_by(volume_id=volume_id).\
+            delete()
+
+
+@require_admin_context
+def image_volume_cache_get_and_update_last_used(context, image_id, host):
+    session = get_session()
+    with session.begin():
+        entry = session.query(models.ImageVolumeCacheEntry).\
+            filter_by(image_id=image_id).\
+            filter_by(host=host).\
+            order_by(desc(models.ImageVolumeCacheEntry.last_used)).\
+            first()
+
+        if entry:
+            entry.last_used = timeutils.utcnow()
+            entry.save(session=session)
+    return entry
+
+
+@require_admin_context
+def image_volume_cache_get_by_volume_id(context, volume_id):
+    session = get_session()
+    with session.begin():
+        return session.query(models.ImageVolumeCacheEntry).\
+            filter_by(volume_id=volume_id).\
+            first()
+
+
+@require_admin_context
+def image_volume_cache_get_all_for_host(context, host):
+    session = get_session()
+    with session.begin():
+        return session.query(models.ImageVolumeCacheEntry).\
+            filter_by(host=host).\
+            order_by(desc(models.ImageVolumeCacheEntry.last_used)).\
+            all()
+
+
+###############################
+
+
+@require_admin_context
+def purge_deleted_rows(context, age_in_days, batch_size=1000,
+                       sleep_interval=0, progress=None):
+    """Purge deleted rows older than age from cinder tables.
+
+    Rows are deleted in batches of at most batch_size rows, each in its own
+    transaction, sleeping sleep_interval seconds between batches, so that
+    no table is locked for long.  Tables are purged child tables first, in
+    foreign key order.  progress, if given, is called with the table name
+    and the number of rows purged from it so far after each batch.
+
+    :returns: dict of the number of rows purged from each table
+    """
     try:
         age_in_days = int(age_in_days)
     except ValueError:
@@ -3244,36 +3579,68 @@ def purge_deleted_rows(context, age_in_days):
         msg = _LE('Must supply a positive value for age')
         LOG.exception(msg)
         raise exception.InvalidParameterValue(msg)
+    if batch_size <= 0:
+        msg = _LE('Must supply a positive value for batch size')
+        LOG.error(msg)
+        raise exception.InvalidParameterValue(msg)
 
     engine = get_engine()
     session = get_session()
     metadata = MetaData()
     metadata.bind = engine
-    tables = []
+    table_names = set()
 
     for model_class in models.__dict__.itervalues():
         if hasattr(model_class, "__tablename__"):
-            tables.append(model_class.__tablename__)
-
-    # Reorder the list so the volumes table is last to avoid FK constraints
-    tables.remove("volumes")
-    tables.append("volumes")
-    for table in tables:
-        t = Table(table, metadata, autoload=True)
+            table_names.add(model_class.__tablename__)
+            Table(model_class.__tablename__, metadata, autoload=True)
+
+    deleted_age = datetime.now() - timedelta(days=age_in_days)
+    purged = {}
+    # sorted_tables has referenced tables first, so purge in reverse to
+    # avoid FK constraints
+    for t in reversed(metadata.sorted_tables):
+        # Tables of models which are not soft deleted have nothing to purge.
+        if t.name not in table_names or 'deleted_at' not in t.c:
+            continue
         LOG.info(_LI('Purging deleted rows older than age=%(age)d days '
                      'from table=%(table)s'), {'age': age_in_days,
-                                               'table': table})
-        deleted_age = datetime.now() - timedelta(days=age_in_days)
+                                               'table': t.name})
+        purged[t.name] = _purge_table_in_batches(
+            session, t, deleted_age, batch_size, sleep_interval, progress)
+        LOG.info(_LI("Deleted %(row)d rows from table=%(table)s"),
+                 {'row': purged[t.name], 'table': t.name})
+    return purged
+
+
+def _purge_table_in_batches(session, t, deleted_age, batch_size,
+                            sleep_interval, progress):
+    # The primary keys of each batch are selected first, MySQL does not
+    # support LIMIT in an IN subquery.
+    primary_key = list(t.primary_key.columns)[0]
+    select = sqlalchemy.select([primary_key]).\
+        where(t.c.deleted_at < deleted_age).\
+        limit(batch_size)
+    rows_purged = 0
+    while True:
         try:
             with session.begin():
-                result = session.execute(
-                    t.delete()
-                    .where(t.c.deleted_at < deleted_age))
+                keys = [row[0] for row in session.execute(select)]
+                if keys:
+                    result = session.execute(
+                        t.delete().where(primary_key.in_(keys)))
+                    rows_purged += result.rowcount
         except db_exc.DBReferenceError:
             LOG.exception(_LE('DBError detected when purging from '
-                              'table=%(table)s'), {'table': table})
+                              'table=%(table)s'), {'table': t.name})
             raise
 
-        rows_purged = result.rowcount
-        LOG.info(_LI("Deleted %(row)d rows from table=%(table)s"),
-                 {'row': rows_purged, 'table': table})
+        if not keys:
+            break
+        if progress:
+            progress(t.name, rows_purged)
+        if len(keys) < batch_size:
+            break
+        if sleep_interval:
+            time.sleep(sleep_interval)
+    return rows_purged
@@ -0,0 +1,92 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from sqlalchemy import Index, MetaData, Table
+
+from cinder.i18n import _
+from cinder.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+# MySQL limits InnoDB index keys to 767 bytes, i.e. 255 utf8 characters, so
+# long string columns are only indexed by prefix there.
+PREFIX_LENGTH = 100
+
+# (index name, table, columns, MySQL prefix lengths), based on the queries
+# in cinder/db/sqlalchemy/api.py.
+INDEXES = [
+    # volume_get_all_by_host()
+    ('volumes_host_idx', 'volumes', ('host',), None),
+    # volume_get_all_by_project(), paged by created_at
+    ('volumes_project_id_deleted_created_at_idx', 'volumes',
+     ('project_id', 'deleted', 'created_at'), {'project_id': PREFIX_LENGTH}),
+    # volume_get_all(), paged by created_at
+    ('volumes_deleted_created_at_idx', 'volumes',
+     ('deleted', 'created_at'), None),
+    # Eager loading of volume metadata
+    ('volume_metadata_volume_id_deleted_idx', 'volume_metadata',
+     ('volume_id', 'deleted'), None),
+    ('volume_admin_metadata_volume_id_deleted_idx', 'volume_admin_metadata',
+     ('volume_id', 'deleted'), None),
+    # Volume metadata filters
+    ('volume_metadata_key_value_idx', 'volume_metadata',
+     ('key', 'value'), {'key': PREFIX_LENGTH, 'value': PREFIX_LENGTH}),
+    # snapshot_get_all_by_project(), paged by created_at
+    ('snapshots_project_id_deleted_created_at_idx', 'snapshots',
+     ('project_id', 'deleted', 'created_at'), {'project_id': PREFIX_LENGTH}),
+    # snapshot_get_all_for_volume()
+    ('snapshots_volume_id_deleted_idx', 'snapshots',
+     ('volume_id', 'deleted'), None),
+    # Eager loading of snapshot metadata
+    ('snapshot_metadata_snapshot_id_deleted_idx', 'snapshot_metadata',
+     ('snapshot_id', 'deleted'), None),
+    # reservation_commit() and reservation_rollback()
+    ('reservations_uuid_idx', 'reservations', ('uuid',), None),
+]
+
+
+def _get_index(table, name):
+    for idx in table.indexes:
+        if idx.name == name:
+            return idx
+
+
+def upgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+
+    for name, table_name, columns, mysql_length in INDEXES:
+        table = Table(table_name, meta, autoload=True)
+        if _get_index(table, name):
+            LOG.info(_('Skipped adding %s because it already exists.'), name)
+            continue
+
+        kwargs = {}
+        if mysql_length:
+            kwargs['mysql_length'] = mysql_length
+        index = Index(name, *[table.c[column] for column in columns],
+                      **kwargs)
+        index.create(migrate_engine)
+
+
+def downgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+
+    for name, table_name, _columns, _mysql_length in reversed(INDEXES):
+        table = Table(table_name, meta, autoload=True)
+        index = _get_index(table, name)
+        if index:
+            index.drop(migrate_engine)
+        else:
+            LOG.info(_('Skipped removing %s because it does not exist.'),
+                     name)
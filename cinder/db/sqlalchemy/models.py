@@ -547,6 +547,24 @@ class Transfer(BASE, CinderBase):
                           'Transfer.deleted == False)')
 
 
+class ImageVolumeCacheEntry(BASE, models.ModelBase):
+    """Represents an image volume cache entry.
+
+    Entries are removed when the image volume is evicted, so unlike the
+    other models they are not soft deleted.
+    """
+    __tablename__ = 'image_volume_cache_entries'
+    __table_args__ = {'mysql_engine': 'InnoDB'}
+    id = Column(Integer, primary_key=True, nullable=False)
+    host = Column(String(255), index=True, nullable=False)
+    image_id = Column(String(36), index=True, nullable=False)
+    image_updated_at = Column(DateTime, nullable=False)
+    image_checksum = Column(String(32))
+    volume_id = Column(String(36), nullable=False)
+    size = Column(Integer, nullable=False)
+    last_used = Column(DateTime, default=lambda: timeutils.utcnow())
+
+
 def register_models():
     """Register Models and create metadata.
 
@@ -431,6 +431,12 @@ class NoValidHost(CinderException):
     message = _("No valid host was found. %(reason)s")
 
 
+class CapabilitiesVersionMismatch(CinderException):
+    message = _("Capabilities update %(version)s from %(host)s is based on "
+                "update %(base_version)s, but the last update known is "
+                "%(known_version)s.")
+
+
 class NoMoreTargets(CinderException):
     """No more available targets."""
     pass
@@ -0,0 +1,207 @@
+# Copyright (c) 2015 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Cache of image volumes, to create volumes from images by cloning.
+
+Each backend keeps at most one image volume per image, owned by the Cinder
+internal tenant, and volumes created from a cached image are cloned from it
+instead of downloading and converting the image again.  Entries are evicted
+least recently used first to stay within the size and count limits of the
+backend, and an entry is dropped when the image it was made from changed.
+"""
+
+from oslo_utils import timeutils
+
+from cinder import exception
+from cinder.i18n import _LI, _LW
+from cinder.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+
+class ImageVolumeCache(object):
+    def __init__(self, db, volume_api, max_cache_size_gb=0,
+                 max_cache_size_count=0):
+        self.db = db
+        self.volume_api = volume_api
+        self.max_cache_size_gb = int(max_cache_size_gb)
+        self.max_cache_size_count = int(max_cache_size_count)
+
+    def get_by_image_volume(self, context, volume_id):
+        return self.db.image_volume_cache_get_by_volume_id(context, volume_id)
+
+    def evict(self, context, cache_entry):
+        LOG.debug('Evicting image cache entry: %(entry)s.',
+                  {'entry': self._entry_to_str(cache_entry)})
+        self.db.image_volume_cache_delete(context, cache_entry['volume_id'])
+        self._delete_image_volume(context, cache_entry)
+
+    def get_entry(self, context, volume_ref, image_id, image_meta):
+        """Return the cache entry of an image, or None.
+
+        An entry made from an older version of the image is evicted, and
+        None returned.  A returned entry is marked as the most recently used
+        one of its host.
+        """
+        cache_entry = self.db.image_volume_cache_get_and_update_last_used(
+            context,
+            image_id,
+            volume_ref['host']
+        )
+
+        if cache_entry:
+            LOG.debug('Found image-volume cache entry: %(entry)s.',
+                      {'entry': self._entry_to_str(cache_entry)})
+
+            if self._should_update_entry(cache_entry, image_meta):
+                LOG.debug('Image-volume cache entry is out-dated, evicting: '
+                          '%(entry)s.',
+                          {'entry': self._entry_to_str(cache_entry)})
+                self.evict(context, cache_entry)
+                cache_entry = None
+
+        return cache_entry
+
+    def create_cache_entry(self, context, volume_ref, image_id, image_meta):
+        """Create a new cache entry for an image.
+
+        This assumes that the volume described by volume_ref has already been
+        created and is in an available state.
+        """
+        LOG.debug('Creating new image-volume cache entry for image '
+                  '%(image_id)s on host %(host)s.',
+                  {'image_id': image_id, 'host': volume_ref['host']})
+
+        cache_entry = self.db.image_volume_cache_create(
+            context,
+            volume_ref['host'],
+            image_id,
+            self._get_updated_at(image_meta),
+            volume_ref['id'],
+            volume_ref['size'],
+            image_checksum=image_meta.get('checksum')
+        )
+
+        LOG.debug('New image-volume cache entry created: %(entry)s.',
+                  {'entry': self._entry_to_str(cache_entry)})
+        return cache_entry
+
+    def ensure_space(self, context, space_required, host):
+        """Make room in the cache of a host for a new entry.
+
+        Least recently used entries are evicted until the new entry of
+        space_required GB fits in the limits of the cache.  Returns False,
+        evicting nothing, if the entry can never fit.
+        """
+        # Check to see if the cache is actually limited.
+        if self.max_cache_size_gb == 0 and self.max_cache_size_count == 0:
+            return True
+
+        # Make sure that we can potentially fit the image in the cache
+        # and bail out before evicting everything else to try and make
+        # room for it.
+        if (self.max_cache_size_gb != 0 and
+                space_required > self.max_cache_size_gb):
+            return False
+
+        # Assume the entries are ordered by most recently used to least used.
+        entries = self.db.image_volume_cache_get_all_for_host(context, host)
+
+        current_count = len(entries)
+
+        current_size = 0
+        for entry in entries:
+            current_size += entry['size']
+
+        # Add values for the entry we intend to create.
+        current_size += space_required
+        current_count += 1
+
+        LOG.debug('Image-volume cache for host %(host)s current_size (GB) = '
+                  '%(size_gb)s (max = %(max_gb)s), current count = %(count)s '
+                  '(max = %(max_count)s).',
+                  {'host': host,
+                   'size_gb': current_size,
+                   'max_gb': self.max_cache_size_gb,
+                   'count': current_count,
+                   'max_count': self.max_cache_size_count})
+
+        while self._over_limits(current_size, current_count) and entries:
+            entry = entries.pop()
+            LOG.debug('Reclaiming image-volume cache space; removing cache '
+                      'entry %(entry)s.', {'entry': self._entry_to_str(entry)})
+            self.evict(context, entry)
+            current_size -= entry['size']
+            current_count -= 1
+            LOG.debug('Image-volume cache for host %(host)s new size (GB) = '
+                      '%(size_gb)s, new count = %(count)s.',
+                      {'host': host,
+                       'size_gb': current_size,
+                       'count': current_count})
+
+        # Only the size limit can still be exceeded here, the new entry alone
+        # always fits in a count limit, which is at least 1 when set.
+        if self._over_limits(current_size, current_count):
+            LOG.warning(_LW('Image-volume cache for host %(host)s does '
+                            'not have enough space (GB).'),
+                        {'host': host})
+            return False
+
+        return True
+
+    def _over_limits(self, size, count):
+        # A limit of 0 means unlimited.
+        return ((self.max_cache_size_gb and size > self.max_cache_size_gb) or
+                (self.max_cache_size_count and
+                 count > self.max_cache_size_count))
+
+    def _delete_image_volume(self, context, cache_entry):
+        """Delete the image volume of an evicted cache entry."""
+        try:
+            volume_ref = self.db.volume_get(context, cache_entry['volume_id'])
+        except exception.VolumeNotFound:
+            LOG.info(_LI('Image volume %(volume_id)s of image-volume cache '
+                         'entry is already gone.'),
+                     {'volume_id': cache_entry['volume_id']})
+            return
+
+        self.volume_api.delete(context, volume_ref, force=True)
+
+    @staticmethod
+    def _get_updated_at(image_meta):
+        updated_at = image_meta['updated_at']
+        if isinstance(updated_at, basestring):
+            updated_at = timeutils.parse_isotime(updated_at)
+        # The database stores naive UTC times.
+        return timeutils.normalize_time(updated_at)
+
+    def _should_update_entry(self, cache_entry, image_meta):
+        """Ensure that the cache entry image data is still valid."""
+        if (image_meta.get('checksum') and cache_entry['image_checksum'] and
+                image_meta['checksum'] != cache_entry['image_checksum']):
+            return True
+        return cache_entry['image_updated_at'] != self._get_updated_at(
+            image_meta)
+
+    def _entry_to_str(self, cache_entry):
+        return str({
+            'id': cache_entry['id'],
+            'image_id': cache_entry['image_id'],
+            'volume_id': cache_entry['volume_id'],
+            'host': cache_entry['host'],
+            'size': cache_entry['size'],
+            'image_updated_at': cache_entry['image_updated_at'],
+            'last_used': cache_entry['last_used'],
+        })
@@ -25,7 +25,9 @@ we should look at maybe pushing this up to Oslo
 
 
 import contextlib
+import errno
 import math
+import mmap
 import os
 import tempfile
 
@@ -35,7 +37,7 @@ from oslo_utils import timeutils
 from oslo_utils import units
 
 from cinder import exception
-from cinder.i18n import _
+from cinder.i18n import _, _LI
 from cinder.openstack.common import fileutils
 from cinder.openstack.common import imageutils
 from cinder.openstack.common import log as logging
@@ -47,7 +49,22 @@ LOG = logging.getLogger(__name__)
 image_helper_opt = [cfg.StrOpt('image_conversion_dir',
                                default='$state_path/conversion',
                                help='Directory used for temporary storage '
-                                    'during image conversion'), ]
+                                    'during image conversion'),
+                    cfg.BoolOpt('image_conversion_cache_enabled',
+                                default=False,
+                                help='Keep the images converted to volume '
+                                     'formats in a cache under '
+                                     'image_conversion_dir, so that volumes '
+                                     'created later on this node from the '
+                                     'same image do not download and convert '
+                                     'it again. Only images with a checksum '
+                                     'are cached.'),
+                    cfg.IntOpt('image_conversion_cache_max_size_gb',
+                               default=20,
+                               help='Max size of the converted image cache '
+                                    'in GB. The least recently used images '
+                                    'are removed to stay below it. '
+                                    '0 => unlimited'), ]
 
 CONF = cfg.CONF
 CONF.register_opts(image_helper_opt)
@@ -189,6 +206,339 @@ def fetch_to_raw(context, image_service,
                            run_as_root=run_as_root)
 
 
+def _verify_image_info(data, image_id, size=None):
+    """Check the qemu-img info of an image to be written to a volume."""
+    virt_size = data.virtual_size / units.Gi
+
+    # NOTE(xqueralt): If the image virtual size doesn't fit in the
+    # requested volume there is no point on resizing it because it will
+    # generate an unusable image.
+    if size is not None and virt_size > size:
+        params = {'image_size': virt_size, 'volume_size': size}
+        reason = _("Size is %(image_size)dGB and doesn't fit in a "
+                   "volume of size %(volume_size)dGB.") % params
+        raise exception.ImageUnacceptable(image_id=image_id, reason=reason)
+
+    fmt = data.file_format
+    if fmt is None:
+        raise exception.ImageUnacceptable(
+            reason=_("'qemu-img info' parsing failed."),
+            image_id=image_id)
+
+    backing_file = data.backing_file
+    if backing_file is not None:
+        raise exception.ImageUnacceptable(
+            image_id=image_id,
+            reason=_("fmt=%(fmt)s backed by:%(backing_file)s")
+            % {'fmt': fmt, 'backing_file': backing_file, })
+
+
+def _verify_converted_image(dest, image_id, volume_format, run_as_root):
+    data = qemu_img_info(dest, run_as_root=run_as_root)
+    if data.file_format != volume_format:
+        raise exception.ImageUnacceptable(
+            image_id=image_id,
+            reason=_("Converted to %(vol_format)s, but format is "
+                     "now %(file_format)s") % {'vol_format': volume_format,
+                                               'file_format': data.
+                                               file_format})
+
+
+# Magic numbers of the image formats a raw image must not be, and their
+# offset in the image, as probed by qemu-img.
+IMAGE_FORMAT_MAGICS = (
+    ('qcow', 0, 'QFI\xfb'),
+    ('qed', 0, 'QED\x00'),
+    ('vmdk', 0, 'KDMV'),
+    ('vmdk', 0, 'COWD'),
+    ('vmdk', 0, '# Disk DescriptorFile'),
+    ('vhdx', 0, 'vhdxfile'),
+    ('vpc', 0, 'conectix'),
+    ('vdi', 64, '\x7f\x10\xda\xbe'),
+    ('cloop', 0, '#!/bin/sh\n#V2.0 Format\n'),
+    ('parallels', 0, 'WithoutFreeSpace'),
+    ('parallels', 0, 'WithouFreSpacExt'),
+)
+IMAGE_HEADER_SIZE = 512
+
+# O_DIRECT writes must be aligned on the logical block size of the device,
+# 4096 bytes covers both 512 byte and 4K sector devices.
+DIRECT_IO_ALIGNMENT = 4096
+STREAM_BLOCK_SIZE = units.Mi
+
+
+def _check_raw_image_header(header, image_id):
+    """Reject image data which is not raw, whatever its disk_format says.
+
+    Images in other formats may refer to backing files on the host, they
+    are only safe to write once converted by qemu-img.
+    """
+    for fmt, offset, magic in IMAGE_FORMAT_MAGICS:
+        if header[offset:offset + len(magic)] == magic:
+            raise exception.ImageUnacceptable(
+                image_id=image_id,
+                reason=_("Image data is in %s format, not raw.") % fmt)
+
+
+class _DirectIOImageWriter(object):
+    """File-like object writing raw image data to a volume device.
+
+    Image chunks are gathered in a page aligned buffer, written to the
+    device with O_DIRECT one STREAM_BLOCK_SIZE block at a time.  Nothing is
+    written until the header of the image was checked.
+    """
+
+    def __init__(self, path, image_id):
+        self.image_id = image_id
+        self.buffer = mmap.mmap(-1, STREAM_BLOCK_SIZE)
+        self.buffered = 0
+        self.written = 0
+        flags = os.O_WRONLY | getattr(os, 'O_DIRECT', 0)
+        try:
+            self.fd = os.open(path, flags)
+        except OSError as e:
+            if e.errno != errno.EINVAL:
+                raise
+            LOG.debug("O_DIRECT is not supported by %s.", path)
+            self.fd = os.open(path, os.O_WRONLY)
+
+    def write(self, data):
+        offset = 0
+        while offset < len(data):
+            length = min(len(data) - offset,
+                         STREAM_BLOCK_SIZE - self.buffered)
+            self.buffer[self.buffered:self.buffered + length] = (
+                data[offset:offset + length])
+            self.buffered += length
+            offset += length
+            if self.buffered == STREAM_BLOCK_SIZE:
+                self._flush(self.buffered)
+
+    def _flush(self, length):
+        if not self.written:
+            _check_raw_image_header(self.buffer[:IMAGE_HEADER_SIZE],
+                                    self.image_id)
+        view = buffer(self.buffer, 0, length)
+        while view:
+            written = os.write(self.fd, view)
+            view = view[written:]
+        self.written += length
+        self.buffered = 0
+
+    def close(self):
+        """Write the last partial block, padded with zeros, and sync."""
+        try:
+            if self.buffered or not self.written:
+                length = (int(math.ceil(float(self.buffered) /
+                                        DIRECT_IO_ALIGNMENT)) *
+                          DIRECT_IO_ALIGNMENT)
+                self.buffer[self.buffered:length] = (
+                    '\0' * (length - self.buffered))
+                self._flush(length)
+            os.fsync(self.fd)
+        finally:
+            os.close(self.fd)
+            self.buffer.close()
+
+
+def _can_stream_to_volume(image_meta, dest, volume_format):
+    """Whether the image can be written to dest as it is downloaded.
+
+    Raw images written to a block device need no conversion, so they are
+    streamed instead of being staged in a temporary file.  The copy then
+    runs in this process, out of reach of the blkio cgroup, so images are
+    not streamed when the copy bandwidth is limited.
+    """
+    return (volume_format == 'raw' and os.name != 'nt' and
+            image_meta and image_meta.get('disk_format') == 'raw' and
+            image_meta.get('container_format') in (None, 'bare') and
+            not CONF.volume_copy_bps_limit and
+            utils.is_blk_device(dest))
+
+
+def _download_to_device(context, image_service, image_id, dest):
+    writer = _DirectIOImageWriter(dest, image_id)
+    try:
+        image_service.download(context, image_id, writer)
+    finally:
+        writer.close()
+    return writer
+
+
+def _stream_to_volume(context, image_service, image_id, image_meta, dest,
+                      size, run_as_root):
+    image_size = image_meta.get('size')
+    if size is not None and image_size:
+        virt_size = image_size / units.Gi
+        if virt_size > size:
+            params = {'image_size': virt_size, 'volume_size': size}
+            reason = _("Size is %(image_size)dGB and doesn't fit in a "
+                       "volume of size %(volume_size)dGB.") % params
+            raise exception.ImageUnacceptable(image_id=image_id,
+                                              reason=reason)
+
+    LOG.debug("Streaming raw image %(image_id)s to %(dest)s.",
+              {'image_id': image_id, 'dest': dest})
+    start_time = timeutils.utcnow()
+    if run_as_root:
+        with utils.temporary_chown(dest):
+            writer = _download_to_device(context, image_service, image_id,
+                                         dest)
+    else:
+        writer = _download_to_device(context, image_service, image_id, dest)
+
+    duration = max(timeutils.delta_seconds(start_time, timeutils.utcnow()),
+                   1)
+    fsz_mb = writer.written / units.Mi
+    LOG.info(_LI("Image stream %(sz).2f MB at %(mbps).2f MB/s"),
+             {'sz': fsz_mb, 'mbps': fsz_mb / duration})
+
+
+def _image_conversion_cache_dir():
+    return os.path.join(CONF.image_conversion_dir, 'cache')
+
+
+def _use_image_conversion_cache(image_meta):
+    # Images are cached by checksum, so that an image whose data changed is
+    # not mistaken for the cached one.  Cached images are shared with hard
+    # links, which Windows does not have.
+    return (CONF.image_conversion_cache_enabled and
+            CONF.image_conversion_dir and os.name != 'nt' and
+            image_meta and image_meta.get('checksum'))
+
+
+def _fetch_to_cache(context, image_service, image_id, path, volume_format,
+                    user_id, project_id, run_as_root):
+    """Download and convert an image to a file of the cache."""
+    with temporary_file() as tmp:
+        fetch(context, image_service, image_id, tmp, user_id, project_id)
+
+        if is_xenserver_image(context, image_service, image_id):
+            replace_xenserver_image_with_coalesced_vhd(tmp)
+
+        _verify_image_info(qemu_img_info(tmp, run_as_root=run_as_root),
+                           image_id)
+
+        # The image is converted next to the cache and only renamed into it
+        # once complete, the cache never holds a partial image.
+        with temporary_file() as converted:
+            LOG.debug("Converting %(image_id)s to %(volume_format)s in the "
+                      "image conversion cache.",
+                      {'image_id': image_id, 'volume_format': volume_format})
+            convert_image(tmp, converted, volume_format,
+                          run_as_root=run_as_root)
+            _verify_converted_image(converted, image_id, volume_format,
+                                    run_as_root)
+            os.rename(converted, path)
+
+
+def _prune_image_conversion_cache(keep):
+    """Remove least recently used images to bring the cache under its max.
+
+    The image at path keep, just added to the cache, is never removed.
+    """
+    max_size = CONF.image_conversion_cache_max_size_gb * units.Gi
+    if not max_size:
+        return
+
+    cache_dir = _image_conversion_cache_dir()
+    entries = []
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            # Removed by another process meanwhile.
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    total_size = sum(entry[1] for entry in entries)
+    for _mtime, entry_size, path in sorted(entries):
+        if total_size <= max_size:
+            break
+        if path == keep:
+            continue
+        _remove_cached_image(path)
+        total_size -= entry_size
+
+
+def _remove_cached_image(path):
+    # The lock of the image keeps it from being removed while a concurrent
+    # request, which found it in the cache, links it.
+    key = os.path.basename(path)
+
+    @utils.synchronized('image-conversion-cache-%s' % key, external=True)
+    def _remove():
+        LOG.debug("Removing %s from the image conversion cache.", path)
+        fileutils.delete_if_exists(path)
+
+    _remove()
+
+
+@contextlib.contextmanager
+def _cached_image(context, image_service, image_id, image_meta,
+                  volume_format, user_id, project_id, run_as_root):
+    """Yield the path of an image converted to volume_format.
+
+    The image is downloaded and converted to the cache unless already
+    there.  Concurrent calls for the same image wait for the first one to
+    fill the cache instead of downloading it again.  The yielded path is a
+    hard link to the cached image, which stays valid even if the image is
+    removed from the cache meanwhile.
+    """
+    cache_dir = _image_conversion_cache_dir()
+    fileutils.ensure_tree(cache_dir)
+    key = '%s-%s.%s' % (image_id, image_meta['checksum'], volume_format)
+    path = os.path.join(cache_dir, key)
+
+    with temporary_dir() as link_dir:
+        link = os.path.join(link_dir, key)
+
+        @utils.synchronized('image-conversion-cache-%s' % key, external=True)
+        def _get_cached_image():
+            if os.path.exists(path):
+                LOG.debug("Found %s in the image conversion cache.", key)
+            else:
+                _fetch_to_cache(context, image_service, image_id, path,
+                                volume_format, user_id, project_id,
+                                run_as_root)
+            # The modification time orders the cached images by last use.
+            os.utime(path, None)
+            os.link(path, link)
+
+        @utils.synchronized('image-conversion-cache', external=True)
+        def _prune():
+            _prune_image_conversion_cache(path)
+
+        _get_cached_image()
+        _prune()
+        yield link
+
+
+def _fetch_to_volume_format_from_cache(context, image_service, image_id,
+                                       image_meta, dest, volume_format,
+                                       blocksize, user_id, project_id, size,
+                                       run_as_root):
+    with _cached_image(context, image_service, image_id, image_meta,
+                       volume_format, user_id, project_id,
+                       run_as_root) as cached:
+        data = qemu_img_info(cached, run_as_root=run_as_root)
+        _verify_image_info(data, image_id, size)
+
+        if volume_format == 'raw':
+            # The cached image is already raw, it only needs to be copied.
+            LOG.debug("Copying cached image %(image_id)s to %(dest)s.",
+                      {'image_id': image_id, 'dest': dest})
+            size_in_m = int(math.ceil(float(data.virtual_size) / units.Mi))
+            volume_utils.copy_volume(cached, dest, size_in_m, blocksize)
+        else:
+            convert_image(cached, dest, volume_format,
+                          bps_limit=CONF.volume_copy_bps_limit,
+                          run_as_root=run_as_root)
+            _verify_converted_image(dest, image_id, volume_format,
+                                    run_as_root)
+
+
 def fetch_to_volume_format(context, image_service,
                            image_id, dest, volume_format, blocksize,
                            user_id=None, project_id=None, size=None,
@@ -196,6 +546,15 @@ def fetch_to_volume_format(context, image_service,
     qemu_img = True
     image_meta = image_service.show(context, image_id)
 
+    if _use_image_conversion_cache(image_meta):
+        return _fetch_to_volume_format_from_cache(
+            context, image_service, image_id, image_meta, dest,
+            volume_format, blocksize, user_id, project_id, size, run_as_root)
+
+    if _can_stream_to_volume(image_meta, dest, volume_format):
+        return _stream_to_volume(context, image_service, image_id,
+                                 image_meta, dest, size, run_as_root)
+
     # NOTE(avishay): I'm not crazy about creating temp files which may be
     # large and cause disk full errors which would confuse users.
     # Unfortunately it seems that you can't pipe to 'qemu-img convert' because
@@ -244,51 +603,20 @@ def fetch_to_volume_format(context, image_service,
             return
 
         data = qemu_img_info(tmp, run_as_root=run_as_root)
-        virt_size = data.virtual_size / units.Gi
-
-        # NOTE(xqueralt): If the image virtual size doesn't fit in the
-        # requested volume there is no point on resizing it because it will
-        # generate an unusable image.
-        if size is not None and virt_size > size:
-            params = {'image_size': virt_size, 'volume_size': size}
-            reason = _("Size is %(image_size)dGB and doesn't fit in a "
-                       "volume of size %(volume_size)dGB.") % params
-            raise exception.ImageUnacceptable(image_id=image_id, reason=reason)
-
+        _verify_image_info(data, image_id, size)
         fmt = data.file_format
-        if fmt is None:
-            raise exception.ImageUnacceptable(
-                reason=_("'qemu-img info' parsing failed."),
-                image_id=image_id)
-
-        backing_file = data.backing_file
-        if backing_file is not None:
-            raise exception.ImageUnacceptable(
-                image_id=image_id,
-                reason=_("fmt=%(fmt)s backed by:%(backing_file)s")
-                % {'fmt': fmt, 'backing_file': backing_file, })
 
         # NOTE(jdg): I'm using qemu-img convert to write
         # to the volume regardless if it *needs* conversion or not
-        # TODO(avishay): We can speed this up by checking if the image is raw
-        # and if so, writing directly to the device. However, we need to keep
-        # check via 'qemu-img info' that what we copied was in fact a raw
-        # image and not a different format with a backing file, which may be
-        # malicious.
+        # NOTE: raw images written to a block device do not get here, they
+        # are streamed to it by _stream_to_volume(), which checks the data
+        # is in fact raw.
         LOG.debug("%s was %s, converting to %s " % (image_id, fmt,
                                                     volume_format))
         convert_image(tmp, dest, volume_format,
                       bps_limit=CONF.volume_copy_bps_limit,
                       run_as_root=run_as_root)
-
-        data = qemu_img_info(dest, run_as_root=run_as_root)
-        if data.file_format != volume_format:
-            raise exception.ImageUnacceptable(
-                image_id=image_id,
-                reason=_("Converted to %(vol_format)s, but format is "
-                         "now %(file_format)s") % {'vol_format': volume_format,
-                                                   'file_format': data.
-                                                   file_format})
+        _verify_converted_image(dest, image_id, volume_format, run_as_root)
 
 
 def upload_volume(context, image_service, image_meta, volume_path,
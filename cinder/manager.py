@@ -51,6 +51,7 @@ This module provides Manager, a base class for managers.
 
 """
 
+import copy
 
 from oslo import messaging
 from oslo_config import cfg
@@ -59,6 +60,7 @@ from cinder.db import base
 from cinder.openstack.common import log as logging
 from cinder.openstack.common import periodic_task
 from cinder.scheduler import rpcapi as scheduler_rpcapi
+from cinder import utils
 from cinder import version
 
 
@@ -109,10 +111,17 @@ class SchedulerDependentManager(Manager):
     manager.Manager directly. Updates are only sent after
     update_service_capabilities is called with non-None values.
 
+    Every update carries a version number.  After the first full report,
+    updates only carry what changed since the previous one; the schedulers
+    ask for a full report again when they miss an update.
+
     """
 
     def __init__(self, host=None, db_driver=None, service_name='undefined'):
         self.last_capabilities = None
+        # Capabilities and version of the last update sent to schedulers
+        self.published_capabilities = None
+        self.capabilities_version = 0
         self.service_name = service_name
         self.scheduler_rpcapi = scheduler_rpcapi.SchedulerAPI()
         super(SchedulerDependentManager, self).__init__(host, db_driver)
@@ -121,13 +130,29 @@ class SchedulerDependentManager(Manager):
         """Remember these capabilities to send on next periodic update."""
         self.last_capabilities = capabilities
 
+    def reset_published_capabilities(self):
+        """Make the next update a full report of the capabilities."""
+        self.published_capabilities = None
+
     @periodic_task.periodic_task
     def _publish_service_capabilities(self, context):
         """Pass data back to the scheduler at a periodic interval."""
         if self.last_capabilities:
             LOG.debug('Notifying Schedulers of capabilities ...')
+            if self.published_capabilities is None:
+                capabilities = self.last_capabilities
+                base_version = None
+            else:
+                capabilities = utils.get_capabilities_delta(
+                    self.published_capabilities, self.last_capabilities)
+                base_version = self.capabilities_version
+            self.capabilities_version += 1
             self.scheduler_rpcapi.update_service_capabilities(
                 context,
                 self.service_name,
                 self.host,
+                capabilities,
+                capabilities_version=self.capabilities_version,
+                base_version=base_version)
+            self.published_capabilities = copy.deepcopy(
                 self.last_capabilities)
@@ -17,6 +17,8 @@
 Filter support
 """
 
+import time
+
 from cinder.openstack.common.scheduler import base_handler
 
 
@@ -47,7 +49,25 @@ class BaseFilterHandler(base_handler.BaseHandler):
     """
 
     def get_filtered_objects(self, filter_classes, objs,
-                             filter_properties):
+                             filter_properties, stats=None):
+        """Return the objects that pass all filters.
+
+        If a stats list is passed in, a dict with the name, the number of
+        objects in and out and the wall time of each filter is appended
+        to it.
+        """
+        if stats is None:
+            for filter_cls in filter_classes:
+                objs = filter_cls().filter_all(objs, filter_properties)
+            return list(objs)
+
+        objs = list(objs)
         for filter_cls in filter_classes:
-            objs = filter_cls().filter_all(objs, filter_properties)
-        return list(objs)
+            start = time.time()
+            objs_in = len(objs)
+            objs = list(filter_cls().filter_all(objs, filter_properties))
+            stats.append({'name': filter_cls.__name__,
+                          'objects_in': objs_in,
+                          'objects_out': len(objs),
+                          'elapsed': time.time() - start})
+        return objs
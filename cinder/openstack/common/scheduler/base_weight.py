@@ -17,6 +17,9 @@
 Pluggable Weighing support
 """
 
+import operator
+import time
+
 from cinder.openstack.common.scheduler import base_handler
 
 
@@ -44,29 +47,50 @@ class BaseWeigher(object):
         """
         return 0.0
 
+    def _weigh_objects(self, obj_list, weight_properties):
+        """Return the weights of all objects, in the same order.
+
+        Override in a subclass to compute the whole list of weights at
+        once instead of calling _weigh_object() for each object.
+        """
+        return [self._weigh_object(obj, weight_properties)
+                for obj in obj_list]
+
     def weigh_objects(self, weighed_obj_list, weight_properties):
         """Weigh multiple objects.  Override in a subclass if you need
         need access to all objects in order to manipulate weights.
         """
         constant = self._weight_multiplier()
-        for obj in weighed_obj_list:
-            obj.weight += (constant *
-                           self._weigh_object(obj.obj, weight_properties))
+        if not constant:
+            return
+        weights = self._weigh_objects([obj.obj for obj in weighed_obj_list],
+                                      weight_properties)
+        for obj, weight in zip(weighed_obj_list, weights):
+            obj.weight += constant * weight
 
 
 class BaseWeightHandler(base_handler.BaseHandler):
     object_class = WeighedObject
 
     def get_weighed_objects(self, weigher_classes, obj_list,
-                            weighing_properties):
-        """Return a sorted (highest score first) list of WeighedObjects."""
+                            weighing_properties, stats=None):
+        """Return a sorted (highest score first) list of WeighedObjects.
+
+        If a stats list is passed in, a dict with the name and the wall
+        time of each weigher is appended to it.
+        """
 
         if not obj_list:
             return []
 
         weighed_objs = [self.object_class(obj, 0.0) for obj in obj_list]
         for weigher_cls in weigher_classes:
+            start = time.time()
             weigher = weigher_cls()
             weigher.weigh_objects(weighed_objs, weighing_properties)
+            if stats is not None:
+                stats.append({'name': weigher_cls.__name__,
+                              'elapsed': time.time() - start})
 
-        return sorted(weighed_objs, key=lambda x: x.weight, reverse=True)
+        return sorted(weighed_objs, key=operator.attrgetter('weight'),
+                      reverse=True)
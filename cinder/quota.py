@@ -18,6 +18,7 @@
 
 
 import datetime
+import time
 
 from oslo_config import cfg
 from oslo_utils import importutils
@@ -68,7 +69,14 @@ quota_opts = [
     cfg.BoolOpt('use_default_quota_class',
                 default=True,
                 help='Enables or disables use of default quota class '
-                     'with default quota.'), ]
+                     'with default quota.'),
+    cfg.IntOpt('quota_resources_cache_ttl',
+               default=10,
+               help='Number of seconds the list of quota resources, which '
+                    'includes one set per volume type, is kept in memory '
+                    'before the volume types are read again. Volume types '
+                    'created or deleted through another API worker may be '
+                    'missed for this long. Set to 0 to disable caching.'), ]
 
 CONF = cfg.CONF
 CONF.register_opts(quota_opts)
@@ -862,10 +870,26 @@ class QuotaEngine(object):
 class VolumeTypeQuotaEngine(QuotaEngine):
     """Represent the set of all quotas."""
 
+    def __init__(self, quota_driver_class=None):
+        super(VolumeTypeQuotaEngine, self).__init__(quota_driver_class)
+        self._resources = None
+        self._resources_refreshed = 0
+
     @property
     def resources(self):
-        """Fetches all possible quota resources."""
+        """Fetches all possible quota resources.
+
+        The result is kept for quota_resources_cache_ttl seconds, or until
+        invalidate_resources() is called.
+        """
+        if (self._resources is None or
+                time.time() - self._resources_refreshed >=
+                CONF.quota_resources_cache_ttl):
+            self._resources = self._load_resources()
+            self._resources_refreshed = time.time()
+        return self._resources
 
+    def _load_resources(self):
         result = {}
         # Global quotas.
         argses = [('volumes', '_sync_volumes', 'quota_volumes'),
@@ -887,6 +911,27 @@ class VolumeTypeQuotaEngine(QuotaEngine):
                 result[resource.name] = resource
         return result
 
+    def invalidate_resources(self):
+        """Drop the cached resources, e.g. after a volume type change."""
+        self._resources = None
+
+    def _refresh_if_unknown(self, names):
+        # A volume type created through another API worker may not be in
+        # the cached resources yet.
+        resources = self.resources
+        if any(name not in resources for name in names):
+            self.invalidate_resources()
+
+    def limit_check(self, context, project_id=None, **values):
+        self._refresh_if_unknown(values)
+        return super(VolumeTypeQuotaEngine, self).limit_check(
+            context, project_id=project_id, **values)
+
+    def reserve(self, context, expire=None, project_id=None, **deltas):
+        self._refresh_if_unknown(deltas)
+        return super(VolumeTypeQuotaEngine, self).reserve(
+            context, expire=expire, project_id=project_id, **deltas)
+
     def register_resource(self, resource):
         raise NotImplementedError(_("Cannot register resource"))
 
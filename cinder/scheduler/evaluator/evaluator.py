@@ -13,6 +13,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
 import operator
 import re
 
@@ -38,13 +39,13 @@ class EvalConstant(object):
     def __init__(self, toks):
         self.value = toks[0]
 
-    def eval(self):
+    def eval(self, variables):
         result = self.value
         if (isinstance(result, six.string_types) and
                 re.match("^[a-zA-Z_]+\.[a-zA-Z_]+$", result)):
             (which_dict, entry) = result.split('.')
             try:
-                result = _vars[which_dict][entry]
+                result = variables[which_dict][entry]
             except KeyError as e:
                 msg = _("KeyError: %s") % e
                 raise exception.EvaluatorParseException(msg)
@@ -73,21 +74,21 @@ class EvalSignOp(object):
     def __init__(self, toks):
         self.sign, self.value = toks[0]
 
-    def eval(self):
-        return self.operations[self.sign] * self.value.eval()
+    def eval(self, variables):
+        return self.operations[self.sign] * self.value.eval(variables)
 
 
 class EvalAddOp(object):
     def __init__(self, toks):
         self.value = toks[0]
 
-    def eval(self):
-        sum = self.value[0].eval()
+    def eval(self, variables):
+        sum = self.value[0].eval(variables)
         for op, val in _operatorOperands(self.value[1:]):
             if op == '+':
-                sum += val.eval()
+                sum += val.eval(variables)
             elif op == '-':
-                sum -= val.eval()
+                sum -= val.eval(variables)
         return sum
 
 
@@ -95,14 +96,14 @@ class EvalMultOp(object):
     def __init__(self, toks):
         self.value = toks[0]
 
-    def eval(self):
-        prod = self.value[0].eval()
+    def eval(self, variables):
+        prod = self.value[0].eval(variables)
         for op, val in _operatorOperands(self.value[1:]):
             try:
                 if op == '*':
-                    prod *= val.eval()
+                    prod *= val.eval(variables)
                 elif op == '/':
-                    prod /= float(val.eval())
+                    prod /= float(val.eval(variables))
             except ZeroDivisionError as e:
                 msg = _("ZeroDivisionError: %s") % e
                 raise exception.EvaluatorParseException(msg)
@@ -113,10 +114,10 @@ class EvalPowerOp(object):
     def __init__(self, toks):
         self.value = toks[0]
 
-    def eval(self):
-        prod = self.value[0].eval()
+    def eval(self, variables):
+        prod = self.value[0].eval(variables)
         for op, val in _operatorOperands(self.value[1:]):
-            prod = pow(prod, val.eval())
+            prod = pow(prod, val.eval(variables))
         return prod
 
 
@@ -124,8 +125,8 @@ class EvalNegateOp(object):
     def __init__(self, toks):
         self.negation, self.value = toks[0]
 
-    def eval(self):
-        return not self.value.eval()
+    def eval(self, variables):
+        return not self.value.eval(variables)
 
 
 class EvalComparisonOp(object):
@@ -142,11 +143,11 @@ class EvalComparisonOp(object):
     def __init__(self, toks):
         self.value = toks[0]
 
-    def eval(self):
-        val1 = self.value[0].eval()
+    def eval(self, variables):
+        val1 = self.value[0].eval(variables)
         for op, val in _operatorOperands(self.value[1:]):
             fn = self.operations[op]
-            val2 = val.eval()
+            val2 = val.eval(variables)
             if not fn(val1, val2):
                 break
             val1 = val2
@@ -159,12 +160,12 @@ class EvalTernaryOp(object):
     def __init__(self, toks):
         self.value = toks[0]
 
-    def eval(self):
-        condition = self.value[0].eval()
+    def eval(self, variables):
+        condition = self.value[0].eval(variables)
         if condition:
-            return self.value[2].eval()
+            return self.value[2].eval(variables)
         else:
-            return self.value[4].eval()
+            return self.value[4].eval(variables)
 
 
 class EvalFunction(object):
@@ -177,8 +178,8 @@ class EvalFunction(object):
     def __init__(self, toks):
         self.func, self.value = toks[0]
 
-    def eval(self):
-        args = self.value.eval()
+    def eval(self, variables):
+        args = self.value.eval(variables)
         if type(args) is list:
             return self.functions[self.func](*args)
         else:
@@ -189,9 +190,9 @@ class EvalCommaSeperator(object):
     def __init__(self, toks):
         self.value = toks[0]
 
-    def eval(self):
-        val1 = self.value[0].eval()
-        val2 = self.value[2].eval()
+    def eval(self, variables):
+        val1 = self.value[0].eval(variables)
+        val2 = self.value[2].eval(variables)
         if type(val2) is list:
             val_list = []
             val_list.append(val1)
@@ -206,9 +207,9 @@ class EvalBoolAndOp(object):
     def __init__(self, toks):
         self.value = toks[0]
 
-    def eval(self):
-        left = self.value[0].eval()
-        right = self.value[2].eval()
+    def eval(self, variables):
+        left = self.value[0].eval(variables)
+        right = self.value[2].eval(variables)
         return left and right
 
 
@@ -216,13 +217,17 @@ class EvalBoolOrOp(object):
     def __init__(self, toks):
         self.value = toks[0]
 
-    def eval(self):
-        left = self.value[0].eval()
-        right = self.value[2].eval()
+    def eval(self, variables):
+        left = self.value[0].eval(variables)
+        right = self.value[2].eval(variables)
         return left or right
 
+
+# Maximum number of compiled expressions kept by compile_expression().
+EXPRESSION_CACHE_SIZE = 256
+
 _parser = None
-_vars = {}
+_expression_cache = collections.OrderedDict()
 
 
 def _def_parser():
@@ -272,6 +277,50 @@ def _def_parser():
     return expr
 
 
+class Expression(object):
+    """A parsed expression which can be evaluated many times.
+
+    The parse tree holds no variable values, so one instance can be shared
+    between concurrent callers, each supplying its own variables.
+    """
+
+    def __init__(self, expression, root):
+        self.expression = expression
+        self._root = root
+
+    def evaluate(self, **kwargs):
+        """Evaluates the expression with kwargs bound as its variables."""
+        return self._root.eval(kwargs)
+
+
+def compile_expression(expression):
+    """Parses an expression, returning a reusable Expression.
+
+    Parsed expressions are kept in a least recently used cache keyed by the
+    expression text, so the grammar only runs once for each distinct
+    filter_function or goodness_function reported by the backends.
+    """
+    try:
+        compiled = _expression_cache.pop(expression)
+    except KeyError:
+        global _parser
+        if _parser is None:
+            _parser = _def_parser()
+
+        try:
+            root = _parser.parseString(expression, parseAll=True)[0]
+        except pyparsing.ParseException as e:
+            msg = _("ParseException: %s") % e
+            raise exception.EvaluatorParseException(msg)
+
+        compiled = Expression(expression, root)
+        while len(_expression_cache) >= EXPRESSION_CACHE_SIZE:
+            _expression_cache.popitem(last=False)
+
+    _expression_cache[expression] = compiled
+    return compiled
+
+
 def evaluate(expression, **kwargs):
     """Evaluates an expression.
 
@@ -281,17 +330,4 @@ def evaluate(expression, **kwargs):
     Supports both integer and floating point values, and automatic
     promotion where necessary.
     """
-    global _parser
-    if _parser is None:
-        _parser = _def_parser()
-
-    global _vars
-    _vars = kwargs
-
-    try:
-        result = _parser.parseString(expression, parseAll=True)[0]
-    except pyparsing.ParseException as e:
-        msg = _("ParseException: %s") % e
-        raise exception.EvaluatorParseException(msg)
-
-    return result.eval()
+    return compile_expression(expression).evaluate(**kwargs)
@@ -20,18 +20,46 @@ You can customize this scheduler by specifying your own volume Filters and
 Weighing Functions.
 """
 
+import collections
+
 from oslo_config import cfg
+from oslo_utils import timeutils
 
 from cinder import exception
-from cinder.i18n import _, _LW
+from cinder.i18n import _, _LE, _LW
 from cinder.openstack.common import log as logging
+from cinder import rpc
 from cinder.scheduler import driver
 from cinder.scheduler import scheduler_options
 from cinder.volume import utils
 
+
+filter_scheduler_opts = [
+    cfg.IntOpt('scheduler_trace_history',
+               default=100,
+               help='Number of recent scheduling decisions to keep traces '
+                    'of, with the time spent in each filter and weigher. '
+                    'Set to 0 to disable tracing.'),
+    cfg.IntOpt('scheduler_trace_top_hosts',
+               default=5,
+               help='Number of best weighed hosts recorded in each '
+                    'scheduling trace.'),
+    cfg.BoolOpt('scheduler_trace_notifications',
+                default=False,
+                help='Emit a scheduler.trace notification for each '
+                     'scheduling decision.'),
+]
+
 CONF = cfg.CONF
+CONF.register_opts(filter_scheduler_opts)
 LOG = logging.getLogger(__name__)
 
+# Keys the request specs of a batch must hold.  Unlike single volume
+# creates, batches are not run through the scheduler create_volume flow,
+# which fills in partial request specs from the database.
+BATCH_REQUEST_SPEC_KEYS = ('volume_id', 'snapshot_id', 'image_id',
+                           'volume_properties', 'volume_type')
+
 
 class FilterScheduler(driver.Scheduler):
     """Scheduler that can be used for filtering and weighing."""
@@ -40,6 +68,8 @@ class FilterScheduler(driver.Scheduler):
         self.cost_function_cache = None
         self.options = scheduler_options.SchedulerOptions()
         self.max_attempts = self._max_attempts()
+        self.traces = collections.deque(
+            maxlen=max(CONF.scheduler_trace_history, 0))
 
     def schedule(self, context, topic, method, *args, **kwargs):
         """The schedule() contract requires we return the one
@@ -88,6 +118,68 @@ class FilterScheduler(driver.Scheduler):
         if not weighed_host:
             raise exception.NoValidHost(reason="No weighed hosts available")
 
+        self._create_volume_on_host(context, weighed_host, request_spec,
+                                    filter_properties)
+
+    def schedule_create_volumes(self, context, request_spec_list,
+                                filter_properties_list=None):
+        """Place a batch of volumes in a single scheduling pass.
+
+        Host states are read once for the whole batch, and the capacity of
+        each chosen host is consumed before the next volume is placed, so
+        later volumes in the batch see the space taken by earlier ones.
+
+        The request specs must be complete, holding all of
+        BATCH_REQUEST_SPEC_KEYS; a volume with an incomplete one fails with
+        InvalidInput.
+
+        :returns: a list with, for each request spec, the host the volume
+                  was sent to or the exception which stopped it from being
+                  placed
+        """
+        hosts = list(self.host_manager.get_all_host_states(
+            context.elevated()))
+
+        placements = []
+        for index, request_spec in enumerate(request_spec_list):
+            filter_properties = None
+            if filter_properties_list:
+                filter_properties = filter_properties_list[index]
+            if filter_properties is None:
+                filter_properties = {}
+
+            # A failure only affects its own volume, the rest of the batch
+            # is still placed.
+            try:
+                missing = [key for key in BATCH_REQUEST_SPEC_KEYS
+                           if key not in request_spec]
+                if missing:
+                    raise exception.InvalidInput(
+                        reason=_("Request spec is missing %s") %
+                        ', '.join(missing))
+                weighed_host = self._schedule(context, request_spec,
+                                              filter_properties,
+                                              hosts=hosts)
+                if not weighed_host:
+                    raise exception.NoValidHost(
+                        reason=_("No weighed hosts available"))
+                self._create_volume_on_host(context, weighed_host,
+                                            request_spec, filter_properties)
+            except exception.NoValidHost as ex:
+                LOG.warning(_LW('Could not schedule volume %(id)s: %(ex)s'),
+                            {'id': request_spec.get('volume_id'), 'ex': ex})
+                placements.append(ex)
+            except Exception as ex:
+                LOG.exception(_LE('Failed to schedule volume %s.'),
+                              request_spec.get('volume_id'))
+                placements.append(ex)
+            else:
+                placements.append(weighed_host.obj.host)
+
+        return placements
+
+    def _create_volume_on_host(self, context, weighed_host, request_spec,
+                               filter_properties):
         host = weighed_host.obj.host
         volume_id = request_spec['volume_id']
         snapshot_id = request_spec['snapshot_id']
@@ -172,6 +264,23 @@ class FilterScheduler(driver.Scheduler):
         #TODO(zhiteng) Add filters support
         return self.host_manager.get_pools(context)
 
+    def get_traces(self, context):
+        """Return the traces of the most recent scheduling decisions."""
+        return list(self.traces)
+
+    def _record_trace(self, context, request_spec, filter_stats,
+                      weigher_stats, weighed_hosts):
+        top_hosts = weighed_hosts[:CONF.scheduler_trace_top_hosts]
+        trace = {'volume_id': request_spec.get('volume_id'),
+                 'timestamp': timeutils.strtime(),
+                 'filters': filter_stats,
+                 'weighers': weigher_stats,
+                 'weighed_hosts': [host.to_dict() for host in top_hosts]}
+        self.traces.append(trace)
+        if CONF.scheduler_trace_notifications:
+            rpc.get_notifier('scheduler').info(context, 'scheduler.trace',
+                                               trace)
+
     def _post_select_populate_filter_properties(self, filter_properties,
                                                 host_state):
         """Add additional information to the filter properties after a host has
@@ -253,9 +362,12 @@ class FilterScheduler(driver.Scheduler):
             raise exception.NoValidHost(reason=msg)
 
     def _get_weighted_candidates(self, context, request_spec,
-                                 filter_properties=None):
+                                 filter_properties=None, hosts=None):
         """Returns a list of hosts that meet the required specs,
         ordered by their fitness.
+
+        Host states are read from the host manager unless a list of them
+        is passed in through hosts.
         """
         elevated = context.elevated()
 
@@ -289,19 +401,31 @@ class FilterScheduler(driver.Scheduler):
 
         # Note: remember, we are using an iterator here. So only
         # traverse this list once.
-        hosts = self.host_manager.get_all_host_states(elevated)
+        if hosts is None:
+            hosts = self.host_manager.get_all_host_states(elevated)
+
+        tracing = self.traces.maxlen > 0
+        filter_stats = [] if tracing else None
+        weigher_stats = [] if tracing else None
 
         # Filter local hosts based on requirements ...
         hosts = self.host_manager.get_filtered_hosts(hosts,
-                                                     filter_properties)
+                                                     filter_properties,
+                                                     stats=filter_stats)
         if not hosts:
+            if tracing:
+                self._record_trace(context, request_spec, filter_stats,
+                                   weigher_stats, [])
             return []
 
         LOG.debug("Filtered %s" % hosts)
         # weighted_host = WeightedHost() ... the best
         # host for the job.
-        weighed_hosts = self.host_manager.get_weighed_hosts(hosts,
-                                                            filter_properties)
+        weighed_hosts = self.host_manager.get_weighed_hosts(
+            hosts, filter_properties, stats=weigher_stats)
+        if tracing:
+            self._record_trace(context, request_spec, filter_stats,
+                               weigher_stats, weighed_hosts)
         return weighed_hosts
 
     def _get_weighted_candidates_group(self, context, request_spec_list,
@@ -393,9 +517,11 @@ class FilterScheduler(driver.Scheduler):
 
         return weighed_hosts
 
-    def _schedule(self, context, request_spec, filter_properties=None):
+    def _schedule(self, context, request_spec, filter_properties=None,
+                  hosts=None):
         weighed_hosts = self._get_weighted_candidates(context, request_spec,
-                                                      filter_properties)
+                                                      filter_properties,
+                                                      hosts=hosts)
         if not weighed_hosts:
             LOG.warning(_LW('No weighed hosts found for volume '
                             'with properties: %s'),
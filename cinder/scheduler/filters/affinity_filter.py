@@ -25,6 +25,19 @@ LOG = logging.getLogger(__name__)
 class AffinityFilter(filters.BaseHostFilter):
     def __init__(self):
         self.volume_api = volume.API()
+        # A filter instance lives for a single filtering pass, so the hosts
+        # of the hinted volumes only need to be looked up once per pass.
+        self._affinity_hosts = {}
+
+    def _get_affinity_hosts(self, context, affinity_uuids):
+        """Return the set of hosts the given volumes live on."""
+        key = frozenset(affinity_uuids)
+        if key not in self._affinity_hosts:
+            volumes = self.volume_api.get_all(
+                context, filters={'id': affinity_uuids,
+                                  'deleted': False})
+            self._affinity_hosts[key] = set(vol['host'] for vol in volumes)
+        return self._affinity_hosts[key]
 
 
 class DifferentBackendFilter(AffinityFilter):
@@ -55,10 +68,8 @@ class DifferentBackendFilter(AffinityFilter):
             return False
 
         if affinity_uuids:
-            return not self.volume_api.get_all(
-                context, filters={'host': host_state.host,
-                                  'id': affinity_uuids,
-                                  'deleted': False})
+            return host_state.host not in self._get_affinity_hosts(
+                context, affinity_uuids)
 
         # With no different_host key
         return True
@@ -92,10 +103,8 @@ class SameBackendFilter(AffinityFilter):
             return False
 
         if affinity_uuids:
-            return self.volume_api.get_all(
-                context, filters={'host': host_state.host,
-                                  'id': affinity_uuids,
-                                  'deleted': False})
+            return host_state.host in self._get_affinity_hosts(
+                context, affinity_uuids)
 
         # With no same_host key
         return True
@@ -0,0 +1,56 @@
+# Copyright (c) 2015 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import six
+
+from cinder.openstack.common.scheduler.filters import capabilities_filter
+
+
+class CapabilitiesFilter(capabilities_filter.CapabilitiesFilter):
+    """CapabilitiesFilter that remembers the result for each pool.
+
+    Whether a pool satisfies the extra specs of a volume type can only
+    change when the pool reports new capabilities or when the extra specs
+    themselves change, so the result of the match is kept per pool, keyed
+    by the content of the extra specs, until the pool's capabilities object
+    is replaced by a new report.  The results are kept on the host state of
+    the pool, so they go away with the pool.
+    """
+
+    def host_passes(self, host_state, filter_properties):
+        resource_type = filter_properties.get('resource_type')
+        if not resource_type or not resource_type.get('extra_specs'):
+            return super(CapabilitiesFilter, self).host_passes(
+                host_state, filter_properties)
+
+        try:
+            specs_key = frozenset(
+                six.iteritems(resource_type['extra_specs']))
+        except TypeError:
+            # Unhashable spec values, just do the match every time.
+            return super(CapabilitiesFilter, self).host_passes(
+                host_state, filter_properties)
+
+        capabilities = host_state.capabilities
+        cached = host_state.capabilities_matches
+        if cached is None or cached[0] is not capabilities:
+            cached = (capabilities, {})
+            host_state.capabilities_matches = cached
+
+        matches = cached[1]
+        if specs_key not in matches:
+            matches[specs_key] = super(CapabilitiesFilter, self).host_passes(
+                host_state, filter_properties)
+        return matches[specs_key]
@@ -17,6 +17,7 @@
 Manage hosts in the current zone.
 """
 
+import time
 import UserDict
 
 from oslo_config import cfg
@@ -45,7 +46,14 @@ host_manager_opts = [
                 default=[
                     'CapacityWeigher'
                 ],
-                help='Which weigher class names to use for weighing hosts.')
+                help='Which weigher class names to use for weighing hosts.'),
+    cfg.IntOpt('scheduler_service_cache_ttl',
+               default=10,
+               help='Number of seconds the scheduler reuses the list of '
+                    'volume services read from the database.  Capability '
+                    'reports from unknown or inactive hosts refresh the '
+                    'list early.  Set to 0 to read the list on every '
+                    'scheduling request.'),
 ]
 
 CONF = cfg.CONF
@@ -95,6 +103,9 @@ class HostState(object):
         self.capabilities = None
         self.service = None
         self.host = host
+        # Results of matching extra specs against the capabilities, kept by
+        # the CapabilitiesFilter: (capabilities, {frozen extra specs: passes})
+        self.capabilities_matches = None
         self.update_capabilities(capabilities, service)
 
         self.volume_backend_name = None
@@ -345,6 +356,17 @@ class HostManager(object):
     def __init__(self):
         self.service_states = {}  # { <host>: {<service>: {cap k : v}}}
         self.host_state_map = {}
+        # Capabilities as reported by each host and the version of the last
+        # update received, used to apply incremental updates
+        self.reported_capabilities = {}
+        self.capabilities_versions = {}
+        # Cached volume services and the time they were read from the db
+        self._volume_services = None
+        self._volume_services_read_at = 0
+        self._volume_services_from_slave = False
+        # Capabilities last applied to each host state, used to skip hosts
+        # that have not reported anything new since the previous pass
+        self._applied_capabilities = {}
         self.filter_handler = filters.HostFilterHandler('cinder.scheduler.'
                                                         'filters')
         self.filter_classes = self.filter_handler.get_all_classes()
@@ -425,65 +447,121 @@ class HostManager(object):
         return good_weighers
 
     def get_filtered_hosts(self, hosts, filter_properties,
-                           filter_class_names=None):
+                           filter_class_names=None, stats=None):
         """Filter hosts and return only ones passing all filters."""
         filter_classes = self._choose_host_filters(filter_class_names)
         return self.filter_handler.get_filtered_objects(filter_classes,
                                                         hosts,
-                                                        filter_properties)
+                                                        filter_properties,
+                                                        stats=stats)
 
     def get_weighed_hosts(self, hosts, weight_properties,
-                          weigher_class_names=None):
+                          weigher_class_names=None, stats=None):
         """Weigh the hosts."""
         weigher_classes = self._choose_host_weighers(weigher_class_names)
         return self.weight_handler.get_weighed_objects(weigher_classes,
                                                        hosts,
-                                                       weight_properties)
-
-    def update_service_capabilities(self, service_name, host, capabilities):
-        """Update the per-service capabilities based on this notification."""
+                                                       weight_properties,
+                                                       stats=stats)
+
+    def update_service_capabilities(self, service_name, host, capabilities,
+                                    capabilities_version=None,
+                                    base_version=None):
+        """Update the per-service capabilities based on this notification.
+
+        If base_version is set, capabilities is a delta against the update
+        numbered base_version, as built by get_capabilities_delta().
+        CapabilitiesVersionMismatch is raised when that update is not the
+        last one received from the host.
+        """
         if service_name != 'volume':
             LOG.debug('Ignoring %(service_name)s service update '
                       'from %(host)s',
                       {'service_name': service_name, 'host': host})
             return
 
-        # Copy the capabilities, so we don't modify the original dict
+        if base_version is not None:
+            known_version = self.capabilities_versions.get(host)
+            if (known_version != base_version or
+                    host not in self.reported_capabilities):
+                raise exception.CapabilitiesVersionMismatch(
+                    host=host, version=capabilities_version,
+                    base_version=base_version, known_version=known_version)
+            capabilities = utils.apply_capabilities_delta(
+                self.reported_capabilities[host], capabilities)
+        self.reported_capabilities[host] = capabilities
+        self.capabilities_versions[host] = capabilities_version
+
+        # Copy the capabilities, so we don't modify the original dict.
+        # Host states fill backend info into the pools, so copy those too.
         capab_copy = dict(capabilities)
+        if isinstance(capab_copy.get('pools'), list):
+            capab_copy['pools'] = [dict(pool) for pool in capab_copy['pools']]
         capab_copy["timestamp"] = timeutils.utcnow()  # Reported time
         self.service_states[host] = capab_copy
 
+        # A report from a host we do not consider active means the cached
+        # service list is out of date (new, re-enabled or revived service).
+        if host not in self.host_state_map:
+            self._volume_services = None
+
         LOG.debug("Received %(service_name)s service update from "
                   "%(host)s: %(cap)s" %
                   {'service_name': service_name, 'host': host,
                    'cap': capabilities})
 
-    def _update_host_state_map(self, context):
+    def _get_volume_services(self, context, use_slave=False):
+        """Return the enabled volume services, cached for a short time.
+
+        Whether a service is up is decided from its last heartbeat, so
+        scheduling reads the services from the primary database: the lag
+        of a slave is unbounded and could make every service look down.
+        With use_slave, a list read from a slave database does as well.
+        """
+        ttl = CONF.scheduler_service_cache_ttl
+        if (self._volume_services is None or
+                time.time() - self._volume_services_read_at >= ttl or
+                (self._volume_services_from_slave and not use_slave)):
+            topic = CONF.volume_topic
+            volume_services = db.service_get_all_by_topic(context,
+                                                          topic,
+                                                          disabled=False,
+                                                          use_slave=use_slave)
+            self._volume_services = [dict(service.iteritems())
+                                     for service in volume_services]
+            self._volume_services_read_at = time.time()
+            self._volume_services_from_slave = use_slave
+            # Service records changed, so every host state must be updated
+            self._applied_capabilities = {}
+        return self._volume_services
+
+    def _update_host_state_map(self, context, use_slave=False):
 
         # Get resource usage across the available volume nodes:
-        topic = CONF.volume_topic
-        volume_services = db.service_get_all_by_topic(context,
-                                                      topic,
-                                                      disabled=False)
+        volume_services = self._get_volume_services(context,
+                                                    use_slave=use_slave)
         active_hosts = set()
         for service in volume_services:
             host = service['host']
             if not utils.service_is_up(service):
                 LOG.warn(_LW("volume service is down. (host: %s)") % host)
                 continue
+            active_hosts.add(host)
             capabilities = self.service_states.get(host, None)
             host_state = self.host_state_map.get(host)
+            if (host_state and host in self._applied_capabilities and
+                    self._applied_capabilities[host] is capabilities):
+                # Nothing was reported since the last pass
+                continue
             if not host_state:
                 host_state = self.host_state_cls(host,
                                                  capabilities=capabilities,
-                                                 service=
-                                                 dict(service.iteritems()))
+                                                 service=service)
                 self.host_state_map[host] = host_state
             # update capabilities and attributes in host_state
             host_state.update_from_volume_capability(capabilities,
-                                                     service=
-                                                     dict(service.iteritems()))
-            active_hosts.add(host)
+                                                     service=service)
+            self._applied_capabilities[host] = capabilities
 
         # remove non-active hosts from host_state_map
         nonactive_hosts = set(self.host_state_map.keys()) - active_hosts
@@ -491,6 +569,7 @@ class HostManager(object):
             LOG.info(_LI("Removing non-active host: %(host)s from "
                          "scheduler cache.") % {'host': host})
             del self.host_state_map[host]
+            self._applied_capabilities.pop(host, None)
 
     def get_all_host_states(self, context):
         """Returns a dict of all the hosts the HostManager knows about.
@@ -518,7 +597,8 @@ class HostManager(object):
     def get_pools(self, context):
         """Returns a dict of all pools on all hosts HostManager knows about."""
 
-        self._update_host_state_map(context)
+        # Listing pools is not sensitive to a slightly stale service list.
+        self._update_host_state_map(context, use_slave=True)
 
         all_pools = []
         for host, state in self.host_state_map.items():
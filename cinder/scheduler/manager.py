@@ -28,7 +28,7 @@ from cinder import context
 from cinder import db
 from cinder import exception
 from cinder import flow_utils
-from cinder.i18n import _, _LE
+from cinder.i18n import _, _LE, _LI
 from cinder import manager
 from cinder.openstack.common import log as logging
 from cinder import quota
@@ -53,7 +53,7 @@ LOG = logging.getLogger(__name__)
 class SchedulerManager(manager.Manager):
     """Chooses a host to create volumes."""
 
-    RPC_API_VERSION = '1.7'
+    RPC_API_VERSION = '1.10'
 
     target = messaging.Target(version=RPC_API_VERSION)
 
@@ -79,13 +79,26 @@ class SchedulerManager(manager.Manager):
         self.request_service_capabilities(ctxt)
 
     def update_service_capabilities(self, context, service_name=None,
-                                    host=None, capabilities=None, **kwargs):
-        """Process a capability update from a service node."""
+                                    host=None, capabilities=None,
+                                    capabilities_version=None,
+                                    base_version=None, **kwargs):
+        """Process a capability update from a service node.
+
+        When base_version is set, capabilities only holds the changes since
+        the update numbered base_version.  If the driver does not have that
+        update, a full report is requested from the service instead.
+        """
         if capabilities is None:
             capabilities = {}
-        self.driver.update_service_capabilities(service_name,
-                                                host,
-                                                capabilities)
+        try:
+            self.driver.update_service_capabilities(
+                service_name, host, capabilities,
+                capabilities_version=capabilities_version,
+                base_version=base_version)
+        except exception.CapabilitiesVersionMismatch as ex:
+            LOG.debug(ex.msg)
+            volume_rpcapi.VolumeAPI().publish_service_capabilities(context,
+                                                                   host=host)
 
     def create_consistencygroup(self, context, topic,
                                 group_id,
@@ -132,6 +145,35 @@ class SchedulerManager(manager.Manager):
         with flow_utils.DynamicLogListener(flow_engine, logger=LOG):
             flow_engine.run()
 
+    def create_volumes(self, context, topic, request_spec_list,
+                       filter_properties_list=None):
+        """Schedule a batch of volumes in a single scheduling pass.
+
+        The volumes which could not be placed are set to error.
+        """
+        try:
+            hosts = self.driver.schedule_create_volumes(
+                context, request_spec_list, filter_properties_list)
+        except Exception as ex:
+            with excutils.save_and_reraise_exception():
+                LOG.exception(_LE("Failed to schedule a batch of %d "
+                                  "volumes."), len(request_spec_list))
+                for request_spec in request_spec_list:
+                    self._set_create_volume_error(context, ex, request_spec)
+
+        for request_spec, host in zip(request_spec_list, hosts):
+            if isinstance(host, Exception):
+                self._set_create_volume_error(context, host, request_spec)
+
+    def _set_create_volume_error(self, context, ex, request_spec):
+        volume_state = {'volume_state': {'status': 'error'}}
+        try:
+            self._set_volume_state_and_notify('create_volume', volume_state,
+                                              context, ex, request_spec)
+        except exception.VolumeNotFound:
+            LOG.info(_LI("Volume %s was deleted before it could be "
+                         "scheduled."), request_spec.get('volume_id'))
+
     def request_service_capabilities(self, context):
         volume_rpcapi.VolumeAPI().publish_service_capabilities(context)
 
@@ -245,6 +287,10 @@ class SchedulerManager(manager.Manager):
         """Get active pools from scheduler's cache."""
         return self.driver.get_pools(context, filters)
 
+    def get_traces(self, context):
+        """Get the traces of recent scheduling decisions."""
+        return self.driver.get_traces(context)
+
     def _set_volume_state_and_notify(self, method, updates, context, ex,
                                      request_spec, msg=None):
         # TODO(harlowja): move into a task that just does this later.
@@ -40,6 +40,10 @@ class SchedulerAPI(object):
         1.5 - Add manage_existing method
         1.6 - Add create_consistencygroup method
         1.7 - Add get_active_pools method
+        1.8 - Add create_volumes method
+        1.9 - Add capabilities_version and base_version arguments
+              to update_service_capabilities()
+        1.10 - Add get_traces method
     '''
 
     RPC_API_VERSION = '1.0'
@@ -48,7 +52,7 @@ class SchedulerAPI(object):
         super(SchedulerAPI, self).__init__()
         target = messaging.Target(topic=CONF.scheduler_topic,
                                   version=self.RPC_API_VERSION)
-        self.client = rpc.get_client(target, version_cap='1.7')
+        self.client = rpc.get_client(target, version_cap='1.10')
 
     def create_consistencygroup(self, ctxt, topic, group_id,
                                 request_spec_list=None,
@@ -80,6 +84,20 @@ class SchedulerAPI(object):
                           request_spec=request_spec_p,
                           filter_properties=filter_properties)
 
+    def create_volumes(self, ctxt, topic, request_spec_list,
+                       filter_properties_list=None):
+
+        cctxt = self.client.prepare(version='1.8')
+        request_spec_p_list = []
+        for request_spec in request_spec_list:
+            request_spec_p = jsonutils.to_primitive(request_spec)
+            request_spec_p_list.append(request_spec_p)
+
+        return cctxt.cast(ctxt, 'create_volumes',
+                          topic=topic,
+                          request_spec_list=request_spec_p_list,
+                          filter_properties_list=filter_properties_list)
+
     def migrate_volume_to_host(self, ctxt, topic, volume_id, host,
                                force_host_copy=False, request_spec=None,
                                filter_properties=None):
@@ -120,11 +138,19 @@ class SchedulerAPI(object):
         return cctxt.call(ctxt, 'get_pools',
                           filters=filters)
 
+    def get_traces(self, ctxt):
+        cctxt = self.client.prepare(version='1.10')
+        return cctxt.call(ctxt, 'get_traces')
+
     def update_service_capabilities(self, ctxt,
                                     service_name, host,
-                                    capabilities):
+                                    capabilities,
+                                    capabilities_version=None,
+                                    base_version=None):
         # FIXME(flaper87): What to do with fanout?
-        cctxt = self.client.prepare(fanout=True)
+        cctxt = self.client.prepare(fanout=True, version='1.9')
         cctxt.cast(ctxt, 'update_service_capabilities',
                    service_name=service_name, host=host,
-                   capabilities=capabilities)
+                   capabilities=capabilities,
+                   capabilities_version=capabilities_version,
+                   base_version=base_version)
@@ -67,8 +67,20 @@ class CapacityWeigher(weights.BaseHostWeigher):
         """Override the weight multiplier."""
         return CONF.capacity_weight_multiplier
 
-    def _weigh_object(self, host_state, weight_properties):
+    def _weigh_objects(self, host_states, weight_properties):
         """Higher weights win.  We want spreading to be the default."""
+        # The weight given to hosts reporting 'infinite' or 'unknown'
+        # capacity only depends on the options, so read them once.
+        unknown_free = (-1 if CONF.capacity_weight_multiplier > 0
+                        else float('inf'))
+        return [self._free_capacity(host_state, unknown_free)
+                for host_state in host_states]
+
+    def _weigh_object(self, host_state, weight_properties):
+        return self._weigh_objects([host_state], weight_properties)[0]
+
+    @staticmethod
+    def _free_capacity(host_state, unknown_free):
         reserved = float(host_state.reserved_percentage) / 100
         free_space = host_state.free_capacity_gb
         total_space = host_state.total_capacity_gb
@@ -80,7 +92,7 @@ class CapacityWeigher(weights.BaseHostWeigher):
             # As a partial fix for bug #1350638, 'infinite' and 'unknown' are
             # given the lowest weight to discourage driver from report such
             # capacity anymore.
-            free = -1 if CONF.capacity_weight_multiplier > 0 else float('inf')
+            free = unknown_free
         else:
             total = float(total_space)
             if host_state.thin_provisioning_support:
@@ -100,8 +112,11 @@ class AllocatedCapacityWeigher(weights.BaseHostWeigher):
         """Override the weight multiplier."""
         return CONF.allocated_capacity_weight_multiplier
 
-    def _weigh_object(self, host_state, weight_properties):
+    def _weigh_objects(self, host_states, weight_properties):
         # Higher weights win.  We want spreading (choose host with lowest
         # allocated_capacity first) to be the default.
-        allocated_space = host_state.allocated_capacity_gb
-        return allocated_space
+        return [host_state.allocated_capacity_gb
+                for host_state in host_states]
+
+    def _weigh_object(self, host_state, weight_properties):
+        return self._weigh_objects([host_state], weight_properties)[0]
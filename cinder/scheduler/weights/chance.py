@@ -26,3 +26,6 @@ from cinder.openstack.common.scheduler import weights
 class ChanceWeigher(weights.BaseHostWeigher):
     def _weigh_object(self, host_state, weight_properties):
         return random.random()
+
+    def _weigh_objects(self, host_states, weight_properties):
+        return [random.random() for _host_state in host_states]
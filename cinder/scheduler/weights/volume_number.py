@@ -49,12 +49,16 @@ class VolumeNumberWeigher(weights.BaseHostWeigher):
         """Override the weight multiplier."""
         return CONF.volume_number_multiplier
 
+    def weigh_objects(self, weighed_obj_list, weight_properties):
+        """Fetch the volume numbers of all hosts with a single query."""
+        context = weight_properties['context']
+        hosts = [obj.obj.host for obj in weighed_obj_list]
+        self._volume_numbers = db.volume_count_get_by_host(context, hosts)
+        super(VolumeNumberWeigher, self).weigh_objects(weighed_obj_list,
+                                                       weight_properties)
+
     def _weigh_object(self, host_state, weight_properties):
         """Less volume number weights win.
         We want spreading to be the default.
         """
-        context = weight_properties['context']
-        volume_number = db.volume_data_get_for_host(context=context,
-                                                    host=host_state.host,
-                                                    count_only=True)
-        return volume_number
+        return self._volume_numbers.get(host_state.host, 0)
@@ -283,22 +283,14 @@ class Service(service.Service):
         """Update the state of this service in the datastore."""
         ctxt = context.get_admin_context()
         zone = CONF.storage_availability_zone
-        state_catalog = {}
         try:
             try:
-                service_ref = db.service_get(ctxt, self.service_id)
+                db.service_heartbeat(ctxt, self.service_id, zone)
             except exception.NotFound:
                 LOG.debug('The service database object disappeared, '
                           'Recreating it.')
                 self._create_service_ref(ctxt)
-                service_ref = db.service_get(ctxt, self.service_id)
-
-            state_catalog['report_count'] = service_ref['report_count'] + 1
-            if zone != service_ref['availability_zone']:
-                state_catalog['availability_zone'] = zone
-
-            db.service_update(ctxt,
-                              self.service_id, state_catalog)
+                db.service_heartbeat(ctxt, self.service_id, zone)
 
             # TODO(termie): make this pattern be more elegant.
             if getattr(self, 'model_disconnected', False):
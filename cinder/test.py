@@ -43,6 +43,7 @@ from cinder.db import migration
 from cinder.db.sqlalchemy import api as sqla_api
 from cinder import i18n
 from cinder.openstack.common import log as oslo_logging
+from cinder import quota
 from cinder import rpc
 from cinder import service
 from cinder.tests import conf_fixture
@@ -166,6 +167,8 @@ class TestCase(testtools.TestCase):
                                  sqlite_db=CONF.database.sqlite_db,
                                  sqlite_clean_db=CONF.sqlite_clean_db)
         self.useFixture(_DB_CACHE)
+        # The database was just reset, so are the volume types.
+        quota.QUOTAS.invalidate_resources()
 
         # emulate some of the mox stuff, we can't use the metaclass
         # because it screws with our generators
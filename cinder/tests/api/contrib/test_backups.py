@@ -139,9 +139,10 @@ class BackupsAPITestCase(test.TestCase):
                          'Backup 9999 could not be found.')
 
     def test_list_backups_json(self):
-        backup_id1 = self._create_backup()
-        backup_id2 = self._create_backup()
+        # The most recently created backups are listed first.
         backup_id3 = self._create_backup()
+        backup_id2 = self._create_backup()
+        backup_id1 = self._create_backup()
 
         req = webob.Request.blank('/v2/fake/backups')
         req.method = 'GET'
@@ -165,9 +166,10 @@ class BackupsAPITestCase(test.TestCase):
         db.backup_destroy(context.get_admin_context(), backup_id1)
 
     def test_list_backups_xml(self):
-        backup_id1 = self._create_backup()
-        backup_id2 = self._create_backup()
+        # The most recently created backups are listed first.
         backup_id3 = self._create_backup()
+        backup_id2 = self._create_backup()
+        backup_id1 = self._create_backup()
 
         req = webob.Request.blank('/v2/fake/backups')
         req.method = 'GET'
@@ -194,9 +196,10 @@ class BackupsAPITestCase(test.TestCase):
         db.backup_destroy(context.get_admin_context(), backup_id1)
 
     def test_list_backups_detail_json(self):
-        backup_id1 = self._create_backup()
-        backup_id2 = self._create_backup()
+        # The most recently created backups are listed first.
         backup_id3 = self._create_backup()
+        backup_id2 = self._create_backup()
+        backup_id1 = self._create_backup()
 
         req = webob.Request.blank('/v2/fake/backups/detail')
         req.method = 'GET'
@@ -294,10 +297,46 @@ class BackupsAPITestCase(test.TestCase):
         db.backup_destroy(context.get_admin_context(), backup_id2)
         db.backup_destroy(context.get_admin_context(), backup_id1)
 
+    @mock.patch('cinder.db.backup_get_all_by_project', return_value=[])
+    def test_list_backups_reads_from_slave(self, backup_get_all_by_project):
+        req = webob.Request.blank('/v2/fake/backups/detail')
+        req.method = 'GET'
+        req.headers['Content-Type'] = 'application/json'
+        res = req.get_response(fakes.wsgi_app())
+
+        self.assertEqual(200, res.status_int)
+        backup_get_all_by_project.assert_called_once_with(
+            mock.ANY, 'fake', filters={}, marker=None, limit=None,
+            sort_key='created_at', sort_dir='desc', use_slave=True)
+
+    def test_list_backups_follow_next_link(self):
+        self.override_config('osapi_max_limit', 2)
+        backup_ids = [self._create_backup() for _i in range(4)]
+
+        listed = []
+        url = '/v2/fake/backups'
+        while url:
+            req = webob.Request.blank(url)
+            req.method = 'GET'
+            req.headers['Content-Type'] = 'application/json'
+            res = req.get_response(fakes.wsgi_app())
+            self.assertEqual(200, res.status_int)
+            res_dict = json.loads(res.body)
+            listed.extend(backup['id'] for backup in res_dict['backups'])
+            links = dict((link['rel'], link['href'])
+                         for link in res_dict.get('backups_links', []))
+            url = links.get('next')
+            if url:
+                url = url[url.index('/v2/'):]
+
+        # Every backup is listed once, the most recently created first.
+        self.assertEqual(list(reversed(backup_ids)), listed)
+
     def test_list_backups_detail_xml(self):
-        backup_id1 = self._create_backup()
-        backup_id2 = self._create_backup()
+        # The most recently created backups are listed first.
         backup_id3 = self._create_backup()
+        backup_id2 = self._create_backup()
+        backup_id1 = self._create_backup()
 
         req = webob.Request.blank('/v2/fake/backups/detail')
         req.method = 'GET'
@@ -45,7 +45,9 @@ def fake_snapshot_get(self, context, snapshot_id):
     return param
 
 
-def fake_snapshot_get_all(self, context, search_opts=None):
+def fake_snapshot_get_all(self, context, search_opts=None, marker=None,
+                          limit=None, sort_key=None, sort_dir=None,
+                          use_slave=False):
     param = _get_default_snapshot_param()
     return [param]
 
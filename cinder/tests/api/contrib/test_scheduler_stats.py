@@ -108,3 +108,22 @@ class SchedulerStatsAPITest(test.TestCase):
         }
 
         self.assertDictMatch(res, expected)
+
+    @mock.patch('cinder.scheduler.rpcapi.SchedulerAPI.get_traces')
+    def test_get_traces(self, mock_get_traces):
+        trace = {'volume_id': 'fake_volume',
+                 'timestamp': '2015-03-01T00:00:00.000000',
+                 'filters': [{'name': 'CapacityFilter',
+                              'objects_in': 2,
+                              'objects_out': 1,
+                              'elapsed': 0.001}],
+                 'weighers': [{'name': 'CapacityWeigher',
+                               'elapsed': 0.001}],
+                 'weighed_hosts': [{'host': 'host1', 'weight': 100.0}]}
+        mock_get_traces.return_value = [trace]
+        req = fakes.HTTPRequest.blank('/v2/fake/scheduler_stats/get_traces')
+        req.environ['cinder.context'] = self.ctxt
+        res = self.controller.get_traces(req)
+
+        self.assertEqual({'traces': [trace]}, res)
+        mock_get_traces.assert_called_once_with(self.ctxt)
@@ -17,6 +17,7 @@ import json
 import uuid
 from xml.dom import minidom
 
+import mock
 import webob
 
 from cinder.api import common
@@ -57,6 +58,9 @@ fake_image_metadata = {
 }
 
 
+get_volume_image_metadata = volume.API.__dict__['get_volume_image_metadata']
+
+
 def fake_get_volume_image_metadata(*args, **kwargs):
     return fake_image_metadata
 
@@ -65,6 +69,12 @@ def fake_get_volumes_image_metadata(*args, **kwargs):
     return {'fake': fake_image_metadata}
 
 
+def fake_get_list_volumes_image_metadata(self, context, volume_id_list,
+                                         use_slave=False):
+    return dict((volume_id, fake_image_metadata)
+                for volume_id in volume_id_list if volume_id == 'fake')
+
+
 class VolumeImageMetadataTest(test.TestCase):
     content_type = 'application/json'
 
@@ -76,6 +86,8 @@ class VolumeImageMetadataTest(test.TestCase):
                        fake_get_volume_image_metadata)
         self.stubs.Set(volume.API, 'get_volumes_image_metadata',
                        fake_get_volumes_image_metadata)
+        self.stubs.Set(volume.API, 'get_list_volumes_image_metadata',
+                       fake_get_list_volumes_image_metadata)
         self.stubs.Set(db, 'volume_get', fake_volume_get)
         self.UUID = uuid.uuid4()
 
@@ -106,6 +118,27 @@ class VolumeImageMetadataTest(test.TestCase):
         self.assertEqual(self._get_image_metadata_list(res.body)[0],
                          fake_image_metadata)
 
+    def test_list_detail_volumes_reads_page_metadata(self):
+        with mock.patch.object(volume.API, 'get_list_volumes_image_metadata',
+                               return_value={}) as get_list:
+            res = self._make_request('/v2/fake/volumes/detail')
+        self.assertEqual(200, res.status_int)
+        get_list.assert_called_once_with(mock.ANY, ['fake'], use_slave=True)
+
+    @mock.patch('cinder.volume.api.check_policy')
+    def test_get_volume_checks_volume_policy(self, check_policy):
+        self.stubs.Set(volume.API, 'get_volume_image_metadata',
+                       get_volume_image_metadata)
+        with mock.patch.object(db, 'volume_glance_metadata_get',
+                               return_value=[]):
+            res = self._make_request('/v2/fake/volumes/%s' % self.UUID)
+        self.assertEqual(200, res.status_int)
+        # The volume is checked against the policy of a single volume's
+        # image metadata, not the one of listings.
+        check_policy.assert_called_once_with(
+            mock.ANY, 'get_volume_image_metadata', mock.ANY)
+        self.assertEqual('fake', check_policy.call_args[0][2]['id'])
+
 
 class ImageMetadataXMLDeserializer(common.MetadataXMLDeserializer):
     metadata_node_name = "volume_image_metadata"
@@ -119,16 +119,29 @@ def stub_snapshot(id, **kwargs):
     return snapshot
 
 
-def stub_snapshot_get_all(self):
+def stub_snapshot_get_all(context, filters=None, marker=None, limit=None,
+                          sort_key=None, sort_dir=None, use_slave=False):
     return [stub_snapshot(100, project_id='fake'),
             stub_snapshot(101, project_id='superfake'),
             stub_snapshot(102, project_id='superduperfake')]
 
 
-def stub_snapshot_get_all_by_project(self, context):
+def stub_snapshot_get_all_by_project(context, project_id, filters=None,
+                                     marker=None, limit=None,
+                                     sort_key=None, sort_dir=None,
+                                     use_slave=False):
     return [stub_snapshot(1)]
 
 
+def filter_snapshots(snapshots, filters):
+    """Filter snapshots the way the database API does."""
+    if not filters:
+        return snapshots
+    return [snapshot for snapshot in snapshots
+            if all(snapshot.get(key) == value
+                   for key, value in filters.items())]
+
+
 def stub_snapshot_update(self, context, *args, **param):
     pass
 
@@ -627,7 +627,8 @@ class VolumeApiTest(test.TestCase):
             def stub_volume_get_all_by_project(context, project_id, marker,
                                                limit, sort_key, sort_dir,
                                                filters=None,
-                                               viewable_admin_meta=False):
+                                               viewable_admin_meta=False,
+                                               use_slave=False):
                 return [
                     stubs.stub_volume(1, display_name='vol1'),
                     stubs.stub_volume(2, display_name='vol2'),
@@ -772,7 +773,8 @@ class VolumeApiTest(test.TestCase):
         get_all.assert_called_once_with(
             context, sort_dir='desc', viewable_admin_meta=True,
             sort_key='created_at', limit=None,
-            filters={'display_name': 'Volume-573108026'}, marker=None)
+            filters={'display_name': 'Volume-573108026'}, marker=None,
+            use_slave=True)
 
     @mock.patch('cinder.volume.api.API.get_all')
     def test_get_volumes_filter_with_list(self, get_all):
@@ -784,7 +786,8 @@ class VolumeApiTest(test.TestCase):
         get_all.assert_called_once_with(
             context, sort_dir='desc', viewable_admin_meta=True,
             sort_key='created_at', limit=None,
-            filters={'id': ['1', '2', '3']}, marker=None)
+            filters={'id': ['1', '2', '3']}, marker=None,
+            use_slave=True)
 
     @mock.patch('cinder.volume.api.API.get_all')
     def test_get_volumes_filter_with_expression(self, get_all):
@@ -796,7 +799,7 @@ class VolumeApiTest(test.TestCase):
         get_all.assert_called_once_with(
             context, sort_dir='desc', viewable_admin_meta=True,
             sort_key='created_at', limit=None, filters={'id': 'd+'},
-            marker=None)
+            marker=None, use_slave=True)
 
 
 class VolumeSerializerTest(test.TestCase):
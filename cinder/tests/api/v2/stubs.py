@@ -125,7 +125,7 @@ def stub_volume_get_db(context, volume_id):
 
 def stub_volume_get_all(context, search_opts=None, marker=None, limit=None,
                         sort_key='created_at', sort_dir='desc', filters=None,
-                        viewable_admin_meta=False):
+                        viewable_admin_meta=False, use_slave=False):
     return [stub_volume(100, project_id='fake'),
             stub_volume(101, project_id='superfake'),
             stub_volume(102, project_id='superduperfake')]
@@ -133,7 +133,7 @@ def stub_volume_get_all(context, search_opts=None, marker=None, limit=None,
 
 def stub_volume_get_all_by_project(self, context, marker, limit, sort_key,
                                    sort_dir, filters=None,
-                                   viewable_admin_meta=False):
+                                   viewable_admin_meta=False, use_slave=False):
     filters = filters or {}
     return [stub_volume_get(self, context, '1')]
 
@@ -152,16 +152,29 @@ def stub_snapshot(id, **kwargs):
     return snapshot
 
 
-def stub_snapshot_get_all(self):
+def stub_snapshot_get_all(context, filters=None, marker=None, limit=None,
+                          sort_key=None, sort_dir=None, use_slave=False):
     return [stub_snapshot(100, project_id='fake'),
             stub_snapshot(101, project_id='superfake'),
             stub_snapshot(102, project_id='superduperfake')]
 
 
-def stub_snapshot_get_all_by_project(self, context):
+def stub_snapshot_get_all_by_project(context, project_id, filters=None,
+                                     marker=None, limit=None,
+                                     sort_key=None, sort_dir=None,
+                                     use_slave=False):
     return [stub_snapshot(1)]
 
 
+def filter_snapshots(snapshots, filters):
+    """Filter snapshots the way the database API does."""
+    if not filters:
+        return snapshots
+    return [snapshot for snapshot in snapshots
+            if all(snapshot.get(key) == value
+                   for key, value in filters.items())]
+
+
 def stub_snapshot_update(self, context, *args, **param):
     pass
 
@@ -25,8 +25,10 @@ import webob
 
 from cinder.api import extensions
 from cinder.api.v2 import volumes
+from cinder.common import sqlalchemyutils
 from cinder import context
 from cinder import db
+from cinder.db.sqlalchemy import models
 from cinder import exception
 from cinder import test
 from cinder.tests.api import fakes
@@ -929,7 +931,8 @@ class VolumeApiTest(test.TestCase):
     def test_volume_index_with_marker(self):
         def stub_volume_get_all_by_project(context, project_id, marker, limit,
                                            sort_key, sort_dir, filters=None,
-                                           viewable_admin_meta=False):
+                                           viewable_admin_meta=False,
+                                           use_slave=False):
             return [
                 stubs.stub_volume(1, display_name='vol1'),
                 stubs.stub_volume(2, display_name='vol2'),
@@ -964,6 +967,21 @@ class VolumeApiTest(test.TestCase):
         self.assertTrue('marker' in params)
         self.assertEqual('1', params['limit'][0])
 
+    def test_volume_index_limit_marker_holds_sort_keys(self):
+        self.stubs.Set(db, 'volume_get_all_by_project',
+                       stubs.stub_volume_get_all_by_project)
+        self.stubs.Set(volume_api.API, 'get', stubs.stub_volume_get)
+
+        req = fakes.HTTPRequest.blank('/v2/volumes?limit=1&sort_key=size')
+        res_dict = self.controller.index(req)
+
+        href_parts = urlparse.urlparse(res_dict['volumes_links'][0]['href'])
+        marker = urlparse.parse_qs(href_parts.query)['marker'][0]
+        sort_keys = ['size', 'created_at', 'id']
+        self.assertEqual(
+            [1, datetime.datetime(1900, 1, 1, 1, 1, 1), '1'],
+            sqlalchemyutils.decode_marker(marker, models.Volume, sort_keys))
+
     def test_volume_index_limit_negative(self):
         req = fakes.HTTPRequest.blank('/v2/volumes?limit=-1')
         self.assertRaises(exception.Invalid,
@@ -990,7 +1008,8 @@ class VolumeApiTest(test.TestCase):
     def test_volume_index_limit_offset(self):
         def stub_volume_get_all_by_project(context, project_id, marker, limit,
                                            sort_key, sort_dir, filters=None,
-                                           viewable_admin_meta=False):
+                                           viewable_admin_meta=False,
+                                           use_slave=False):
             return [
                 stubs.stub_volume(1, display_name='vol1'),
                 stubs.stub_volume(2, display_name='vol2'),
@@ -1018,7 +1037,8 @@ class VolumeApiTest(test.TestCase):
     def test_volume_detail_with_marker(self):
         def stub_volume_get_all_by_project(context, project_id, marker, limit,
                                            sort_key, sort_dir, filters=None,
-                                           viewable_admin_meta=False):
+                                           viewable_admin_meta=False,
+                                           use_slave=False):
             return [
                 stubs.stub_volume(1, display_name='vol1'),
                 stubs.stub_volume(2, display_name='vol2'),
@@ -1079,7 +1099,8 @@ class VolumeApiTest(test.TestCase):
     def test_volume_detail_limit_offset(self):
         def stub_volume_get_all_by_project(context, project_id, marker, limit,
                                            sort_key, sort_dir, filters=None,
-                                           viewable_admin_meta=False):
+                                           viewable_admin_meta=False,
+                                           use_slave=False):
             return [
                 stubs.stub_volume(1, display_name='vol1'),
                 stubs.stub_volume(2, display_name='vol2'),
@@ -1138,7 +1159,8 @@ class VolumeApiTest(test.TestCase):
         def stub_volume_get_all(context, marker, limit,
                                 sort_key, sort_dir,
                                 filters=None,
-                                viewable_admin_meta=False):
+                                viewable_admin_meta=False,
+                                use_slave=False):
             vols = [stubs.stub_volume(i)
                     for i in xrange(CONF.osapi_max_limit)]
             if limit is None or limit >= len(vols):
@@ -1157,7 +1179,8 @@ class VolumeApiTest(test.TestCase):
         def stub_volume_get_all2(context, marker, limit,
                                  sort_key, sort_dir,
                                  filters=None,
-                                 viewable_admin_meta=False):
+                                 viewable_admin_meta=False,
+                                 use_slave=False):
             vols = [stubs.stub_volume(i)
                     for i in xrange(100)]
             if limit is None or limit >= len(vols):
@@ -1175,7 +1198,8 @@ class VolumeApiTest(test.TestCase):
         def stub_volume_get_all3(context, marker, limit,
                                  sort_key, sort_dir,
                                  filters=None,
-                                 viewable_admin_meta=False):
+                                 viewable_admin_meta=False,
+                                 use_slave=False):
             vols = [stubs.stub_volume(i)
                     for i in xrange(CONF.osapi_max_limit + 100)]
             if limit is None or limit >= len(vols):
@@ -1215,14 +1239,16 @@ class VolumeApiTest(test.TestCase):
         # Non-admin, project function should be called with no_migration_status
         def stub_volume_get_all_by_project(context, project_id, marker, limit,
                                            sort_key, sort_dir, filters=None,
-                                           viewable_admin_meta=False):
+                                           viewable_admin_meta=False,
+                                           use_slave=False):
             self.assertEqual(filters['no_migration_targets'], True)
             self.assertFalse('all_tenants' in filters)
             return [stubs.stub_volume(1, display_name='vol1')]
 
         def stub_volume_get_all(context, marker, limit,
                                 sort_key, sort_dir, filters=None,
-                                viewable_admin_meta=False):
+                                viewable_admin_meta=False,
+                                use_slave=False):
             return []
         self.stubs.Set(db, 'volume_get_all_by_project',
                        stub_volume_get_all_by_project)
@@ -1239,13 +1265,15 @@ class VolumeApiTest(test.TestCase):
         # without no_migration_status
         def stub_volume_get_all_by_project2(context, project_id, marker, limit,
                                             sort_key, sort_dir, filters=None,
-                                            viewable_admin_meta=False):
+                                            viewable_admin_meta=False,
+                                            use_slave=False):
             self.assertFalse('no_migration_targets' in filters)
             return [stubs.stub_volume(1, display_name='vol2')]
 
         def stub_volume_get_all2(context, marker, limit,
                                  sort_key, sort_dir, filters=None,
-                                 viewable_admin_meta=False):
+                                 viewable_admin_meta=False,
+                                 use_slave=False):
             return []
         self.stubs.Set(db, 'volume_get_all_by_project',
                        stub_volume_get_all_by_project2)
@@ -1260,12 +1288,14 @@ class VolumeApiTest(test.TestCase):
         # without no_migration_status
         def stub_volume_get_all_by_project3(context, project_id, marker, limit,
                                             sort_key, sort_dir, filters=None,
-                                            viewable_admin_meta=False):
+                                            viewable_admin_meta=False,
+                                            use_slave=False):
             return []
 
         def stub_volume_get_all3(context, marker, limit,
                                  sort_key, sort_dir, filters=None,
-                                 viewable_admin_meta=False):
+                                 viewable_admin_meta=False,
+                                 use_slave=False):
             self.assertFalse('no_migration_targets' in filters)
             self.assertFalse('all_tenants' in filters)
             return [stubs.stub_volume(1, display_name='vol3')]
@@ -1552,7 +1582,8 @@ class VolumeApiTest(test.TestCase):
         self.controller._get_volumes(req, True)
         get_all.assert_called_once_with(
             context, None, None, 'created_at', 'desc',
-            {'display_name': 'Volume-573108026'}, viewable_admin_meta=True)
+            {'display_name': 'Volume-573108026'}, viewable_admin_meta=True,
+            use_slave=True)
 
     @mock.patch('cinder.volume.api.API.get_all')
     def test_get_volumes_filter_with_list(self, get_all):
@@ -1564,7 +1595,8 @@ class VolumeApiTest(test.TestCase):
         self.controller._get_volumes(req, True)
         get_all.assert_called_once_with(
             context, None, None, 'created_at', 'desc',
-            {'id': ['1', '2', '3']}, viewable_admin_meta=True)
+            {'id': ['1', '2', '3']}, viewable_admin_meta=True,
+            use_slave=True)
 
     @mock.patch('cinder.volume.api.API.get_all')
     def test_get_volumes_filter_with_expression(self, get_all):
@@ -1576,7 +1608,8 @@ class VolumeApiTest(test.TestCase):
         self.controller._get_volumes(req, True)
         get_all.assert_called_once_with(
             context, None, None, 'created_at', 'desc',
-            {'display_name': 'd-'}, viewable_admin_meta=True)
+            {'display_name': 'd-'}, viewable_admin_meta=True,
+            use_slave=True)
 
 
 class VolumeSerializerTest(test.TestCase):
@@ -19,6 +19,8 @@ from datetime import datetime
 from datetime import timedelta
 import uuid
 
+import mock
+
 from cinder import context
 from cinder import db
 from cinder.db.sqlalchemy import api as db_api
@@ -92,6 +94,25 @@ class PurgeDeletedTest(test.TestCase):
         self.assertEqual(2, rows)
         self.assertEqual(2, meta_rows)
 
+    def test_purge_deleted_rows_in_batches(self):
+        progress = mock.Mock()
+        with mock.patch('time.sleep') as sleep:
+            purged = db.purge_deleted_rows(self.context, age_in_days=10,
+                                           batch_size=3, sleep_interval=2,
+                                           progress=progress)
+        self.assertEqual(2, self.session.query(self.volumes).count())
+        self.assertEqual(2, self.session.query(self.vm).count())
+        self.assertEqual(4, purged['volumes'])
+        self.assertEqual(4, purged['volume_metadata'])
+        # The child table is purged before the table it refers to
+        self.assertEqual([mock.call('volume_metadata', 3),
+                          mock.call('volume_metadata', 4),
+                          mock.call('volumes', 3),
+                          mock.call('volumes', 4)],
+                         [c for c in progress.call_args_list
+                          if c[0][0] in ('volumes', 'volume_metadata')])
+        self.assertEqual(2, sleep.call_args_list.count(mock.call(2)))
+
     def test_purge_deleted_rows_bad_args(self):
         # Test with no age argument
         self.assertRaises(TypeError, db.purge_deleted_rows, self.context)
@@ -103,3 +124,7 @@ class PurgeDeletedTest(test.TestCase):
         self.assertRaises(exception.InvalidParameterValue,
                           db.purge_deleted_rows, self.context,
                           age_in_days=-1)
+        # Test with a zero batch size
+        self.assertRaises(exception.InvalidParameterValue,
+                          db.purge_deleted_rows, self.context,
+                          age_in_days=10, batch_size=0)
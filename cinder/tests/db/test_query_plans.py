@@ -0,0 +1,194 @@
+# Copyright (c) 2015 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Query plan tests for the hot DB API queries.
+
+The queries issued by the DB API calls below are run through EXPLAIN QUERY
+PLAN against the migrated schema, seeded with enough rows for the planner to
+pick between indexes, to catch full table scans before they reach a large
+deployment.
+"""
+
+import datetime
+import re
+import uuid
+
+from oslo_db.sqlalchemy import utils as sqlalchemyutils
+import sqlalchemy
+
+from cinder import context
+from cinder import db
+from cinder.db.sqlalchemy import api as sqlalchemy_api
+from cinder import test
+
+
+# A full table scan, or an index SQLite had to build for the query because
+# there was none to use.  Aliases of subqueries (anon_N) are not tables.
+FULL_SCAN_RE = re.compile(r'^SCAN (TABLE )?(?!anon_)\w+( AS \w+)?'
+                          r'( LEFT-JOIN)?$|AUTOMATIC')
+
+PROJECTS = 4
+HOSTS = 4
+VOLUMES_PER_PROJECT = 25
+
+
+class QueryPlanTestCase(test.TestCase):
+    """Check that the hot DB API queries are answered from indexes."""
+
+    def setUp(self):
+        super(QueryPlanTestCase, self).setUp()
+        self.ctxt = context.get_admin_context()
+        self.user_ctxt = context.RequestContext('user', 'project0')
+        self.engine = sqlalchemy_api.get_engine()
+        self._seed()
+
+    def _seed(self):
+        now = datetime.datetime.utcnow()
+        tables = dict((name, sqlalchemyutils.get_table(self.engine, name))
+                      for name in ('volumes', 'volume_metadata', 'snapshots',
+                                   'snapshot_metadata', 'quota_usages',
+                                   'reservations'))
+        rows = dict((name, []) for name in tables)
+        for project in range(PROJECTS):
+            project_id = 'project%d' % project
+            rows['quota_usages'].append({
+                'id': project + 1, 'project_id': project_id,
+                'resource': 'volumes', 'in_use': 0, 'reserved': 0,
+                'deleted': False})
+            for index in range(VOLUMES_PER_PROJECT):
+                volume_id = str(uuid.uuid4())
+                snapshot_id = str(uuid.uuid4())
+                created_at = now - datetime.timedelta(minutes=index)
+                rows['volumes'].append({
+                    'id': volume_id, 'project_id': project_id,
+                    'host': 'host%d@backend#pool%d' % (index % HOSTS,
+                                                       index % 2),
+                    'created_at': created_at, 'deleted': index % 5 == 0})
+                rows['volume_metadata'].append({
+                    'volume_id': volume_id, 'key': 'key%d' % (index % 5),
+                    'value': 'value%d' % index, 'deleted': False})
+                rows['snapshots'].append({
+                    'id': snapshot_id, 'volume_id': volume_id,
+                    'project_id': project_id, 'created_at': created_at,
+                    'deleted': False})
+                rows['snapshot_metadata'].append({
+                    'snapshot_id': snapshot_id, 'key': 'key',
+                    'value': 'value', 'deleted': False})
+                rows['reservations'].append({
+                    'uuid': str(uuid.uuid4()), 'usage_id': project + 1,
+                    'project_id': project_id, 'resource': 'volumes',
+                    'delta': 1, 'expire': now + datetime.timedelta(days=1),
+                    'deleted': False})
+
+        for name in ('volumes', 'volume_metadata', 'snapshots',
+                     'snapshot_metadata', 'quota_usages', 'reservations'):
+            self.engine.execute(tables[name].insert(), rows[name])
+        self.engine.execute('ANALYZE')
+
+    def _get_plans(self, func, *args, **kwargs):
+        """Call func and return the query plan of each SELECT it ran."""
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters,
+                                  context, executemany):
+            if statement.lstrip().upper().startswith('SELECT'):
+                statements.append((statement, parameters))
+
+        sqlalchemy.event.listen(self.engine, 'before_cursor_execute',
+                                before_cursor_execute)
+        try:
+            func(*args, **kwargs)
+        finally:
+            sqlalchemy.event.remove(self.engine, 'before_cursor_execute',
+                                    before_cursor_execute)
+
+        plans = []
+        connection = self.engine.raw_connection()
+        try:
+            for statement, parameters in statements:
+                cursor = connection.cursor()
+                cursor.execute('EXPLAIN QUERY PLAN ' + statement, parameters)
+                plans.append([row[-1] for row in cursor.fetchall()])
+        finally:
+            connection.close()
+        return plans
+
+    def _assert_indexed(self, func, *args, **kwargs):
+        """Assert that func ran no query that scans a whole table.
+
+        Returns the steps of all the plans, for further checks.
+        """
+        plans = self._get_plans(func, *args, **kwargs)
+        self.assertTrue(plans)
+        steps = []
+        for plan in plans:
+            for step in plan:
+                self.assertIsNone(FULL_SCAN_RE.search(step),
+                                  'Full scan in plan: %s' % plan)
+            steps.extend(plan)
+        return steps
+
+    def _assert_uses_index(self, index_name, func, *args, **kwargs):
+        steps = self._assert_indexed(func, *args, **kwargs)
+        self.assertTrue([step for step in steps if index_name in step],
+                        '%s not used in plan: %s' % (index_name, steps))
+
+    def test_volume_get(self):
+        volume = db.volume_get_all_by_project(
+            self.ctxt, 'project0', None, 1, 'created_at', 'desc')[0]
+        self._assert_indexed(db.volume_get, self.ctxt, volume['id'])
+
+    def test_volume_get_all(self):
+        self._assert_uses_index('volumes_deleted_created_at_idx',
+                                db.volume_get_all, self.ctxt, None, 20,
+                                'created_at', 'desc')
+
+    def test_volume_get_all_by_project(self):
+        self._assert_uses_index('volumes_project_id_deleted_created_at_idx',
+                                db.volume_get_all_by_project, self.user_ctxt,
+                                'project0', None, 20, 'created_at', 'desc')
+
+    def test_volume_get_all_by_host(self):
+        self._assert_uses_index('volumes_host_idx',
+                                db.volume_get_all_by_host, self.ctxt,
+                                'host1@backend')
+
+    def test_volume_get_all_by_metadata(self):
+        self._assert_indexed(db.volume_get_all_by_project, self.user_ctxt,
+                             'project0', None, 20, 'created_at', 'desc',
+                             filters={'metadata': {'key1': 'value1'}})
+
+    def test_snapshot_get_all_by_project(self):
+        self._assert_uses_index('snapshots_project_id_deleted_created_at_idx',
+                                db.snapshot_get_all_by_project,
+                                self.user_ctxt, 'project0')
+
+    def test_snapshot_get_all_for_volume(self):
+        self._assert_uses_index('snapshots_volume_id_deleted_idx',
+                                db.snapshot_get_all_for_volume,
+                                self.user_ctxt, 'fake')
+
+    def test_quota_usage_get_all_by_project(self):
+        self._assert_indexed(db.quota_usage_get_all_by_project,
+                             self.user_ctxt, 'project0')
+
+    def test_reservation_commit(self):
+        self._assert_uses_index('reservations_uuid_idx',
+                                db.reservation_commit, self.user_ctxt,
+                                [str(uuid.uuid4())], 'project0')
+
+    def test_reservation_expire(self):
+        self._assert_uses_index('reservations_deleted_expire_idx',
+                                db.reservation_expire, self.ctxt)
@@ -0,0 +1,209 @@
+# Copyright (c) 2015 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import datetime
+
+import mock
+
+from cinder import exception
+from cinder.image import cache as image_cache
+from cinder import test
+
+
+class ImageVolumeCacheTestCase(test.TestCase):
+
+    def setUp(self):
+        super(ImageVolumeCacheTestCase, self).setUp()
+        self.mock_db = mock.Mock()
+        self.mock_volume_api = mock.Mock()
+        self.context = mock.sentinel.context
+        self.updated_at = datetime.datetime(2015, 1, 1, 0, 0, 0)
+
+    def _build_cache(self, max_gb=0, max_count=0):
+        return image_cache.ImageVolumeCache(self.mock_db,
+                                            self.mock_volume_api,
+                                            max_gb,
+                                            max_count)
+
+    def _build_entry(self, size=10, checksum=None):
+        return {
+            'id': 1,
+            'host': 'test@foo#bar',
+            'image_id': 'c7a8b8d4-e519-46c7-a0df-ddf1b9b9fff2',
+            'image_updated_at': self.updated_at,
+            'image_checksum': checksum,
+            'volume_id': '70a599e0-31e7-49b7-b260-868f441e862b',
+            'size': size,
+            'last_used': datetime.datetime(2015, 1, 2, 0, 0, 0),
+        }
+
+    def test_get_by_image_volume(self):
+        cache = self._build_cache()
+        ret = {'id': 1, 'volume_id': 'abc'}
+        self.mock_db.image_volume_cache_get_by_volume_id.return_value = ret
+        entry = cache.get_by_image_volume(self.context, 'abc')
+        self.assertEqual(ret, entry)
+
+    def test_evict(self):
+        cache = self._build_cache()
+        entry = self._build_entry()
+        volume = {'id': entry['volume_id']}
+        self.mock_db.volume_get.return_value = volume
+
+        cache.evict(self.context, entry)
+
+        self.mock_db.image_volume_cache_delete.assert_called_once_with(
+            self.context, entry['volume_id'])
+        self.mock_volume_api.delete.assert_called_once_with(
+            self.context, volume, force=True)
+
+    def test_evict_volume_gone(self):
+        cache = self._build_cache()
+        entry = self._build_entry()
+        self.mock_db.volume_get.side_effect = exception.VolumeNotFound(
+            volume_id=entry['volume_id'])
+
+        cache.evict(self.context, entry)
+
+        self.mock_db.image_volume_cache_delete.assert_called_once_with(
+            self.context, entry['volume_id'])
+        self.assertFalse(self.mock_volume_api.delete.called)
+
+    def test_get_entry(self):
+        cache = self._build_cache()
+        entry = self._build_entry()
+        volume_ref = {'host': 'foo@bar#whatever'}
+        image_meta = {'updated_at': self.updated_at}
+        (self.mock_db.
+         image_volume_cache_get_and_update_last_used.return_value) = entry
+
+        found_entry = cache.get_entry(self.context, volume_ref,
+                                      entry['image_id'], image_meta)
+
+        self.assertEqual(entry, found_entry)
+        (self.mock_db.
+         image_volume_cache_get_and_update_last_used.assert_called_once_with)(
+            self.context, entry['image_id'], volume_ref['host'])
+        self.assertFalse(self.mock_db.image_volume_cache_delete.called)
+
+    def test_get_entry_not_exists(self):
+        cache = self._build_cache()
+        volume_ref = {'host': 'foo@bar#whatever'}
+        image_meta = {'updated_at': self.updated_at}
+        (self.mock_db.
+         image_volume_cache_get_and_update_last_used.return_value) = None
+
+        entry = cache.get_entry(self.context, volume_ref, 'image', image_meta)
+
+        self.assertIsNone(entry)
+
+    def test_get_entry_needs_update(self):
+        cache = self._build_cache()
+        entry = self._build_entry()
+        volume_ref = {'host': 'foo@bar#whatever'}
+        image_meta = {'updated_at': '2015-02-01T00:00:00.000000'}
+        (self.mock_db.
+         image_volume_cache_get_and_update_last_used.return_value) = entry
+        mock_volume = mock.Mock()
+        self.mock_db.volume_get.return_value = mock_volume
+
+        found_entry = cache.get_entry(self.context, volume_ref,
+                                      entry['image_id'], image_meta)
+
+        # Expect that the cache entry is not returned and the image-volume
+        # for it is deleted.
+        self.assertIsNone(found_entry)
+        self.mock_volume_api.delete.assert_called_with(self.context,
+                                                       mock_volume,
+                                                       force=True)
+
+    def test_get_entry_checksum_changed(self):
+        cache = self._build_cache()
+        entry = self._build_entry(checksum='abc')
+        volume_ref = {'host': 'foo@bar#whatever'}
+        image_meta = {'updated_at': self.updated_at, 'checksum': 'def'}
+        (self.mock_db.
+         image_volume_cache_get_and_update_last_used.return_value) = entry
+
+        found_entry = cache.get_entry(self.context, volume_ref,
+                                      entry['image_id'], image_meta)
+
+        self.assertIsNone(found_entry)
+        self.mock_db.image_volume_cache_delete.assert_called_once_with(
+            self.context, entry['volume_id'])
+
+    def test_create_cache_entry(self):
+        cache = self._build_cache()
+        volume_ref = {'id': 'volume', 'host': 'foo@bar#whatever',
+                      'size': 10}
+        image_meta = {'updated_at': '2015-01-01T00:00:00.000000Z',
+                      'checksum': 'abc'}
+        self.mock_db.image_volume_cache_create.return_value = (
+            self._build_entry())
+
+        cache.create_cache_entry(self.context, volume_ref, 'image',
+                                 image_meta)
+
+        self.mock_db.image_volume_cache_create.assert_called_once_with(
+            self.context, volume_ref['host'], 'image', self.updated_at,
+            volume_ref['id'], volume_ref['size'], image_checksum='abc')
+
+    def test_ensure_space_unlimited(self):
+        cache = self._build_cache(max_gb=0, max_count=0)
+        self.assertTrue(cache.ensure_space(self.context, 1000, 'host'))
+        self.assertFalse(
+            self.mock_db.image_volume_cache_get_all_for_host.called)
+
+    def test_ensure_space_no_entries(self):
+        cache = self._build_cache(max_gb=100, max_count=10)
+        self.mock_db.image_volume_cache_get_all_for_host.return_value = []
+
+        self.assertTrue(cache.ensure_space(self.context, 50, 'host'))
+        self.assertFalse(self.mock_volume_api.delete.called)
+
+    def test_ensure_space_need_gb(self):
+        cache = self._build_cache(max_gb=30, max_count=0)
+        entries = [self._build_entry(size=12) for _i in range(3)]
+        for i, entry in enumerate(entries):
+            entry['volume_id'] = 'volume%d' % i
+        self.mock_db.image_volume_cache_get_all_for_host.return_value = (
+            list(entries))
+
+        self.assertTrue(cache.ensure_space(self.context, 15, 'host'))
+
+        # The two least recently used entries are evicted, the count is
+        # unlimited.
+        self.assertEqual(
+            [mock.call(self.context, 'volume2'),
+             mock.call(self.context, 'volume1')],
+            self.mock_db.image_volume_cache_delete.call_args_list)
+
+    def test_ensure_space_need_count(self):
+        cache = self._build_cache(max_gb=0, max_count=2)
+        entries = [self._build_entry(size=12) for _i in range(2)]
+        for i, entry in enumerate(entries):
+            entry['volume_id'] = 'volume%d' % i
+        self.mock_db.image_volume_cache_get_all_for_host.return_value = (
+            list(entries))
+
+        self.assertTrue(cache.ensure_space(self.context, 1000, 'host'))
+
+        self.mock_db.image_volume_cache_delete.assert_called_once_with(
+            self.context, 'volume1')
+
+    def test_ensure_space_cant_free_enough_gb(self):
+        cache = self._build_cache(max_gb=30, max_count=10)
+        self.assertFalse(cache.ensure_space(self.context, 31, 'host'))
+        self.assertFalse(self.mock_db.image_volume_cache_delete.called)
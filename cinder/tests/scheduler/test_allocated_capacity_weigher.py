@@ -49,7 +49,7 @@ class AllocatedCapacityWeigherTestCase(test.TestCase):
                                          disabled=disabled)
         host_states = self.host_manager.get_all_host_states(ctxt)
         _mock_service_get_all_by_topic.assert_called_once_with(
-            ctxt, CONF.volume_topic, disabled=disabled)
+            ctxt, CONF.volume_topic, disabled=disabled, use_slave=False)
         return host_states
 
     def test_default_of_spreading_first(self):
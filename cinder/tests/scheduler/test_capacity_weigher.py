@@ -49,7 +49,7 @@ class CapacityWeigherTestCase(test.TestCase):
                                          disabled=disabled)
         host_states = self.host_manager.get_all_host_states(ctxt)
         _mock_service_get_all_by_topic.assert_called_once_with(
-            ctxt, CONF.volume_topic, disabled=disabled)
+            ctxt, CONF.volume_topic, disabled=disabled, use_slave=False)
         return host_states
 
     # If thin_provisioning_support = False, use the following formula:
@@ -125,3 +125,21 @@ class CapacityWeigherTestCase(test.TestCase):
         self.assertEqual(weighed_host.weight, 1120.0 * 2)
         self.assertEqual(
             utils.extract_host(weighed_host.obj.host), 'host2')
+
+    def test_weigh_object_single_host(self):
+        hostinfo_list = self._get_all_hosts()
+        weigher = CapacityWeigher()
+        weights = dict((utils.extract_host(host.host),
+                        weigher._weigh_object(host, {}))
+                       for host in hostinfo_list)
+        self.assertEqual({'host1': 922.0, 'host2': 1120.0, 'host3': 256.0,
+                          'host4': -101.0, 'host5': -1}, weights)
+
+    def test_capacity_weight_multiplier_zero(self):
+        self.flags(capacity_weight_multiplier=0.0)
+        hostinfo_list = self._get_all_hosts()
+        with mock.patch.object(CapacityWeigher,
+                               '_weigh_objects') as mock_weigh:
+            weighed_host = self._get_weighed_host(hostinfo_list)
+        self.assertFalse(mock_weigh.called)
+        self.assertEqual(0.0, weighed_host.weight)
@@ -49,6 +49,15 @@ class ChanceWeigherTestCase(test.TestCase):
         weight = weigher._weigh_object(host_state, None)
         self.assertEqual(3.0, weight)
 
+    @mock.patch('random.random')
+    def test_chance_weigher_weigh_objects(self, _mock_random):
+        weigher = ChanceWeigher()
+        _mock_random.side_effect = self.fake_random
+        self.fake_random(reset=True)
+        host_states = [{'host': 'host%s' % x} for x in xrange(3)]
+        self.assertEqual([1.0, 2.0, 3.0],
+                         weigher._weigh_objects(host_states, None))
+
     def test_host_manager_choosing_chance_weigher(self):
         # ensure HostManager can load the ChanceWeigher
         # via the entry points mechanism
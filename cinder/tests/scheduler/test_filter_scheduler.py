@@ -17,6 +17,7 @@ Tests For Filter Scheduler.
 """
 
 import mock
+from oslo_config import cfg
 
 from cinder import context
 from cinder import exception
@@ -26,6 +27,8 @@ from cinder.tests.scheduler import fakes
 from cinder.tests.scheduler import test_scheduler
 from cinder.volume import utils
 
+CONF = cfg.CONF
+
 
 class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
     """Test case for Filter Scheduler."""
@@ -162,6 +165,149 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
         self.assertIsNotNone(weighed_host.obj)
         self.assertTrue(_mock_service_get_all_by_topic.called)
 
+    @mock.patch('cinder.rpc.get_notifier')
+    @mock.patch('cinder.db.service_get_all_by_topic')
+    def test_schedule_records_trace(self, _mock_service_get_all_by_topic,
+                                    _mock_get_notifier):
+        self.flags(scheduler_trace_top_hosts=2,
+                   scheduler_trace_notifications=True)
+        sched = fakes.FakeFilterScheduler()
+        sched.host_manager = fakes.FakeHostManager()
+        fake_context = context.RequestContext('user', 'project',
+                                              is_admin=True)
+
+        fakes.mock_host_manager_db_calls(_mock_service_get_all_by_topic)
+
+        request_spec = {'volume_id': 'fake-id1',
+                        'volume_type': {'name': 'LVM_iSCSI'},
+                        'volume_properties': {'project_id': 1,
+                                              'size': 1}}
+        weighed_host = sched._schedule(fake_context, request_spec, {})
+
+        traces = sched.get_traces(fake_context)
+        self.assertEqual(1, len(traces))
+        trace = traces[0]
+        self.assertEqual('fake-id1', trace['volume_id'])
+        self.assertEqual(CONF.scheduler_default_filters,
+                         [stat['name'] for stat in trace['filters']])
+        self.assertEqual(CONF.scheduler_default_weighers,
+                         [stat['name'] for stat in trace['weighers']])
+        for stat in trace['filters']:
+            self.assertTrue(stat['objects_out'] <= stat['objects_in'])
+        self.assertEqual(2, len(trace['weighed_hosts']))
+        self.assertEqual(weighed_host.obj.host,
+                         trace['weighed_hosts'][0]['host'])
+        _mock_get_notifier.return_value.info.assert_called_once_with(
+            fake_context, 'scheduler.trace', trace)
+
+    def test_schedule_trace_disabled(self):
+        self.flags(scheduler_trace_history=0)
+        sched = fakes.FakeFilterScheduler()
+
+        fake_context = context.RequestContext('user', 'project')
+        request_spec = {'volume_properties': {'project_id': 1,
+                                              'size': 1},
+                        'volume_type': {'name': 'LVM_iSCSI'},
+                        'volume_id': 'fake-id1'}
+        self.assertIsNone(sched._schedule(fake_context, request_spec, {}))
+        self.assertEqual([], sched.get_traces(fake_context))
+
+    def test_schedule_create_volumes_no_hosts(self):
+        sched = fakes.FakeFilterScheduler()
+
+        fake_context = context.RequestContext('user', 'project')
+        request_spec = {'volume_properties': {'project_id': 1,
+                                              'size': 1},
+                        'volume_type': {'name': 'LVM_iSCSI'},
+                        'volume_id': 'fake-id1',
+                        'snapshot_id': None,
+                        'image_id': None}
+        placements = sched.schedule_create_volumes(fake_context,
+                                                   [request_spec])
+        self.assertEqual(1, len(placements))
+        self.assertIsInstance(placements[0], exception.NoValidHost)
+
+    @mock.patch('cinder.db.service_get_all_by_topic')
+    def test_schedule_create_volumes_incomplete_request_spec(
+            self, _mock_service_get_all_by_topic):
+        sched = fakes.FakeFilterScheduler()
+        sched.host_manager = fakes.FakeHostManager()
+        fake_context = context.RequestContext('user', 'project',
+                                              is_admin=True)
+
+        fakes.mock_host_manager_db_calls(_mock_service_get_all_by_topic)
+
+        request_spec_list = [{'volume_id': 'fake-id%d' % i,
+                              'snapshot_id': None,
+                              'image_id': None,
+                              'volume_type': {'name': 'LVM_iSCSI'},
+                              'volume_properties': {'project_id': 1,
+                                                    'size': 1}}
+                             for i in range(2)]
+        del request_spec_list[0]['volume_properties']
+        with mock.patch.object(sched, '_create_volume_on_host') as create:
+            placements = sched.schedule_create_volumes(fake_context,
+                                                       request_spec_list)
+
+        self.assertIsInstance(placements[0], exception.InvalidInput)
+        self.assertIsNotNone(utils.extract_host(placements[1]))
+        self.assertEqual(1, create.call_count)
+
+    @mock.patch('cinder.db.service_get_all_by_topic')
+    def test_schedule_create_volumes_consumes_capacity(
+            self, _mock_service_get_all_by_topic):
+        sched = fakes.FakeFilterScheduler()
+        sched.host_manager = fakes.FakeHostManager()
+        fake_context = context.RequestContext('user', 'project',
+                                              is_admin=True)
+
+        fakes.mock_host_manager_db_calls(_mock_service_get_all_by_topic)
+
+        request_spec_list = [{'volume_id': 'fake-id%d' % i,
+                              'snapshot_id': None,
+                              'image_id': None,
+                              'volume_type': {'name': 'LVM_iSCSI'},
+                              'volume_properties': {'project_id': 1,
+                                                    'size': 600}}
+                             for i in range(2)]
+        with mock.patch.object(sched, '_create_volume_on_host') as create:
+            hosts = sched.schedule_create_volumes(fake_context,
+                                                  request_spec_list)
+
+        # The first volume uses up most of host1, so the second one has to
+        # go elsewhere.
+        self.assertEqual('host1', utils.extract_host(hosts[0]))
+        self.assertNotEqual('host1', utils.extract_host(hosts[1]))
+        self.assertEqual(2, create.call_count)
+        self.assertEqual(1, _mock_service_get_all_by_topic.call_count)
+
+    @mock.patch('cinder.db.service_get_all_by_topic')
+    def test_schedule_create_volumes_failure_does_not_stop_batch(
+            self, _mock_service_get_all_by_topic):
+        sched = fakes.FakeFilterScheduler()
+        sched.host_manager = fakes.FakeHostManager()
+        fake_context = context.RequestContext('user', 'project',
+                                              is_admin=True)
+
+        fakes.mock_host_manager_db_calls(_mock_service_get_all_by_topic)
+
+        request_spec_list = [{'volume_id': 'fake-id%d' % i,
+                              'snapshot_id': None,
+                              'image_id': None,
+                              'volume_type': {'name': 'LVM_iSCSI'},
+                              'volume_properties': {'project_id': 1,
+                                                    'size': 1}}
+                             for i in range(2)]
+        not_found = exception.VolumeNotFound(volume_id='fake-id0')
+        with mock.patch.object(sched, '_create_volume_on_host',
+                               side_effect=[not_found, None]) as create:
+            placements = sched.schedule_create_volumes(fake_context,
+                                                       request_spec_list)
+
+        self.assertEqual(not_found, placements[0])
+        self.assertIsNotNone(utils.extract_host(placements[1]))
+        self.assertEqual(2, create.call_count)
+
     def test_max_attempts(self):
         self.flags(scheduler_max_attempts=4)
 
@@ -555,6 +555,23 @@ class AffinityFilterTestCase(HostFiltersTestCase):
 
         self.assertFalse(filt_cls.host_passes(host, filter_properties))
 
+    def test_affinity_hosts_looked_up_once(self):
+        filt_cls = self.class_map['SameBackendFilter']()
+        host1 = fakes.FakeHostState('host1', {})
+        host2 = fakes.FakeHostState('host2', {})
+        volume = utils.create_volume(self.context, host='host1')
+        vol_id = volume.id
+
+        filter_properties = {'context': self.context.elevated(),
+                             'scheduler_hints': {
+            'same_host': [vol_id], }}
+
+        with mock.patch.object(filt_cls.volume_api, 'get_all',
+                               wraps=filt_cls.volume_api.get_all) as get_all:
+            self.assertTrue(filt_cls.host_passes(host1, filter_properties))
+            self.assertFalse(filt_cls.host_passes(host2, filter_properties))
+            self.assertEqual(1, get_all.call_count)
+
 
 class DriverFilterTestCase(HostFiltersTestCase):
     def test_passing_function(self):
@@ -910,3 +927,75 @@ class InstanceLocalityFilterTestCase(HostFiltersTestCase):
                 {'local_to_instance': 'e29b11d4-15ef-34a9-a716-598a6f0b5467'}}
         self.assertRaises(exception.APITimeout,
                           filt_cls.host_passes, host, filter_properties)
+
+
+class CapabilitiesFilterTestCase(HostFiltersTestCase):
+    def setUp(self):
+        super(CapabilitiesFilterTestCase, self).setUp()
+        self.filt_cls = self.class_map['CapabilitiesFilter']()
+
+    def _get_filter_properties(self, extra_specs):
+        return {'resource_type': {'name': 'fake_type',
+                                  'extra_specs': extra_specs}}
+
+    def test_capability_filter_passes(self):
+        host = fakes.FakeHostState('host1',
+                                   {'capabilities': {'opt1': 'match'}})
+        filter_properties = self._get_filter_properties({'opt1': 'match'})
+        self.assertTrue(self.filt_cls.host_passes(host, filter_properties))
+
+    def test_capability_filter_fails(self):
+        host = fakes.FakeHostState('host1',
+                                   {'capabilities': {'opt1': 'match'}})
+        filter_properties = self._get_filter_properties({'opt1': 'no-match'})
+        self.assertFalse(self.filt_cls.host_passes(host, filter_properties))
+
+    @mock.patch('cinder.openstack.common.scheduler.filters.extra_specs_ops.'
+                'match', return_value=True)
+    def test_capability_filter_caches_match(self, _mock_match):
+        host = fakes.FakeHostState('host1',
+                                   {'capabilities': {'opt1': 'match'}})
+        filter_properties = self._get_filter_properties({'opt1': 'match'})
+        self.assertTrue(self.filt_cls.host_passes(host, filter_properties))
+        # A new filter instance, as created for every request, reuses the
+        # result as long as neither the capabilities nor the specs change.
+        filt_cls = self.class_map['CapabilitiesFilter']()
+        self.assertTrue(filt_cls.host_passes(host, filter_properties))
+        self.assertEqual(1, _mock_match.call_count)
+
+    def test_capability_filter_extra_specs_updated(self):
+        host = fakes.FakeHostState('host1',
+                                   {'capabilities': {'opt1': 'match'}})
+        filter_properties = self._get_filter_properties({'opt1': 'match'})
+        self.assertTrue(self.filt_cls.host_passes(host, filter_properties))
+        filter_properties = self._get_filter_properties({'opt1': 'no-match'})
+        self.assertFalse(self.filt_cls.host_passes(host, filter_properties))
+
+    def test_capability_filter_capabilities_updated(self):
+        host = fakes.FakeHostState('host1',
+                                   {'capabilities': {'opt1': 'match'}})
+        filter_properties = self._get_filter_properties({'opt1': 'match'})
+        self.assertTrue(self.filt_cls.host_passes(host, filter_properties))
+        host.capabilities = {'opt1': 'no-match'}
+        self.assertFalse(self.filt_cls.host_passes(host, filter_properties))
+
+    def test_capability_filter_matches_kept_per_host_state(self):
+        host = fakes.FakeHostState('host1',
+                                   {'capabilities': {'opt1': 'match'}})
+        filter_properties = self._get_filter_properties({'opt1': 'match'})
+        self.assertTrue(self.filt_cls.host_passes(host, filter_properties))
+        self.assertEqual({frozenset([('opt1', 'match')]): True},
+                         host.capabilities_matches[1])
+        # A host state of the same host created anew, e.g. once the host came
+        # back after being removed, starts without any results.
+        new_host = fakes.FakeHostState('host1',
+                                       {'capabilities': {'opt1': 'other'}})
+        self.assertIsNone(new_host.capabilities_matches)
+        self.assertFalse(self.filt_cls.host_passes(new_host,
+                                                   filter_properties))
+
+    def test_capability_filter_no_extra_specs(self):
+        host = fakes.FakeHostState('host1',
+                                   {'capabilities': {'opt1': 'match'}})
+        filter_properties = self._get_filter_properties({})
+        self.assertTrue(self.filt_cls.host_passes(host, filter_properties))
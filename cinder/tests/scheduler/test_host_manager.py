@@ -24,6 +24,7 @@ from cinder import exception
 from cinder.openstack.common.scheduler import filters
 from cinder.scheduler import host_manager
 from cinder import test
+from cinder import utils
 
 
 CONF = cfg.CONF
@@ -84,6 +85,24 @@ class HostManagerTestCase(test.TestCase):
         self.assertEqual(expected, mock_func.call_args_list)
         self.assertEqual(set(result), set(self.fake_hosts))
 
+    @mock.patch('cinder.scheduler.host_manager.HostManager.'
+                '_choose_host_filters')
+    def test_get_filtered_hosts_stats(self, _mock_choose_host_filters):
+        filter_class = FakeFilterClass1
+        filter_class._filter_one = mock.Mock(
+            side_effect=[True, False, False, False])
+        _mock_choose_host_filters.return_value = [filter_class]
+
+        stats = []
+        result = self.host_manager.get_filtered_hosts(self.fake_hosts, {},
+                                                      stats=stats)
+        self.assertEqual([self.fake_hosts[0]], result)
+        self.assertEqual(1, len(stats))
+        self.assertEqual('FakeFilterClass1', stats[0]['name'])
+        self.assertEqual(4, stats[0]['objects_in'])
+        self.assertEqual(1, stats[0]['objects_out'])
+        self.assertIn('elapsed', stats[0])
+
     @mock.patch('oslo_utils.timeutils.utcnow')
     def test_update_service_capabilities(self, _mock_utcnow):
         service_states = self.host_manager.service_states
@@ -116,6 +135,48 @@ class HostManagerTestCase(test.TestCase):
                     'host3': host3_volume_capabs}
         self.assertDictMatch(service_states, expected)
 
+    def test_update_service_capabilities_delta(self):
+        full = {'volume_backend_name': 'AAA',
+                'pools': [{'pool_name': 'a', 'free_capacity_gb': 5},
+                          {'pool_name': 'b', 'free_capacity_gb': 5}]}
+        self.host_manager.update_service_capabilities(
+            'volume', 'host1', full, capabilities_version=1)
+        new = {'volume_backend_name': 'AAA',
+               'pools': [{'pool_name': 'a', 'free_capacity_gb': 4},
+                         {'pool_name': 'b', 'free_capacity_gb': 5}]}
+        delta = utils.get_capabilities_delta(full, new)
+        self.host_manager.update_service_capabilities(
+            'volume', 'host1', delta, capabilities_version=2, base_version=1)
+
+        caps = self.host_manager.service_states['host1']
+        self.assertEqual('AAA', caps['volume_backend_name'])
+        self.assertEqual(new['pools'], caps['pools'])
+        self.assertEqual(2, self.host_manager.capabilities_versions['host1'])
+
+    def test_update_service_capabilities_delta_mismatch(self):
+        self.host_manager.update_service_capabilities(
+            'volume', 'host1', {'free_capacity_gb': 5},
+            capabilities_version=1)
+        delta = utils.get_capabilities_delta({'free_capacity_gb': 5},
+                                             {'free_capacity_gb': 4})
+        self.assertRaises(exception.CapabilitiesVersionMismatch,
+                          self.host_manager.update_service_capabilities,
+                          'volume', 'host1', delta,
+                          capabilities_version=3, base_version=2)
+        self.assertRaises(exception.CapabilitiesVersionMismatch,
+                          self.host_manager.update_service_capabilities,
+                          'volume', 'host2', delta,
+                          capabilities_version=3, base_version=2)
+        self.assertEqual(5, self.host_manager.service_states['host1']
+                         ['free_capacity_gb'])
+
+    def test_update_service_capabilities_copies_pools(self):
+        pool = {'pool_name': 'a', 'free_capacity_gb': 5}
+        self.host_manager.update_service_capabilities(
+            'volume', 'host1', {'pools': [pool]}, capabilities_version=1)
+        self.host_manager.service_states['host1']['pools'][0]['foo'] = 'bar'
+        self.assertNotIn('foo', pool)
+
     @mock.patch('cinder.db.service_get_all_by_topic')
     @mock.patch('cinder.utils.service_is_up')
     @mock.patch('oslo_utils.timeutils.utcnow')
@@ -171,6 +232,7 @@ class HostManagerTestCase(test.TestCase):
     @mock.patch('cinder.utils.service_is_up')
     def test_get_all_host_states(self, _mock_service_is_up,
                                  _mock_service_get_all_by_topic):
+        self.flags(scheduler_service_cache_ttl=0)
         context = 'fake_context'
         topic = CONF.volume_topic
 
@@ -195,7 +257,8 @@ class HostManagerTestCase(test.TestCase):
         self.host_manager.get_all_host_states(context)
         _mock_service_get_all_by_topic.assert_called_with(context,
                                                           topic,
-                                                          disabled=False)
+                                                          disabled=False,
+                                                          use_slave=False)
         expected = []
         for service in services:
             expected.append(mock.call(service))
@@ -219,7 +282,8 @@ class HostManagerTestCase(test.TestCase):
         self.host_manager.get_all_host_states(context)
         _mock_service_get_all_by_topic.assert_called_with(context,
                                                           topic,
-                                                          disabled=False)
+                                                          disabled=False,
+                                                          use_slave=False)
         expected = []
         for service in services:
             expected.append(mock.call(service))
@@ -239,6 +303,97 @@ class HostManagerTestCase(test.TestCase):
             self.assertEqual(host_state_map[host].service,
                              volume_node)
 
+    @mock.patch('cinder.db.service_get_all_by_topic')
+    @mock.patch('cinder.utils.service_is_up')
+    def test_get_all_host_states_caches_services(
+            self, _mock_service_is_up, _mock_service_get_all_by_topic):
+        context = 'fake_context'
+        services = [
+            dict(id=1, host='host1', topic='volume', disabled=False,
+                 availability_zone='zone1', updated_at=timeutils.utcnow()),
+        ]
+        _mock_service_get_all_by_topic.return_value = services
+        _mock_service_is_up.return_value = True
+
+        self.host_manager.get_all_host_states(context)
+        self.host_manager.get_all_host_states(context)
+        self.assertEqual(1, _mock_service_get_all_by_topic.call_count)
+
+        # A known host reporting does not invalidate the cache
+        self.host_manager.update_service_capabilities('volume', 'host1',
+                                                      {})
+        self.host_manager.get_all_host_states(context)
+        self.assertEqual(1, _mock_service_get_all_by_topic.call_count)
+
+        # An unknown host reporting does
+        self.host_manager.update_service_capabilities('volume', 'host2',
+                                                      {})
+        self.host_manager.get_all_host_states(context)
+        self.assertEqual(2, _mock_service_get_all_by_topic.call_count)
+
+    @mock.patch('cinder.db.service_get_all_by_topic')
+    @mock.patch('cinder.utils.service_is_up')
+    @mock.patch('time.time')
+    def test_get_all_host_states_service_cache_expires(
+            self, _mock_time, _mock_service_is_up,
+            _mock_service_get_all_by_topic):
+        self.flags(scheduler_service_cache_ttl=10)
+        context = 'fake_context'
+        _mock_service_get_all_by_topic.return_value = []
+        _mock_time.return_value = 100
+
+        self.host_manager.get_all_host_states(context)
+        _mock_time.return_value = 109
+        self.host_manager.get_all_host_states(context)
+        self.assertEqual(1, _mock_service_get_all_by_topic.call_count)
+
+        _mock_time.return_value = 110
+        self.host_manager.get_all_host_states(context)
+        self.assertEqual(2, _mock_service_get_all_by_topic.call_count)
+
+    @mock.patch('cinder.db.service_get_all_by_topic')
+    @mock.patch('cinder.utils.service_is_up')
+    def test_get_all_host_states_skips_unchanged_hosts(
+            self, _mock_service_is_up, _mock_service_get_all_by_topic):
+        context = 'fake_context'
+        services = [
+            dict(id=1, host='host1', topic='volume', disabled=False,
+                 availability_zone='zone1', updated_at=timeutils.utcnow()),
+        ]
+        _mock_service_get_all_by_topic.return_value = services
+        _mock_service_is_up.return_value = True
+        self.host_manager.update_service_capabilities(
+            'volume', 'host1', dict(free_capacity_gb=100))
+
+        with mock.patch.object(host_manager.HostState,
+                               'update_from_volume_capability') as update:
+            self.host_manager.get_all_host_states(context)
+            self.host_manager.get_all_host_states(context)
+            self.assertEqual(1, update.call_count)
+
+            self.host_manager.update_service_capabilities(
+                'volume', 'host1', dict(free_capacity_gb=50))
+            self.host_manager.get_all_host_states(context)
+            self.assertEqual(2, update.call_count)
+
+    @mock.patch('cinder.db.service_get_all_by_topic', return_value=[])
+    def test_scheduling_reads_services_from_primary(self, _mock_get_all):
+        context = 'fake_context'
+
+        self.host_manager.get_pools(context)
+        _mock_get_all.assert_called_once_with(context, CONF.volume_topic,
+                                              disabled=False, use_slave=True)
+
+        # The cached list read from the slave is not good enough to tell
+        # which services are up when scheduling.
+        _mock_get_all.reset_mock()
+        self.host_manager.get_all_host_states(context)
+        self.host_manager.get_all_host_states(context)
+        self.host_manager.get_pools(context)
+        _mock_get_all.assert_called_once_with(context, CONF.volume_topic,
+                                              disabled=False,
+                                              use_slave=False)
+
     @mock.patch('cinder.db.service_get_all_by_topic')
     @mock.patch('cinder.utils.service_is_up')
     def test_get_pools(self, _mock_service_is_up,
@@ -82,7 +82,10 @@ class SchedulerRpcAPITestCase(test.TestCase):
                                  service_name='fake_name',
                                  host='fake_host',
                                  capabilities='fake_capabilities',
-                                 fanout=True)
+                                 capabilities_version=2,
+                                 base_version=1,
+                                 fanout=True,
+                                 version='1.9')
 
     def test_create_volume(self):
         self._test_scheduler_api('create_volume',
@@ -95,6 +98,14 @@ class SchedulerRpcAPITestCase(test.TestCase):
                                  filter_properties='filter_properties',
                                  version='1.2')
 
+    def test_create_volumes(self):
+        self._test_scheduler_api('create_volumes',
+                                 rpc_method='cast',
+                                 topic='topic',
+                                 request_spec_list=['fake_request_spec'],
+                                 filter_properties_list=['filter_properties'],
+                                 version='1.8')
+
     def test_migrate_volume_to_host(self):
         self._test_scheduler_api('migrate_volume_to_host',
                                  rpc_method='cast',
@@ -129,3 +140,8 @@ class SchedulerRpcAPITestCase(test.TestCase):
                                  rpc_method='call',
                                  filters=None,
                                  version='1.7')
+
+    def test_get_traces(self):
+        self._test_scheduler_api('get_traces',
+                                 rpc_method='call',
+                                 version='1.10')
@@ -69,7 +69,9 @@ class SchedulerManagerTestCase(test.TestCase):
         self.manager.update_service_capabilities(self.context,
                                                  service_name=service,
                                                  host=host)
-        _mock_update_cap.assert_called_once_with(service, host, {})
+        _mock_update_cap.assert_called_once_with(service, host, {},
+                                                 capabilities_version=None,
+                                                 base_version=None)
 
     @mock.patch('cinder.scheduler.driver.Scheduler.'
                 'update_service_capabilities')
@@ -83,7 +85,30 @@ class SchedulerManagerTestCase(test.TestCase):
                                                  service_name=service,
                                                  host=host,
                                                  capabilities=capabilities)
-        _mock_update_cap.assert_called_once_with(service, host, capabilities)
+        _mock_update_cap.assert_called_once_with(service, host, capabilities,
+                                                 capabilities_version=None,
+                                                 base_version=None)
+
+    @mock.patch('cinder.volume.rpcapi.VolumeAPI.'
+                'publish_service_capabilities')
+    @mock.patch('cinder.scheduler.driver.Scheduler.'
+                'update_service_capabilities')
+    def test_update_service_capabilities_version_mismatch(
+            self, _mock_update_cap, _mock_publish):
+        # A delta that cannot be applied makes the scheduler ask the
+        # service for a full report.
+        service = 'volume'
+        host = 'fake_host'
+        _mock_update_cap.side_effect = exception.CapabilitiesVersionMismatch(
+            host=host, version=3, base_version=2, known_version=1)
+
+        self.manager.update_service_capabilities(self.context,
+                                                 service_name=service,
+                                                 host=host,
+                                                 capabilities={},
+                                                 capabilities_version=3,
+                                                 base_version=2)
+        _mock_publish.assert_called_once_with(self.context, host=host)
 
     @mock.patch('cinder.scheduler.driver.Scheduler.schedule_create_volume')
     @mock.patch('cinder.db.volume_update')
@@ -105,6 +130,60 @@ class SchedulerManagerTestCase(test.TestCase):
         _mock_sched_create.assert_called_once_with(self.context, request_spec,
                                                    {})
 
+    @mock.patch('cinder.scheduler.driver.Scheduler.schedule_create_volumes')
+    @mock.patch('cinder.db.volume_update')
+    def test_create_volumes_puts_unplaced_volumes_in_error_state(
+            self, _mock_volume_update, _mock_sched_create):
+        _mock_sched_create.return_value = ['host1',
+                                           exception.NoValidHost(reason="")]
+        topic = 'fake_topic'
+        request_spec_list = [{'volume_id': 1}, {'volume_id': 2}]
+
+        self.manager.create_volumes(self.context, topic, request_spec_list,
+                                    filter_properties_list=None)
+        _mock_volume_update.assert_called_once_with(self.context, 2,
+                                                    {'status': 'error'})
+        _mock_sched_create.assert_called_once_with(self.context,
+                                                   request_spec_list, None)
+
+    @mock.patch('cinder.scheduler.manager.SchedulerManager.'
+                '_set_volume_state_and_notify')
+    @mock.patch('cinder.scheduler.driver.Scheduler.schedule_create_volumes')
+    def test_create_volumes_notifies_each_failure(self, _mock_sched_create,
+                                                  _mock_notify):
+        rpc_error = test.TestingException()
+        not_found = exception.VolumeNotFound(volume_id=1)
+        _mock_sched_create.return_value = [not_found, rpc_error, 'host1']
+        _mock_notify.side_effect = [not_found, None]
+        request_spec_list = [{'volume_id': 1}, {'volume_id': 2},
+                             {'volume_id': 3}]
+
+        self.manager.create_volumes(self.context, 'fake_topic',
+                                    request_spec_list)
+
+        volume_state = {'volume_state': {'status': 'error'}}
+        self.assertEqual(
+            [mock.call('create_volume', volume_state, self.context,
+                       not_found, request_spec_list[0]),
+             mock.call('create_volume', volume_state, self.context,
+                       rpc_error, request_spec_list[1])],
+            _mock_notify.call_args_list)
+
+    @mock.patch('cinder.scheduler.driver.Scheduler.schedule_create_volumes')
+    @mock.patch('cinder.db.volume_update')
+    def test_create_volumes_batch_failure_puts_volumes_in_error_state(
+            self, _mock_volume_update, _mock_sched_create):
+        _mock_sched_create.side_effect = test.TestingException()
+        request_spec_list = [{'volume_id': 1}, {'volume_id': 2}]
+
+        self.assertRaises(test.TestingException,
+                          self.manager.create_volumes, self.context,
+                          'fake_topic', request_spec_list)
+        self.assertEqual(
+            [mock.call(self.context, 1, {'status': 'error'}),
+             mock.call(self.context, 2, {'status': 'error'})],
+            _mock_volume_update.call_args_list)
+
     @mock.patch('cinder.scheduler.driver.Scheduler.host_passes_filters')
     @mock.patch('cinder.db.volume_update')
     def test_migrate_volume_exception_returns_volume_state(
@@ -30,20 +30,23 @@ from cinder.volume import utils
 CONF = cfg.CONF
 
 
-def fake_volume_data_get_for_host(context, host, count_only=False):
-    host = utils.extract_host(host)
-    if host == 'host1':
-        return 1
-    elif host == 'host2':
-        return 2
-    elif host == 'host3':
-        return 3
-    elif host == 'host4':
-        return 4
-    elif host == 'host5':
-        return 5
-    else:
-        return 6
+def fake_volume_count_get_by_host(context, hosts):
+    counts = {}
+    for host in hosts:
+        backend = utils.extract_host(host)
+        if backend == 'host1':
+            counts[host] = 1
+        elif backend == 'host2':
+            counts[host] = 2
+        elif backend == 'host3':
+            counts[host] = 3
+        elif backend == 'host4':
+            counts[host] = 4
+        elif backend == 'host5':
+            counts[host] = 5
+        else:
+            counts[host] = 6
+    return counts
 
 
 class VolumeNumberWeigherTestCase(test.TestCase):
@@ -67,7 +70,7 @@ class VolumeNumberWeigherTestCase(test.TestCase):
                                          disabled=disabled)
         host_states = self.host_manager.get_all_host_states(ctxt)
         _mock_service_get_all_by_topic.assert_called_once_with(
-            ctxt, CONF.volume_topic, disabled=disabled)
+            ctxt, CONF.volume_topic, disabled=disabled, use_slave=False)
         return host_states
 
     def test_volume_number_weight_multiplier1(self):
@@ -80,8 +83,8 @@ class VolumeNumberWeigherTestCase(test.TestCase):
         # host4: 4 volumes
         # host5: 5 volumes
         # so, host1 should win:
-        with mock.patch.object(api, 'volume_data_get_for_host',
-                               fake_volume_data_get_for_host):
+        with mock.patch.object(api, 'volume_count_get_by_host',
+                               fake_volume_count_get_by_host):
             weighed_host = self._get_weighed_host(hostinfo_list)
             self.assertEqual(weighed_host.weight, -1.0)
             self.assertEqual(utils.extract_host(weighed_host.obj.host),
@@ -97,9 +100,18 @@ class VolumeNumberWeigherTestCase(test.TestCase):
         # host4: 4 volumes
         # host5: 5 volumes
         # so, host5 should win:
-        with mock.patch.object(api, 'volume_data_get_for_host',
-                               fake_volume_data_get_for_host):
+        with mock.patch.object(api, 'volume_count_get_by_host',
+                               fake_volume_count_get_by_host):
             weighed_host = self._get_weighed_host(hostinfo_list)
             self.assertEqual(weighed_host.weight, 5.0)
             self.assertEqual(utils.extract_host(weighed_host.obj.host),
                              'host5')
+
+    def test_volume_number_weight_single_query(self):
+        hostinfo_list = list(self._get_all_hosts())
+        with mock.patch.object(api, 'volume_count_get_by_host',
+                               return_value={}) as count_get:
+            weighed_host = self._get_weighed_host(hostinfo_list)
+            self.assertEqual(0.0, weighed_host.weight)
+            count_get.assert_called_once_with(
+                self.context, [host.host for host in hostinfo_list])
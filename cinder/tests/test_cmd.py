@@ -12,8 +12,12 @@
 
 import contextlib
 import datetime
+import json
+import os
+import shutil
 import StringIO
 import sys
+import tempfile
 
 import mock
 from oslo_config import cfg
@@ -343,6 +347,32 @@ class TestCinderManageCmd(test.TestCase):
         db_cmds.version()
         self.assertEqual(1, db_version.call_count)
 
+    @mock.patch('cinder.db.purge_deleted_rows')
+    @mock.patch('cinder.context.get_admin_context')
+    def test_db_commands_purge(self, get_admin_context, purge_deleted_rows):
+        ctxt = context.RequestContext('fake-user', 'fake-project')
+        get_admin_context.return_value = ctxt
+        purge_deleted_rows.return_value = {'volumes': 3, 'snapshots': 2}
+        db_cmds = cinder_manage.DbCommands()
+
+        with mock.patch('sys.stdout', new=StringIO.StringIO()) as fake_out:
+            db_cmds.purge(30, batch_size=100, sleep_interval=0.5)
+            progress = purge_deleted_rows.call_args[1]['progress']
+            progress('volumes', 3)
+
+        purge_deleted_rows.assert_called_once_with(
+            ctxt, 30, batch_size=100, sleep_interval=0.5, progress=mock.ANY)
+        self.assertEqual('Purged 5 rows in total\n'
+                         'Purged 3 rows from table volumes\n',
+                         fake_out.getvalue())
+
+    def test_db_commands_purge_bad_batch_size(self):
+        db_cmds = cinder_manage.DbCommands()
+        with mock.patch('sys.stdout', new=StringIO.StringIO()):
+            exit = self.assertRaises(SystemExit, db_cmds.purge, 30,
+                                     batch_size=0)
+        self.assertEqual(1, exit.code)
+
     @mock.patch('cinder.version.version_string')
     def test_versions_commands_list(self, version_string):
         version_cmds = cinder_manage.VersionCommands()
@@ -1111,7 +1141,8 @@ class TestCinderVolumeUsageAuditCmd(test.TestCase):
         get_logger.assert_called_once_with('cinder')
         rpc_init.assert_called_once_with(CONF)
         last_completed_audit_period.assert_called_once_with()
-        volume_get_active_by_window.assert_called_once_with(ctxt, begin, end)
+        volume_get_active_by_window.assert_called_once_with(
+            ctxt, begin, end, marker=None, limit=1000, use_slave=True)
         notify_about_volume_usage.assert_any_call(ctxt, volume1, 'exists',
                                                   extra_usage_info=extra_info)
         notify_about_volume_usage.assert_any_call(
@@ -1177,7 +1208,8 @@ class TestCinderVolumeUsageAuditCmd(test.TestCase):
         get_logger.assert_called_once_with('cinder')
         rpc_init.assert_called_once_with(CONF)
         last_completed_audit_period.assert_called_once_with()
-        volume_get_active_by_window.assert_called_once_with(ctxt, begin, end)
+        volume_get_active_by_window.assert_called_once_with(
+            ctxt, begin, end, marker=None, limit=1000, use_slave=True)
         notify_about_volume_usage.assert_any_call(
             ctxt, volume1, 'exists', extra_usage_info=extra_info)
         notify_about_volume_usage.assert_any_call(
@@ -1255,10 +1287,11 @@ class TestCinderVolumeUsageAuditCmd(test.TestCase):
         get_logger.assert_called_once_with('cinder')
         rpc_init.assert_called_once_with(CONF)
         last_completed_audit_period.assert_called_once_with()
-        volume_get_active_by_window.assert_called_once_with(ctxt, begin, end)
+        volume_get_active_by_window.assert_called_once_with(
+            ctxt, begin, end, marker=None, limit=1000, use_slave=True)
         self.assertFalse(notify_about_volume_usage.called)
-        notify_about_snapshot_usage.assert_any_call(ctxt, snapshot1, 'exists',
-                                                    extra_info)
+        notify_about_snapshot_usage.assert_any_call(
+            ctxt, snapshot1, 'exists', extra_usage_info=extra_info)
         notify_about_snapshot_usage.assert_any_call(
             ctxt, snapshot1, 'create.start',
             extra_usage_info=local_extra_info_create)
@@ -1332,7 +1365,8 @@ class TestCinderVolumeUsageAuditCmd(test.TestCase):
         get_logger.assert_called_once_with('cinder')
         rpc_init.assert_called_once_with(CONF)
         last_completed_audit_period.assert_called_once_with()
-        volume_get_active_by_window.assert_called_once_with(ctxt, begin, end)
+        volume_get_active_by_window.assert_called_once_with(
+            ctxt, begin, end, marker=None, limit=1000, use_slave=True)
         notify_about_volume_usage.assert_any_call(
             ctxt, volume1, 'exists', extra_usage_info=extra_info)
         notify_about_volume_usage.assert_any_call(
@@ -1348,8 +1382,8 @@ class TestCinderVolumeUsageAuditCmd(test.TestCase):
             ctxt, volume1, 'delete.end',
             extra_usage_info=extra_info_volume_delete)
 
-        notify_about_snapshot_usage.assert_any_call(ctxt, snapshot1,
-                                                    'exists', extra_info)
+        notify_about_snapshot_usage.assert_any_call(
+            ctxt, snapshot1, 'exists', extra_usage_info=extra_info)
         notify_about_snapshot_usage.assert_any_call(
             ctxt, snapshot1, 'create.start',
             extra_usage_info=extra_info_snapshot_create)
@@ -1362,3 +1396,100 @@ class TestCinderVolumeUsageAuditCmd(test.TestCase):
         notify_about_snapshot_usage.assert_any_call(
             ctxt, snapshot1, 'delete.end',
             extra_usage_info=extra_info_snapshot_delete)
+
+    @mock.patch('cinder.volume.utils.notify_about_snapshot_usage')
+    @mock.patch('cinder.db.snapshot_get_active_by_window')
+    @mock.patch('cinder.volume.utils.notify_about_volume_usage')
+    @mock.patch('cinder.db.volume_get_active_by_window')
+    @mock.patch('cinder.rpc.init')
+    @mock.patch('cinder.openstack.common.log.getLogger')
+    @mock.patch('cinder.openstack.common.log.setup')
+    @mock.patch('cinder.context.get_admin_context')
+    def test_main_in_batches(self, get_admin_context, log_setup, get_logger,
+                             rpc_init, volume_get_active_by_window,
+                             notify_about_volume_usage,
+                             snapshot_get_active_by_window,
+                             notify_about_snapshot_usage):
+        CONF.set_override('batch_size', 2)
+        CONF.set_override('notification_concurrency', 2)
+        CONF.set_override('start_time', '2014-01-01 01:00:00')
+        CONF.set_override('end_time', '2014-02-02 02:00:00')
+        begin = datetime.datetime(2014, 1, 1, 1, 0)
+        end = datetime.datetime(2014, 2, 2, 2, 0)
+        ctxt = context.RequestContext('fake-user', 'fake-project')
+        get_admin_context.return_value = ctxt
+        volumes = [mock.MagicMock(id=str(i)) for i in range(3)]
+        volume_get_active_by_window.side_effect = [volumes[:2], volumes[2:]]
+        snapshots = [mock.MagicMock(id=str(i)) for i in range(2)]
+        snapshot_get_active_by_window.side_effect = [snapshots, []]
+
+        volume_usage_audit.main()
+
+        self.assertEqual(
+            [mock.call(ctxt, begin, end, marker=None, limit=2,
+                       use_slave=True),
+             mock.call(ctxt, begin, end, marker='1', limit=2,
+                       use_slave=True)],
+            volume_get_active_by_window.call_args_list)
+        self.assertEqual(
+            [mock.call(ctxt, begin, end, marker=None, limit=2,
+                       use_slave=True),
+             mock.call(ctxt, begin, end, marker='1', limit=2,
+                       use_slave=True)],
+            snapshot_get_active_by_window.call_args_list)
+        self.assertEqual(3, notify_about_volume_usage.call_count)
+        self.assertEqual(2, notify_about_snapshot_usage.call_count)
+
+    @mock.patch('cinder.volume.utils.notify_about_snapshot_usage')
+    @mock.patch('cinder.db.snapshot_get_active_by_window')
+    @mock.patch('cinder.volume.utils.notify_about_volume_usage')
+    @mock.patch('cinder.db.volume_get_active_by_window')
+    @mock.patch('cinder.rpc.init')
+    @mock.patch('cinder.openstack.common.log.getLogger')
+    @mock.patch('cinder.openstack.common.log.setup')
+    @mock.patch('cinder.context.get_admin_context')
+    def test_main_resume_from_checkpoint(self, get_admin_context, log_setup,
+                                         get_logger, rpc_init,
+                                         volume_get_active_by_window,
+                                         notify_about_volume_usage,
+                                         snapshot_get_active_by_window,
+                                         notify_about_snapshot_usage):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        checkpoint_file = os.path.join(tmp_dir, 'checkpoint')
+        CONF.set_override('checkpoint_file', checkpoint_file)
+        CONF.set_override('batch_size', 2)
+        CONF.set_override('start_time', '2014-01-01 01:00:00')
+        CONF.set_override('end_time', '2014-02-02 02:00:00')
+        begin = datetime.datetime(2014, 1, 1, 1, 0)
+        end = datetime.datetime(2014, 2, 2, 2, 0)
+        ctxt = context.RequestContext('fake-user', 'fake-project')
+        get_admin_context.return_value = ctxt
+        volumes = [mock.MagicMock(id=str(i)) for i in range(4)]
+        snapshot = mock.MagicMock(id='0')
+        volume_get_active_by_window.side_effect = [volumes[:2],
+                                                   test.TestingException()]
+
+        # The audit is interrupted after the first batch of volumes.
+        self.assertRaises(test.TestingException, volume_usage_audit.main)
+        with open(checkpoint_file) as f:
+            self.assertEqual({'begin': str(begin), 'end': str(end),
+                              'resource': 'volume', 'marker': '1'},
+                             json.load(f))
+
+        volume_get_active_by_window.reset_mock()
+        volume_get_active_by_window.side_effect = [volumes[2:], []]
+        snapshot_get_active_by_window.return_value = [snapshot]
+        notify_about_volume_usage.reset_mock()
+
+        volume_usage_audit.main()
+
+        volume_get_active_by_window.assert_any_call(
+            ctxt, begin, end, marker='1', limit=2, use_slave=True)
+        self.assertEqual(2, notify_about_volume_usage.call_count)
+        notify_about_volume_usage.assert_any_call(
+            ctxt, volumes[2], 'exists', extra_usage_info=mock.ANY)
+        notify_about_volume_usage.assert_any_call(
+            ctxt, volumes[3], 'exists', extra_usage_info=mock.ANY)
+        self.assertEqual(1, notify_about_snapshot_usage.call_count)
+        self.assertFalse(os.path.exists(checkpoint_file))
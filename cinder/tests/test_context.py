@@ -95,3 +95,18 @@ class ContextTestCase(test.TestCase):
                                      project_domain="project-domain")
         self.assertEqual('user tenant domain user-domain project-domain',
                          ctx.to_dict()["user_identity"])
+
+    def test_get_internal_tenant_context(self):
+        self.override_config('cinder_internal_tenant_project_id',
+                             'internal_project')
+        self.override_config('cinder_internal_tenant_user_id',
+                             'internal_user')
+        ctx = context.get_internal_tenant_context()
+        self.assertEqual('internal_project', ctx.project_id)
+        self.assertEqual('internal_user', ctx.user_id)
+        self.assertTrue(ctx.is_admin)
+
+    def test_get_internal_tenant_context_not_configured(self):
+        self.override_config('cinder_internal_tenant_project_id',
+                             'internal_project')
+        self.assertIsNone(context.get_internal_tenant_context())
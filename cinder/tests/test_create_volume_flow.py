@@ -14,11 +14,15 @@
 #    under the License.
 """ Tests for create_volume TaskFlow """
 
+import datetime
 import time
 
+import mock
+
 from cinder import context
 from cinder import test
 from cinder.volume.flows.api import create_volume
+from cinder.volume.flows.manager import create_volume as create_volume_manager
 
 
 class fake_scheduler_rpc_api(object):
@@ -114,3 +118,124 @@ class CreateVolumeFlowTestCase(test.TestCase):
             fake_db())
 
         task._cast_create_volume(self.ctxt, spec, props)
+
+
+class CreateVolumeFlowManagerImageCacheTestCase(test.TestCase):
+
+    def setUp(self):
+        super(CreateVolumeFlowManagerImageCacheTestCase, self).setUp()
+        self.ctxt = context.get_admin_context()
+        self.internal_ctxt = context.RequestContext('internal_user',
+                                                    'internal_project',
+                                                    is_admin=True)
+        self.mock_db = mock.Mock()
+        self.mock_driver = mock.Mock()
+        self.mock_driver.clone_image.return_value = (None, False)
+        self.mock_driver.create_volume.return_value = None
+        self.mock_cache = mock.Mock()
+        self.volume = {'id': 'volume', 'size': 10, 'host': 'host@lvm#pool',
+                       'availability_zone': 'nova', 'volume_type_id': None}
+        self.image_meta = {'updated_at': datetime.datetime(2015, 1, 1)}
+        self.task = create_volume_manager.CreateVolumeFromSpecTask(
+            self.mock_db, self.mock_driver,
+            image_volume_cache=self.mock_cache)
+        self.stubs.Set(self.task, '_copy_image_to_volume', mock.Mock())
+        self.stubs.Set(self.task, '_handle_bootable_volume_glance_meta',
+                       mock.Mock())
+        patcher = mock.patch('cinder.context.get_internal_tenant_context',
+                             return_value=self.internal_ctxt)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _create_from_image(self):
+        return self.task._create_from_image(
+            self.ctxt, self.volume, 'location', 'image', self.image_meta,
+            mock.sentinel.image_service)
+
+    def test_create_from_image_cache_hit(self):
+        image_volume = {'id': 'image_volume', 'size': 10,
+                        'status': 'available'}
+        self.mock_cache.get_entry.return_value = {'volume_id':
+                                                  'image_volume'}
+        self.mock_db.volume_get.return_value = image_volume
+        self.mock_driver.create_cloned_volume.return_value = {'foo': 'bar'}
+
+        model_update = self._create_from_image()
+
+        self.assertEqual({'foo': 'bar'}, model_update)
+        self.mock_cache.get_entry.assert_called_once_with(
+            self.internal_ctxt, self.volume, 'image', self.image_meta)
+        self.mock_driver.create_cloned_volume.assert_called_once_with(
+            self.volume, image_volume)
+        self.assertFalse(self.mock_driver.create_volume.called)
+        self.assertFalse(self.task._copy_image_to_volume.called)
+        self.assertFalse(self.mock_cache.create_cache_entry.called)
+
+    def test_create_from_image_cache_hit_too_large(self):
+        self.mock_cache.get_entry.return_value = {'volume_id':
+                                                  'image_volume'}
+        self.mock_db.volume_get.return_value = {'id': 'image_volume',
+                                                'size': 20,
+                                                'status': 'available'}
+        self.mock_db.volume_update.return_value = self.volume
+
+        self._create_from_image()
+
+        self.assertFalse(self.mock_driver.create_cloned_volume.called)
+        self.assertTrue(self.task._copy_image_to_volume.called)
+        self.assertFalse(self.mock_cache.create_cache_entry.called)
+
+    @mock.patch('cinder.quota.QUOTAS.commit')
+    @mock.patch('cinder.quota.QUOTAS.reserve')
+    def test_create_from_image_cache_miss(self, mock_reserve, mock_commit):
+        image_volume = {'id': 'image_volume', 'size': 10,
+                        'host': 'host@lvm#pool'}
+        self.mock_cache.get_entry.return_value = None
+        self.mock_cache.ensure_space.return_value = True
+        self.mock_db.volume_update.side_effect = [self.volume, image_volume]
+        self.mock_db.volume_create.return_value = image_volume
+        self.mock_driver.create_cloned_volume.return_value = None
+
+        self._create_from_image()
+
+        self.assertTrue(self.task._copy_image_to_volume.called)
+        self.mock_cache.ensure_space.assert_called_once_with(
+            self.internal_ctxt, 10, 'host@lvm#pool')
+        volume_values = self.mock_db.volume_create.call_args[0][1]
+        self.assertEqual('internal_project', volume_values['project_id'])
+        self.mock_driver.create_cloned_volume.assert_called_once_with(
+            image_volume, self.volume)
+        mock_commit.assert_called_once_with(self.internal_ctxt,
+                                            mock_reserve.return_value)
+        self.mock_cache.create_cache_entry.assert_called_once_with(
+            self.internal_ctxt, image_volume, 'image', self.image_meta)
+
+    @mock.patch('cinder.quota.QUOTAS.rollback')
+    @mock.patch('cinder.quota.QUOTAS.reserve')
+    def test_create_from_image_cache_miss_clone_fails(self, mock_reserve,
+                                                      mock_rollback):
+        self.mock_cache.get_entry.return_value = None
+        self.mock_cache.ensure_space.return_value = True
+        self.mock_db.volume_update.return_value = self.volume
+        self.mock_db.volume_create.return_value = {'id': 'image_volume'}
+        self.mock_driver.create_cloned_volume.side_effect = (
+            test.TestingException())
+
+        # The volume is still created from the image.
+        self._create_from_image()
+
+        self.mock_db.volume_destroy.assert_called_once_with(
+            self.internal_ctxt, 'image_volume')
+        mock_rollback.assert_called_once_with(self.internal_ctxt,
+                                              mock_reserve.return_value)
+        self.assertFalse(self.mock_cache.create_cache_entry.called)
+
+    def test_create_from_image_cache_no_space(self):
+        self.mock_cache.get_entry.return_value = None
+        self.mock_cache.ensure_space.return_value = False
+        self.mock_db.volume_update.return_value = self.volume
+
+        self._create_from_image()
+
+        self.assertFalse(self.mock_db.volume_create.called)
+        self.assertFalse(self.mock_cache.create_cache_entry.called)
@@ -16,11 +16,15 @@
 
 import datetime
 
+import mock
 from oslo_config import cfg
 from oslo_utils import uuidutils
 
+from cinder.common import sqlalchemyutils
 from cinder import context
 from cinder import db
+from cinder.db.sqlalchemy import api as sqlalchemy_api
+from cinder.db.sqlalchemy import models
 from cinder import exception
 from cinder.quota import ReservableResource
 from cinder import test
@@ -214,6 +218,28 @@ class DBAPIServiceTestCase(BaseTest):
                           db.service_get_by_args,
                           self.ctxt, 'non-exists-host', 'a')
 
+    def test_service_heartbeat(self):
+        service = self._create_service({'availability_zone': 'old'})
+        other = self._create_service({'host': 'other'})
+
+        db.service_heartbeat(self.ctxt, service['id'], 'new')
+
+        real = db.service_get(self.ctxt, service['id'])
+        self.assertEqual(service['report_count'] + 1, real['report_count'])
+        self.assertEqual('new', real['availability_zone'])
+        self.assertIsNotNone(real['updated_at'])
+        real = db.service_get(self.ctxt, other['id'])
+        self._assertEqualObjects(other, real)
+
+    def test_service_heartbeat_not_found_exception(self):
+        service = self._create_service({})
+        db.service_destroy(self.ctxt, service['id'])
+
+        self.assertRaises(exception.ServiceNotFound, db.service_heartbeat,
+                          self.ctxt, service['id'], 'zone')
+        self.assertRaises(exception.ServiceNotFound, db.service_heartbeat,
+                          self.ctxt, 12345, 'zone')
+
 
 class DBAPIVolumeTestCase(BaseTest):
 
@@ -261,6 +287,16 @@ class DBAPIVolumeTestCase(BaseTest):
                              db.volume_data_get_for_host(
                                  self.ctxt, 'h%d' % i))
 
+    def test_volume_count_get_by_host(self):
+        for i in xrange(3):
+            for j in xrange(i + 1):
+                db.volume_create(self.ctxt, {'host': 'h%d' % i, 'size': 100})
+        db.volume_create(self.ctxt, {'host': 'h3', 'size': 100})
+        self.assertEqual({'h0': 1, 'h1': 2, 'h2': 3},
+                         db.volume_count_get_by_host(
+                             self.ctxt, ['h0', 'h1', 'h2', 'h4']))
+        self.assertEqual({}, db.volume_count_get_by_host(self.ctxt, []))
+
     def test_volume_data_get_for_project(self):
         for i in xrange(3):
             for j in xrange(3):
@@ -327,6 +363,26 @@ class DBAPIVolumeTestCase(BaseTest):
         self._assertEqualListsOfObjects(volumes[2:], db.volume_get_all(
                                         self.ctxt, 2, 2, 'id', None))
 
+    def test_volume_get_all_encoded_marker_passed(self):
+        volumes = [db.volume_create(self.ctxt, {'id': i, 'size': i})
+                   for i in xrange(1, 5)]
+        marker = sqlalchemyutils.encode_marker(['size', 'created_at', 'id'],
+                                               volumes[1])
+
+        self._assertEqualListsOfObjects(volumes[2:], db.volume_get_all(
+                                        self.ctxt, marker, 2, 'size', 'asc'))
+
+    def test_volume_get_all_marker_sort_keys_mismatch(self):
+        volume = db.volume_create(self.ctxt, {'id': 1})
+        marker = sqlalchemyutils.encode_marker(['created_at', 'id'], volume)
+
+        self.assertRaises(exception.InvalidInput, db.volume_get_all,
+                          self.ctxt, marker, 2, 'size', 'asc')
+
+    def test_volume_get_all_marker_not_found(self):
+        self.assertRaises(exception.VolumeNotFound, db.volume_get_all,
+                          self.ctxt, 'missing', 2, 'size', 'asc')
+
     def test_volume_get_all_by_host(self):
         volumes = []
         for i in xrange(3):
@@ -337,6 +393,14 @@ class DBAPIVolumeTestCase(BaseTest):
                                             db.volume_get_all_by_host(
                                             self.ctxt, 'h%d' % i))
 
+    def test_volume_get_all_by_host_underscore(self):
+        volume = db.volume_create(self.ctxt, {'host': 'host_1#pool'})
+        db.volume_create(self.ctxt, {'host': 'hostX1#pool'})
+        db.volume_create(self.ctxt, {'host': 'host_10#pool'})
+
+        self._assertEqualListsOfObjects(
+            [volume], db.volume_get_all_by_host(self.ctxt, 'host_1'))
+
     def test_volume_get_all_by_host_with_pools(self):
         volumes = []
         vol_on_host_wo_pool = [db.volume_create(self.ctxt, {'host': 'foo'})
@@ -698,6 +762,109 @@ class DBAPISnapshotTestCase(BaseTest):
                                         db.snapshot_get_all(self.ctxt),
                                         ignored_keys=['metadata', 'volume'])
 
+    def test_snapshot_get_all_paged(self):
+        db.volume_create(self.ctxt, {'id': 1})
+        snapshots = [db.snapshot_create(self.ctxt, {'id': i, 'volume_id': 1,
+                                                    'volume_size': i})
+                     for i in xrange(1, 5)]
+
+        page = db.snapshot_get_all(self.ctxt, limit=2,
+                                   sort_key='volume_size', sort_dir='asc')
+        self._assertEqualListsOfObjects(snapshots[:2], page,
+                                        ignored_keys=['metadata', 'volume'])
+
+        marker = sqlalchemyutils.encode_marker(
+            ['volume_size', 'created_at', 'id'], page[-1])
+        page = db.snapshot_get_all(self.ctxt, marker=marker, limit=2,
+                                   sort_key='volume_size', sort_dir='asc')
+        self._assertEqualListsOfObjects(snapshots[2:], page,
+                                        ignored_keys=['metadata', 'volume'])
+
+    def test_snapshot_get_all_by_project_id_marker(self):
+        db.volume_create(self.ctxt, {'id': 1})
+        snapshots = [db.snapshot_create(self.ctxt, {'id': i, 'volume_id': 1,
+                                                    'volume_size': i,
+                                                    'project_id': 'project1'})
+                     for i in xrange(1, 5)]
+
+        page = db.snapshot_get_all_by_project(self.ctxt, 'project1',
+                                              marker=2,
+                                              sort_key='volume_size',
+                                              sort_dir='desc')
+        self._assertEqualListsOfObjects([snapshots[0]], page,
+                                        ignored_keys=['metadata', 'volume'])
+        self.assertRaises(exception.SnapshotNotFound,
+                          db.snapshot_get_all_by_project, self.ctxt,
+                          'project1', marker='missing')
+
+    def test_snapshot_get_all_by_filter(self):
+        db.volume_create(self.ctxt, {'id': 1})
+        db.volume_create(self.ctxt, {'id': 2})
+        snapshots = [
+            db.snapshot_create(self.ctxt, {'id': 1, 'volume_id': 1,
+                                           'status': 'available',
+                                           'display_name': 'snap1',
+                                           'metadata': {'a': '1'}}),
+            db.snapshot_create(self.ctxt, {'id': 2, 'volume_id': 2,
+                                           'status': 'creating',
+                                           'display_name': 'snap2',
+                                           'metadata': {'a': '2'}}),
+        ]
+        ignored_keys = ['metadata', 'snapshot_metadata', 'volume']
+
+        for filters in ({'status': 'creating'}, {'volume_id': 2},
+                        {'display_name': 'snap2'}, {'metadata': {'a': '2'}}):
+            self._assertEqualListsOfObjects(
+                [snapshots[1]], db.snapshot_get_all(self.ctxt,
+                                                    filters=filters),
+                ignored_keys=ignored_keys)
+        self.assertEqual([], db.snapshot_get_all(
+            self.ctxt, filters={'status': 'creating', 'volume_id': 1}))
+        self.assertEqual([], db.snapshot_get_all(
+            self.ctxt, filters={'metadata': 'a'}))
+        self.assertEqual([], db.snapshot_get_all(
+            self.ctxt, filters={'volume': 'fake'}))
+        self.assertEqual([], db.snapshot_get_all(
+            self.ctxt, filters={'fake': 'fake'}))
+
+    def test_snapshot_get_all_by_column_filter(self):
+        db.volume_create(self.ctxt, {'id': 1})
+        snapshots = [
+            db.snapshot_create(self.ctxt, {'id': 1, 'volume_id': 1,
+                                           'volume_size': 1,
+                                           'progress': '100%'}),
+            db.snapshot_create(self.ctxt, {'id': 2, 'volume_id': 1,
+                                           'volume_size': 2,
+                                           'progress': '50%'}),
+            db.snapshot_create(self.ctxt, {'id': 3, 'volume_id': 1,
+                                           'volume_size': 3,
+                                           'progress': '0%'}),
+        ]
+        ignored_keys = ['metadata', 'snapshot_metadata', 'volume']
+
+        self._assertEqualListsOfObjects(
+            [snapshots[1]],
+            db.snapshot_get_all(self.ctxt, filters={'progress': '50%'}),
+            ignored_keys=ignored_keys)
+        self._assertEqualListsOfObjects(
+            [snapshots[0], snapshots[2]],
+            db.snapshot_get_all(self.ctxt, filters={'volume_size': [1, 3]}),
+            ignored_keys=ignored_keys)
+
+    def test_snapshot_get_all_by_project_filter(self):
+        db.volume_create(self.ctxt, {'id': 1})
+        snapshots = [db.snapshot_create(self.ctxt, {'id': i, 'volume_id': 1,
+                                                    'project_id': project_id,
+                                                    'status': 'available'})
+                     for i, project_id in enumerate(('project1', 'project1',
+                                                     'project2'), 1)]
+
+        self._assertEqualListsOfObjects(
+            snapshots[:2],
+            db.snapshot_get_all_by_project(self.ctxt, 'project1',
+                                           filters={'status': 'available'}),
+            ignored_keys=['metadata', 'volume'])
+
     def test_snapshot_metadata_get(self):
         metadata = {'a': 'b', 'c': 'd'}
         db.volume_create(self.ctxt, {'id': 1})
@@ -919,6 +1086,23 @@ class DBAPIReservationTestCase(BaseTest):
                              self.ctxt,
                              'project1'))
 
+    def test_reservation_commit_locks_only_reserved_resources(self):
+        reservations = _quota_reserve(self.ctxt, 'project1')
+        with mock.patch.object(
+                sqlalchemy_api, '_get_quota_usages',
+                wraps=sqlalchemy_api._get_quota_usages) as mock_usages:
+            db.reservation_commit(self.ctxt, reservations[:1], 'project1')
+        resources = mock_usages.call_args[1]['resources']
+        self.assertEqual(1, len(resources))
+
+        committed = resources.pop()
+        other = ({'volumes', 'gigabytes'} - {committed}).pop()
+        usages = db.quota_usage_get_all_by_project(self.ctxt, 'project1')
+        self.assertEqual(0, usages[committed]['reserved'])
+        self.assertNotEqual(0, usages[committed]['in_use'])
+        self.assertNotEqual(0, usages[other]['reserved'])
+        self.assertEqual(0, usages[other]['in_use'])
+
     def test_reservation_expire(self):
         self.values['expire'] = datetime.datetime.utcnow() + \
             datetime.timedelta(days=1)
@@ -1037,6 +1221,30 @@ class DBAPIQuotaTestCase(BaseTest):
                           'volumes': {'reserved': 1, 'in_use': 0}},
                          quota_usage)
 
+    def test_quota_reserve_locks_only_reserved_resources(self):
+        quotas = {'volumes': 10, 'gigabytes': 10}
+        resources = {
+            'volumes': ReservableResource('volumes', '_sync_volumes'),
+            'gigabytes': ReservableResource('gigabytes', '_sync_gigabytes')}
+        expire = datetime.datetime.utcnow() + datetime.timedelta(days=1)
+        db.quota_reserve(self.ctxt, resources, quotas,
+                         {'volumes': 1, 'gigabytes': 2}, expire,
+                         0, 0, 'project1')
+        with mock.patch.object(
+                sqlalchemy_api, '_get_quota_usages',
+                wraps=sqlalchemy_api._get_quota_usages) as mock_usages:
+            reservations = db.quota_reserve(self.ctxt, resources, quotas,
+                                            {'volumes': 1}, expire,
+                                            0, 0, 'project1')
+        self.assertEqual(1, len(reservations))
+        self.assertEqual(['volumes'],
+                         list(mock_usages.call_args[1]['resources']))
+        quota_usage = db.quota_usage_get_all_by_project(self.ctxt, 'project1')
+        self.assertEqual({'project_id': 'project1',
+                          'gigabytes': {'reserved': 2, 'in_use': 0},
+                          'volumes': {'reserved': 2, 'in_use': 0}},
+                         quota_usage)
+
     def test_quota_destroy(self):
         db.quota_create(self.ctxt, 'project1', 'resource1', 41)
         self.assertIsNone(db.quota_destroy(self.ctxt, 'project1',
@@ -1172,6 +1380,25 @@ class DBAPIBackupTestCase(BaseTest):
         filtered_backups = db.backup_get_all(self.ctxt, filters=filters)
         self._assertEqualListsOfObjects([self.created[1]], filtered_backups)
 
+    def test_backup_get_all_paged(self):
+        sort_keys = ['size', 'created_at', 'id']
+        page = db.backup_get_all(self.ctxt, limit=2, sort_key='size',
+                                 sort_dir='desc')
+        self._assertEqualListsOfObjects(self.created[:0:-1], page)
+
+        marker = sqlalchemyutils.encode_marker(sort_keys, page[-1])
+        page = db.backup_get_all(self.ctxt, marker=marker, limit=2,
+                                 sort_key='size', sort_dir='desc')
+        self._assertEqualListsOfObjects(self.created[:1], page)
+
+    def test_backup_get_all_by_project_paged(self):
+        project_id = self.created[1]['project_id']
+        page = db.backup_get_all_by_project(self.ctxt, project_id, limit=1)
+        self._assertEqualListsOfObjects([self.created[1]], page)
+        self.assertRaises(exception.BackupNotFound,
+                          db.backup_get_all_by_project, self.ctxt,
+                          project_id, marker='missing')
+
     def test_backup_get_all_by_host(self):
         byhost = db.backup_get_all_by_host(self.ctxt,
                                            self.created[1]['host'])
@@ -1216,3 +1443,119 @@ class DBAPIBackupTestCase(BaseTest):
     def test_backup_not_found(self):
         self.assertRaises(exception.BackupNotFound, db.backup_get, self.ctxt,
                           'notinbase')
+
+
+class DBAPIImageVolumeCacheTestCase(BaseTest):
+
+    """Tests for cinder.db.api.image_volume_cache_*."""
+
+    def _create_entry(self, host='host@backend#pool', image_id='image',
+                      volume_id='volume', size=10):
+        return db.image_volume_cache_create(
+            self.ctxt, host, image_id, datetime.datetime(2015, 1, 1),
+            volume_id, size, image_checksum='checksum')
+
+    def test_create_and_get_by_volume_id(self):
+        self._create_entry()
+        entry = db.image_volume_cache_get_by_volume_id(self.ctxt, 'volume')
+        self.assertEqual('host@backend#pool', entry['host'])
+        self.assertEqual('image', entry['image_id'])
+        self.assertEqual(datetime.datetime(2015, 1, 1),
+                         entry['image_updated_at'])
+        self.assertEqual('checksum', entry['image_checksum'])
+        self.assertEqual(10, entry['size'])
+        self.assertIsNotNone(entry['last_used'])
+
+    def test_delete(self):
+        self._create_entry()
+        db.image_volume_cache_delete(self.ctxt, 'volume')
+        self.assertIsNone(
+            db.image_volume_cache_get_by_volume_id(self.ctxt, 'volume'))
+
+    def test_get_and_update_last_used(self):
+        entry = self._create_entry()
+        last_used = entry['last_used']
+        self._create_entry(host='other@backend#pool', volume_id='other')
+
+        entry = db.image_volume_cache_get_and_update_last_used(
+            self.ctxt, 'image', 'host@backend#pool')
+
+        self.assertEqual('volume', entry['volume_id'])
+        self.assertTrue(entry['last_used'] >= last_used)
+        self.assertIsNone(db.image_volume_cache_get_and_update_last_used(
+            self.ctxt, 'other_image', 'host@backend#pool'))
+
+    def test_get_all_for_host(self):
+        for i in range(3):
+            self._create_entry(image_id='image%d' % i,
+                               volume_id='volume%d' % i)
+        self._create_entry(host='other@backend#pool', volume_id='other')
+        db.image_volume_cache_get_and_update_last_used(
+            self.ctxt, 'image0', 'host@backend#pool')
+
+        entries = db.image_volume_cache_get_all_for_host(
+            self.ctxt, 'host@backend#pool')
+
+        # Most recently used first.
+        self.assertEqual(3, len(entries))
+        self.assertEqual('volume0', entries[0]['volume_id'])
+
+    def test_purge_deleted_rows_skips_cache(self):
+        self._create_entry()
+        db.purge_deleted_rows(self.ctxt, age_in_days=1)
+        self.assertIsNotNone(
+            db.image_volume_cache_get_by_volume_id(self.ctxt, 'volume'))
+
+
+class DBAPISlaveTestCase(BaseTest):
+
+    """Tests for reading from the slave database."""
+
+    def test_get_session(self):
+        with mock.patch.object(sqlalchemy_api,
+                               '_create_facade_lazily') as facade:
+            sqlalchemy_api.get_session(use_slave=True, autocommit=False)
+            sqlalchemy_api.get_session()
+        self.assertEqual([mock.call(use_slave=True, autocommit=False),
+                          mock.call(use_slave=False)],
+                         facade.return_value.get_session.call_args_list)
+
+    def test_model_query_with_session(self):
+        session = sqlalchemy_api.get_session()
+        with mock.patch.object(sqlalchemy_api, 'get_session') as get_session:
+            sqlalchemy_api.model_query(self.ctxt, models.Volume,
+                                       session=session, use_slave=True)
+        self.assertFalse(get_session.called)
+
+    def _assert_uses_slave(self, expected, func, *args, **kwargs):
+        with mock.patch.object(sqlalchemy_api, 'get_session',
+                               wraps=sqlalchemy_api.get_session) as \
+                get_session:
+            func(self.ctxt, *args, **kwargs)
+        self.assertTrue(get_session.called)
+        for call in get_session.call_args_list:
+            self.assertEqual(expected, call[1].get('use_slave', False))
+
+    def test_read_from_slave(self):
+        now = datetime.datetime.utcnow()
+        reads = [
+            (db.service_get_all_by_topic, 'topic'),
+            (db.volume_get_all, None, None, 'created_at', 'desc'),
+            (db.volume_get_all_by_project, 'project', None, None,
+             'created_at', 'desc'),
+            (db.volume_get_active_by_window, now),
+            (db.volume_glance_metadata_list_get, ['volume']),
+            (db.snapshot_get_all,),
+            (db.snapshot_get_all_by_project, 'project'),
+            (db.snapshot_get_active_by_window, now),
+            (db.backup_get_all,),
+            (db.backup_get_all_by_project, 'project'),
+        ]
+        for read in reads:
+            self._assert_uses_slave(False, *read)
+            self._assert_uses_slave(True, *read, use_slave=True)
+
+    def test_write_to_primary(self):
+        volume = db.volume_create(self.ctxt, {})
+        self._assert_uses_slave(False, db.volume_update, volume['id'],
+                                {'status': 'available'})
@@ -13,7 +13,12 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+
+import mock
+
 from cinder import exception
+from cinder.scheduler.evaluator import evaluator
 from cinder.scheduler.evaluator.evaluator import evaluate
 from cinder import test
 
@@ -134,3 +139,34 @@ class EvaluatorTestCase(test.TestCase):
         self.assertRaises(exception.EvaluatorParseException,
                           evaluate,
                           "7 / 0")
+
+    def test_compiled_expression_reused(self):
+        expr = evaluator.compile_expression("stats.iops * 2")
+        self.assertIs(expr, evaluator.compile_expression("stats.iops * 2"))
+        self.assertEqual(200, expr.evaluate(stats={'iops': 100}))
+        self.assertEqual(50, expr.evaluate(stats={'iops': 25}))
+
+    def test_evaluate_parses_once(self):
+        evaluator.compile_expression("1 + 41")
+        with mock.patch.object(evaluator, '_def_parser') as def_parser:
+            with mock.patch.object(evaluator, '_parser') as parser:
+                self.assertEqual(42, evaluate("1 + 41"))
+                self.assertFalse(parser.parseString.called)
+                self.assertFalse(def_parser.called)
+
+    def test_expression_cache_evicts_least_recently_used(self):
+        self.stubs.Set(evaluator, 'EXPRESSION_CACHE_SIZE', 2)
+        self.stubs.Set(evaluator, '_expression_cache',
+                       collections.OrderedDict())
+        first = evaluator.compile_expression("1 + 1")
+        evaluator.compile_expression("2 + 2")
+        self.assertIs(first, evaluator.compile_expression("1 + 1"))
+        evaluator.compile_expression("3 + 3")
+        self.assertEqual(["1 + 1", "3 + 3"],
+                         list(evaluator._expression_cache.keys()))
+
+    def test_bad_expression_not_cached(self):
+        self.assertRaises(exception.EvaluatorParseException,
+                          evaluator.compile_expression,
+                          "2 +* 2")
+        self.assertNotIn("2 +* 2", evaluator._expression_cache)
@@ -16,7 +16,11 @@
 """Unit tests for image utils."""
 
 import math
+import os
+import shutil
+import tempfile
 
+import eventlet
 import mock
 from oslo_concurrency import processutils
 from oslo_utils import units
@@ -24,6 +28,7 @@ from oslo_utils import units
 from cinder import exception
 from cinder.image import image_utils
 from cinder import test
+from cinder import utils
 
 
 class TestQemuImgInfo(test.TestCase):
@@ -546,6 +551,7 @@ class TestFetchToVolumeFormat(test.TestCase):
 
         bps_limit = mock.sentinel.bps_limit
         mock_conf.volume_copy_bps_limit = bps_limit
+        mock_conf.image_conversion_cache_enabled = False
         data = mock_info.return_value
         data.file_format = volume_format
         data.backing_file = None
@@ -596,6 +602,7 @@ class TestFetchToVolumeFormat(test.TestCase):
 
         bps_limit = mock.sentinel.bps_limit
         mock_conf.volume_copy_bps_limit = bps_limit
+        mock_conf.image_conversion_cache_enabled = False
         data = mock_info.return_value
         data.file_format = volume_format
         data.backing_file = None
@@ -649,6 +656,7 @@ class TestFetchToVolumeFormat(test.TestCase):
 
         bps_limit = mock.sentinel.bps_limit
         mock_conf.volume_copy_bps_limit = bps_limit
+        mock_conf.image_conversion_cache_enabled = False
         tmp = mock_temp.return_value.__enter__.return_value
         image_service.show.return_value = {'disk_format': 'raw',
                                            'size': 41126400}
@@ -697,6 +705,7 @@ class TestFetchToVolumeFormat(test.TestCase):
 
         bps_limit = mock.sentinel.bps_limit
         mock_conf.volume_copy_bps_limit = bps_limit
+        mock_conf.image_conversion_cache_enabled = False
         tmp = mock_temp.return_value.__enter__.return_value
         image_service.show.return_value = {'disk_format': 'not_raw'}
 
@@ -742,6 +751,7 @@ class TestFetchToVolumeFormat(test.TestCase):
 
         bps_limit = mock.sentinel.bps_limit
         mock_conf.volume_copy_bps_limit = bps_limit
+        mock_conf.image_conversion_cache_enabled = False
         tmp = mock_temp.return_value.__enter__.return_value
         image_service.show.return_value = None
 
@@ -785,6 +795,7 @@ class TestFetchToVolumeFormat(test.TestCase):
 
         bps_limit = mock.sentinel.bps_limit
         mock_conf.volume_copy_bps_limit = bps_limit
+        mock_conf.image_conversion_cache_enabled = False
         data = mock_info.return_value
         data.file_format = volume_format
         data.backing_file = None
@@ -835,6 +846,7 @@ class TestFetchToVolumeFormat(test.TestCase):
 
         bps_limit = mock.sentinel.bps_limit
         mock_conf.volume_copy_bps_limit = bps_limit
+        mock_conf.image_conversion_cache_enabled = False
         data = mock_info.return_value
         data.file_format = None
         data.backing_file = None
@@ -885,6 +897,7 @@ class TestFetchToVolumeFormat(test.TestCase):
 
         bps_limit = mock.sentinel.bps_limit
         mock_conf.volume_copy_bps_limit = bps_limit
+        mock_conf.image_conversion_cache_enabled = False
         data = mock_info.return_value
         data.file_format = volume_format
         data.backing_file = mock.sentinel.backing_file
@@ -935,6 +948,7 @@ class TestFetchToVolumeFormat(test.TestCase):
 
         bps_limit = mock.sentinel.bps_limit
         mock_conf.volume_copy_bps_limit = bps_limit
+        mock_conf.image_conversion_cache_enabled = False
         data = mock_info.return_value
         data.file_format = mock.sentinel.file_format
         data.backing_file = None
@@ -988,6 +1002,7 @@ class TestFetchToVolumeFormat(test.TestCase):
 
         bps_limit = mock.sentinel.bps_limit
         mock_conf.volume_copy_bps_limit = bps_limit
+        mock_conf.image_conversion_cache_enabled = False
         data = mock_info.return_value
         data.file_format = volume_format
         data.backing_file = None
@@ -1015,6 +1030,125 @@ class TestFetchToVolumeFormat(test.TestCase):
                                              run_as_root=run_as_root)
 
 
+class TestImageConversionCache(test.TestCase):
+    def setUp(self):
+        super(TestImageConversionCache, self).setUp()
+        self.conversion_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.conversion_dir)
+        self.override_config('image_conversion_dir', self.conversion_dir)
+        self.override_config('image_conversion_cache_enabled', True)
+        self.cache_dir = os.path.join(self.conversion_dir, 'cache')
+        self.ctxt = mock.sentinel.context
+        self.image_service = mock.Mock()
+        self.image_service.show.return_value = {'checksum': 'abc'}
+
+        def _fetch(context, image_service, image_id, path, user_id,
+                   project_id):
+            eventlet.sleep(0)
+            with open(path, 'w') as image_file:
+                image_file.write('qcow2 image')
+
+        def _convert_image(source, dest, out_format, run_as_root=True,
+                           bps_limit=None):
+            shutil.copyfile(source, dest)
+
+        patcher = mock.patch('cinder.image.image_utils.fetch',
+                             side_effect=_fetch)
+        self.mock_fetch = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('cinder.image.image_utils.convert_image',
+                             side_effect=_convert_image)
+        self.mock_convert = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('cinder.image.image_utils.qemu_img_info')
+        self.mock_info = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.mock_info.return_value.file_format = 'raw'
+        self.mock_info.return_value.backing_file = None
+        self.mock_info.return_value.virtual_size = units.Mi
+        patcher = mock.patch('cinder.image.image_utils.is_xenserver_image',
+                             return_value=False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch(
+            'cinder.image.image_utils.volume_utils.copy_volume')
+        self.mock_copy = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _fetch_to_raw(self, image_id='image'):
+        image_utils.fetch_to_raw(self.ctxt, self.image_service, image_id,
+                                 mock.sentinel.dest, mock.sentinel.blocksize,
+                                 size=1)
+
+    def test_fill_and_hit(self):
+        self._fetch_to_raw()
+        self._fetch_to_raw()
+
+        self.assertEqual(1, self.mock_fetch.call_count)
+        self.assertEqual(1, self.mock_convert.call_count)
+        self.assertEqual(['image-abc.raw'], os.listdir(self.cache_dir))
+        self.assertEqual(2, self.mock_copy.call_count)
+        self.mock_copy.assert_called_with(mock.ANY, mock.sentinel.dest, 1,
+                                          mock.sentinel.blocksize)
+
+    def test_checksum_changed(self):
+        self._fetch_to_raw()
+        self.image_service.show.return_value = {'checksum': 'def'}
+        self._fetch_to_raw()
+
+        self.assertEqual(2, self.mock_fetch.call_count)
+        self.assertEqual(['image-abc.raw', 'image-def.raw'],
+                         sorted(os.listdir(self.cache_dir)))
+
+    def test_no_checksum_not_cached(self):
+        self.image_service.show.return_value = {'checksum': None}
+        self.mock_convert.side_effect = None
+
+        self._fetch_to_raw()
+
+        self.assertFalse(os.path.exists(self.cache_dir))
+        self.mock_convert.assert_called_once_with(
+            mock.ANY, mock.sentinel.dest, 'raw', bps_limit=0,
+            run_as_root=True)
+
+    def test_size_error(self):
+        self.mock_info.return_value.virtual_size = 2 * units.Gi
+
+        self.assertRaises(exception.ImageUnacceptable, self._fetch_to_raw)
+        self.assertFalse(self.mock_copy.called)
+
+    def test_concurrent_fill(self):
+        pool = eventlet.GreenPool()
+        for _i in range(3):
+            pool.spawn_n(self._fetch_to_raw)
+        pool.waitall()
+
+        self.assertEqual(1, self.mock_fetch.call_count)
+        self.assertEqual(3, self.mock_copy.call_count)
+
+    def test_prune(self):
+        self.override_config('image_conversion_cache_max_size_gb', 2)
+        os.makedirs(self.cache_dir)
+        paths = []
+        for i in range(3):
+            path = os.path.join(self.cache_dir, 'image%d' % i)
+            with open(path, 'w') as image_file:
+                image_file.truncate(units.Gi)
+            os.utime(path, (i, i))
+            paths.append(path)
+
+        with mock.patch.object(image_utils.utils, 'synchronized',
+                               wraps=utils.synchronized) as synchronized:
+            image_utils._prune_image_conversion_cache(paths[0])
+
+        # The least recently used image is kept, it is the one just added.
+        self.assertEqual(['image0', 'image2'],
+                         sorted(os.listdir(self.cache_dir)))
+        # The image is removed under the lock its users take.
+        synchronized.assert_called_once_with('image-conversion-cache-image1',
+                                             external=True)
+
+
 class TestXenserverUtils(test.TestCase):
     @mock.patch('cinder.image.image_utils.is_xenserver_format')
     def test_is_xenserver_image(self, mock_format):
@@ -1247,3 +1381,111 @@ class TestTemporaryFileContextManager(test.TestCase):
             self.assertEqual(mock.sentinel.temporary_file, tmp_file)
             self.assertFalse(mock_delete.called)
         mock_delete.assert_called_once_with(mock.sentinel.temporary_file)
+
+
+class TestStreamToVolume(test.TestCase):
+    def setUp(self):
+        super(TestStreamToVolume, self).setUp()
+        self.override_config('volume_copy_bps_limit', 0)
+        self.override_config('image_conversion_cache_enabled', False)
+        fd, self.dest = tempfile.mkstemp()
+        os.close(fd)
+        self.addCleanup(os.remove, self.dest)
+        self.ctxt = mock.sentinel.context
+        self.image_id = mock.sentinel.image_id
+        self.image_service = mock.Mock()
+        self.image_meta = {'disk_format': 'raw', 'container_format': 'bare',
+                           'size': 3 * units.Mi}
+        self.image_service.show.return_value = self.image_meta
+        patcher = mock.patch('cinder.utils.is_blk_device', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _set_image_data(self, chunks):
+        def _download(context, image_id, data):
+            for chunk in chunks:
+                data.write(chunk)
+
+        self.image_service.download.side_effect = _download
+
+    def _fetch(self, size=1):
+        image_utils.fetch_to_volume_format(
+            self.ctxt, self.image_service, self.image_id, self.dest, 'raw',
+            units.Mi, size=size, run_as_root=False)
+
+    @mock.patch('cinder.image.image_utils.qemu_img_info')
+    @mock.patch('cinder.image.image_utils.fetch')
+    def test_stream_raw_image(self, mock_fetch, mock_info):
+        image_data = ''.join(chr(i % 251) for i in range(units.Mi + 5000))
+        self._set_image_data([image_data[:1000], image_data[1000:units.Mi],
+                              image_data[units.Mi:]])
+
+        self._fetch()
+
+        with open(self.dest) as dest:
+            written = dest.read()
+        # The last block is padded to the direct I/O alignment.
+        self.assertEqual(units.Mi + 8192, len(written))
+        self.assertEqual(image_data, written[:len(image_data)])
+        self.assertEqual('\0' * 3192, written[len(image_data):])
+        self.assertFalse(mock_fetch.called)
+        self.assertFalse(mock_info.called)
+
+    def test_stream_rejects_qcow2_data(self):
+        self._set_image_data(['QFI\xfb\0\0\0\x03' + '\0' * 1000])
+
+        self.assertRaises(exception.ImageUnacceptable, self._fetch)
+
+        self.assertEqual(0, os.path.getsize(self.dest))
+
+    def test_stream_rejects_vdi_data(self):
+        self._set_image_data(['\0' * 64 + '\x7f\x10\xda\xbe' + '\0' * 100])
+
+        self.assertRaises(exception.ImageUnacceptable, self._fetch)
+
+    def test_stream_image_too_big(self):
+        self.image_meta['size'] = 2 * units.Gi
+
+        self.assertRaises(exception.ImageUnacceptable, self._fetch)
+
+        self.assertFalse(self.image_service.download.called)
+
+    def test_stream_falls_back_without_o_direct(self):
+        self._set_image_data(['a' * 100])
+        real_open = os.open
+
+        def _open(path, flags, *args):
+            if flags & getattr(os, 'O_DIRECT', 0):
+                raise OSError(22, 'Invalid argument')
+            return real_open(path, flags, *args)
+
+        with mock.patch('cinder.image.image_utils.os.open',
+                        side_effect=_open):
+            self._fetch()
+
+        with open(self.dest) as dest:
+            self.assertEqual('a' * 100 + '\0' * 3996, dest.read())
+
+    @mock.patch('cinder.image.image_utils._stream_to_volume')
+    @mock.patch('cinder.image.image_utils.qemu_img_info')
+    @mock.patch('cinder.image.image_utils.fetch')
+    def test_no_stream_with_bps_limit(self, mock_fetch, mock_info,
+                                      mock_stream):
+        self.override_config('volume_copy_bps_limit', units.Mi)
+        mock_fetch.side_effect = test.TestingException
+
+        self.assertRaises(test.TestingException, self._fetch)
+
+        self.assertFalse(mock_stream.called)
+
+    @mock.patch('cinder.image.image_utils._stream_to_volume')
+    @mock.patch('cinder.image.image_utils.qemu_img_info')
+    @mock.patch('cinder.image.image_utils.fetch')
+    def test_no_stream_for_qcow2_image(self, mock_fetch, mock_info,
+                                       mock_stream):
+        self.image_meta['disk_format'] = 'qcow2'
+        mock_fetch.side_effect = test.TestingException
+
+        self.assertRaises(test.TestingException, self._fetch)
+
+        self.assertFalse(mock_stream.called)
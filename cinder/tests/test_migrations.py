@@ -722,6 +722,65 @@ class MigrationsMixin(test_migrations.WalkVersionsMixin):
         snapshots = db_utils.get_table(engine, 'snapshots')
         self.assertNotIn('provider_id', snapshots.c)
 
+    def _check_037(self, engine, data):
+        """Test adding the hot path indexes works correctly."""
+        expected = {
+            'volumes': ['volumes_deleted_created_at_idx',
+                        'volumes_host_idx',
+                        'volumes_project_id_deleted_created_at_idx'],
+            'volume_metadata': ['volume_metadata_key_value_idx',
+                                'volume_metadata_volume_id_deleted_idx'],
+            'volume_admin_metadata': [
+                'volume_admin_metadata_volume_id_deleted_idx'],
+            'snapshots': ['snapshots_project_id_deleted_created_at_idx',
+                          'snapshots_volume_id_deleted_idx'],
+            'snapshot_metadata': [
+                'snapshot_metadata_snapshot_id_deleted_idx'],
+            'reservations': ['reservations_uuid_idx'],
+        }
+        for table_name, index_names in expected.items():
+            table = db_utils.get_table(engine, table_name)
+            existing = [idx.name for idx in table.indexes]
+            for index_name in index_names:
+                self.assertIn(index_name, existing)
+
+    def _post_downgrade_037(self, engine):
+        volumes = db_utils.get_table(engine, 'volumes')
+        index_names = [idx.name for idx in volumes.indexes]
+        self.assertNotIn('volumes_host_idx', index_names)
+        reservations = db_utils.get_table(engine, 'reservations')
+        index_names = [idx.name for idx in reservations.indexes]
+        self.assertNotIn('reservations_uuid_idx', index_names)
+        self.assertIn('reservations_deleted_expire_idx', index_names)
+
+    def _check_038(self, engine, data):
+        """Test adding the image_volume_cache_entries table works."""
+        has_table = engine.dialect.has_table(engine.connect(),
+                                             "image_volume_cache_entries")
+        self.assertTrue(has_table)
+
+        cache = db_utils.get_table(engine, 'image_volume_cache_entries')
+        self.assertIsInstance(cache.c.id.type,
+                              sqlalchemy.types.INTEGER)
+        self.assertIsInstance(cache.c.host.type,
+                              sqlalchemy.types.VARCHAR)
+        self.assertIsInstance(cache.c.image_id.type,
+                              sqlalchemy.types.VARCHAR)
+        self.assertIsInstance(cache.c.image_updated_at.type,
+                              self.TIME_TYPE)
+        self.assertIsInstance(cache.c.image_checksum.type,
+                              sqlalchemy.types.VARCHAR)
+        self.assertIsInstance(cache.c.volume_id.type,
+                              sqlalchemy.types.VARCHAR)
+        self.assertIsInstance(cache.c.size.type,
+                              sqlalchemy.types.INTEGER)
+        self.assertIsInstance(cache.c.last_used.type,
+                              self.TIME_TYPE)
+
+    def _post_downgrade_038(self, engine):
+        self.assertFalse(engine.dialect.has_table(
+            engine.connect(), "image_volume_cache_entries"))
+
     def test_walk_versions(self):
         self.walk_versions(True, False)
 
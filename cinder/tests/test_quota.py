@@ -32,6 +32,7 @@ from cinder import quota
 from cinder import test
 import cinder.tests.image.fake
 from cinder import volume
+from cinder.volume import volume_types
 
 
 CONF = cfg.CONF
@@ -792,6 +793,48 @@ class VolumeTypeQuotaEngineTestCase(test.TestCase):
         db.volume_type_destroy(ctx, vtype['id'])
         db.volume_type_destroy(ctx, vtype2['id'])
 
+    @mock.patch.object(db, 'volume_type_get_all', return_value={})
+    def test_resources_cached(self, mock_vtga):
+        engine = quota.VolumeTypeQuotaEngine()
+        self.assertEqual(engine.resources, engine.resources)
+        self.assertEqual(1, mock_vtga.call_count)
+
+        engine.invalidate_resources()
+        engine.resources
+        self.assertEqual(2, mock_vtga.call_count)
+
+    @mock.patch.object(db, 'volume_type_get_all', return_value={})
+    def test_resources_cache_disabled(self, mock_vtga):
+        self.flags(quota_resources_cache_ttl=0)
+        engine = quota.VolumeTypeQuotaEngine()
+        engine.resources
+        engine.resources
+        self.assertEqual(2, mock_vtga.call_count)
+
+    @mock.patch.object(quota.QuotaEngine, 'reserve')
+    @mock.patch.object(db, 'volume_type_get_all')
+    def test_reserve_unknown_resource_refreshes(self, mock_vtga,
+                                                mock_reserve):
+        vtype = {'id': 'fake_id', 'name': 'type1', 'extra_specs': {}}
+        mock_vtga.side_effect = [{}, {'type1': vtype}]
+        engine = quota.VolumeTypeQuotaEngine()
+        self.assertNotIn('volumes_type1', engine)
+
+        engine.reserve('fake_context', volumes_type1=1)
+        self.assertIn('volumes_type1', engine)
+        self.assertEqual(2, mock_vtga.call_count)
+        mock_reserve.assert_called_once_with('fake_context', expire=None,
+                                             project_id=None,
+                                             volumes_type1=1)
+
+    def test_volume_type_create_invalidates_resources(self):
+        ctx = context.get_admin_context()
+        self.assertNotIn('volumes_type1', quota.QUOTAS.resource_names)
+        vtype = volume_types.create(ctx, 'type1')
+        self.assertIn('volumes_type1', quota.QUOTAS.resource_names)
+        volume_types.destroy(ctx, vtype['id'])
+        self.assertNotIn('volumes_type1', quota.QUOTAS.resource_names)
+
 
 class DbQuotaDriverTestCase(test.TestCase):
     def setUp(self):
@@ -1253,8 +1296,11 @@ class QuotaReserveSqlAlchemyTestCase(test.TestCase):
         def fake_get_session():
             return FakeSession()
 
-        def fake_get_quota_usages(context, session, project_id):
-            return self.usages.copy()
+        def fake_get_quota_usages(context, session, project_id,
+                                  resources=None):
+            return dict((resource, usage)
+                        for resource, usage in self.usages.items()
+                        if resources is None or resource in resources)
 
         def fake_quota_usage_create(context, project_id, resource, in_use,
                                     reserved, until_refresh, session=None,
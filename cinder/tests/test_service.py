@@ -149,7 +149,8 @@ class ServiceTestCase(test.TestCase):
                                        binary).AndRaise(exception.NotFound())
         service.db.service_create(mox.IgnoreArg(),
                                   service_create).AndReturn(service_ref)
-        service.db.service_get(
+        service.db.service_heartbeat(
+            mox.IgnoreArg(),
             mox.IgnoreArg(),
             mox.IgnoreArg()).AndRaise(db_exc.DBConnectionError())
 
@@ -183,10 +184,8 @@ class ServiceTestCase(test.TestCase):
                                        binary).AndRaise(exception.NotFound())
         service.db.service_create(mox.IgnoreArg(),
                                   service_create).AndReturn(service_ref)
-        service.db.service_get(mox.IgnoreArg(),
-                               service_ref['id']).AndReturn(service_ref)
-        service.db.service_update(mox.IgnoreArg(), service_ref['id'],
-                                  mox.ContainsKeyValue('report_count', 1))
+        service.db.service_heartbeat(mox.IgnoreArg(), service_ref['id'],
+                                     'nova')
 
         self.mox.ReplayAll()
         serv = service.Service(host,
@@ -207,6 +206,43 @@ class ServiceTestCase(test.TestCase):
         self.assertEqual(CONF.service_down_time, 25)
 
 
+class StateReporterTestCase(test.TestCase):
+    """Test cases for reporting the state of services."""
+
+    def setUp(self):
+        super(StateReporterTestCase, self).setUp()
+        self.ctxt = context.get_admin_context()
+
+    def _create_service(self, host):
+        serv = service.Service(host, 'cinder-volume', 'volume',
+                               'cinder.tests.test_service.FakeManager')
+        serv._create_service_ref(self.ctxt)
+        return serv
+
+    def test_report_state(self):
+        serv = self._create_service('host1')
+
+        with mock.patch.object(db, 'service_heartbeat',
+                               wraps=db.service_heartbeat) as heartbeat:
+            serv.report_state()
+
+        heartbeat.assert_called_once_with(mock.ANY, serv.service_id, 'nova')
+        ref = db.service_get(self.ctxt, serv.service_id)
+        self.assertEqual(1, ref['report_count'])
+
+    def test_report_state_recreates_missing_service(self):
+        serv = self._create_service('host1')
+        service_id = serv.service_id
+        db.service_destroy(self.ctxt, service_id)
+
+        serv.report_state()
+
+        self.assertNotEqual(service_id, serv.service_id)
+        ref = db.service_get(self.ctxt, serv.service_id)
+        self.assertEqual(1, ref['report_count'])
+        self.assertEqual('host1', ref['host'])
+
+
 class TestWSGIService(test.TestCase):
 
     def setUp(self):
@@ -1477,3 +1477,43 @@ class TestRetryDecorator(test.TestCase):
 
             self.assertRaises(WrongException, raise_unexpected_error)
             self.assertFalse(mock_sleep.called)
+
+
+class CapabilitiesDeltaTestCase(test.TestCase):
+    def test_capabilities_delta_round_trip(self):
+        old = {'vendor_name': 'OpenStack', 'free_capacity_gb': 10,
+               'pools': [{'pool_name': 'a', 'free_capacity_gb': 5},
+                         {'pool_name': 'b', 'free_capacity_gb': 5},
+                         {'pool_name': 'c', 'free_capacity_gb': 5}]}
+        new = {'vendor_name': 'OpenStack', 'driver_version': '2.0',
+               'pools': [{'pool_name': 'a', 'free_capacity_gb': 4},
+                         {'pool_name': 'b', 'free_capacity_gb': 5},
+                         {'pool_name': 'd', 'free_capacity_gb': 9}]}
+
+        delta = utils.get_capabilities_delta(old, new)
+        self.assertEqual({'driver_version': '2.0'}, delta['updated'])
+        self.assertEqual(['free_capacity_gb'], delta['removed'])
+        self.assertEqual([{'pool_name': 'a', 'free_capacity_gb': 4},
+                          {'pool_name': 'd', 'free_capacity_gb': 9}],
+                         delta['updated_pools'])
+        self.assertEqual(['c'], delta['removed_pools'])
+
+        self.assertEqual(new,
+                         utils.apply_capabilities_delta(old, delta))
+        self.assertEqual(10, old['free_capacity_gb'])
+
+    def test_capabilities_delta_unchanged(self):
+        caps = {'vendor_name': 'OpenStack',
+                'pools': [{'pool_name': 'a', 'free_capacity_gb': 5}]}
+        delta = utils.get_capabilities_delta(caps, dict(caps))
+        self.assertEqual({'updated': {}, 'removed': [],
+                          'updated_pools': [], 'removed_pools': []}, delta)
+        self.assertEqual(caps,
+                         utils.apply_capabilities_delta(caps, delta))
+
+    def test_capabilities_delta_legacy_pools(self):
+        old = {'free_capacity_gb': 10}
+        new = {'pools': [{'pool_name': 'a', 'free_capacity_gb': 5}]}
+        delta = utils.get_capabilities_delta(old, new)
+        self.assertEqual(new,
+                         utils.apply_capabilities_delta(old, delta))
@@ -42,6 +42,7 @@ from cinder.brick.local_dev import lvm as brick_lvm
 from cinder import context
 from cinder import db
 from cinder import exception
+from cinder.image import cache as image_cache
 from cinder.image import image_utils
 from cinder import keymgr
 from cinder.openstack.common import fileutils
@@ -640,6 +641,36 @@ class VolumeTestCase(BaseVolumeTestCase):
             mock_loads.side_effect = exception.CinderException('test')
             self.assertRaises(exception.CinderException, VolumeManager)
 
+    def test_publish_capabilities_delta(self):
+        with mock.patch.object(self.volume.scheduler_rpcapi,
+                               'update_service_capabilities') as update_caps:
+            self.volume.update_service_capabilities({'free_capacity_gb': 5,
+                                                     'vendor_name': 'a'})
+            self.volume._publish_service_capabilities(self.context)
+            update_caps.assert_called_once_with(
+                self.context, 'volume', self.volume.host,
+                {'free_capacity_gb': 5, 'vendor_name': 'a'},
+                capabilities_version=1, base_version=None)
+
+            update_caps.reset_mock()
+            self.volume.update_service_capabilities({'free_capacity_gb': 4,
+                                                     'vendor_name': 'a'})
+            self.volume._publish_service_capabilities(self.context)
+            update_caps.assert_called_once_with(
+                self.context, 'volume', self.volume.host,
+                {'updated': {'free_capacity_gb': 4}, 'removed': [],
+                 'updated_pools': [], 'removed_pools': []},
+                capabilities_version=2, base_version=1)
+
+            # A scheduler asking for capabilities gets a full report
+            update_caps.reset_mock()
+            with mock.patch.object(self.volume, '_report_driver_status'):
+                self.volume.publish_service_capabilities(self.context)
+            update_caps.assert_called_once_with(
+                self.context, 'volume', self.volume.host,
+                {'free_capacity_gb': 4, 'vendor_name': 'a'},
+                capabilities_version=3, base_version=None)
+
     def test_delete_busy_volume(self):
         """Test volume survives deletion if driver reports it as busy."""
         volume = tests_utils.create_volume(self.context, **self.volume_params)
@@ -765,6 +796,23 @@ class VolumeTestCase(BaseVolumeTestCase):
         self.assertTrue(self.volume.delete_volume(self.context, volume_id))
         self.assertTrue(mock_get_volume.called)
 
+    def test_delete_image_volume_deletes_cache_entry(self):
+        """Test deleting an image volume of the cache drops its entry."""
+        volume = tests_utils.create_volume(self.context, **self.volume_params)
+        self.volume.create_volume(self.context, volume['id'])
+        db.image_volume_cache_create(self.context, volume['host'], 'image',
+                                     timeutils.utcnow(), volume['id'],
+                                     volume['size'])
+        self.volume.image_volume_cache = image_cache.ImageVolumeCache(
+            db, mock.Mock())
+
+        self.volume.delete_volume(self.context, volume['id'])
+
+        self.assertIsNone(db.image_volume_cache_get_by_volume_id(
+            self.context, volume['id']))
+        self.assertRaises(exception.NotFound, db.volume_get,
+                          self.context, volume['id'])
+
     def test_create_volume_from_snapshot(self):
         """Test volume can be created from a snapshot."""
         volume_src = tests_utils.create_volume(self.context,
@@ -1005,6 +1053,8 @@ class VolumeTestCase(BaseVolumeTestCase):
         # mock the synchroniser so we can record events
         self.stubs.Set(utils, 'synchronized', self._mock_synchronized)
         self.stubs.Set(utils, 'execute', self._fake_execute)
+        # Copy the volume with the faked dd.
+        self.override_config('volume_copy_method', 'dd')
 
         orig_flow = engine.ActionEngine.run
 
@@ -3613,6 +3663,39 @@ class GetActiveByWindowTestCase(BaseVolumeTestCase):
         self.assertEqual(snapshots[2].id, u'4')
         self.assertEqual(snapshots[2].volume.id, u'1')
 
+    def test_volume_get_active_by_window_paged(self):
+        for attrs in self.db_attrs:
+            db.volume_create(self.ctx, attrs)
+
+        begin = datetime.datetime(1, 3, 1, 1, 1, 1)
+        end = datetime.datetime(1, 4, 1, 1, 1, 1)
+        volumes = db.volume_get_active_by_window(self.context, begin, end,
+                                                 project_id='p1', limit=2)
+        self.assertEqual([u'2', u'3'], [volume.id for volume in volumes])
+        volumes = db.volume_get_active_by_window(self.context, begin, end,
+                                                 project_id='p1',
+                                                 marker=volumes[-1].id,
+                                                 limit=2)
+        self.assertEqual([u'4'], [volume.id for volume in volumes])
+
+    def test_snapshot_get_active_by_window_paged(self):
+        db.volume_create(self.context, {'id': 1})
+        for attrs in self.db_attrs:
+            attrs['volume_id'] = 1
+            db.snapshot_create(self.ctx, attrs)
+
+        begin = datetime.datetime(1, 3, 1, 1, 1, 1)
+        end = datetime.datetime(1, 4, 1, 1, 1, 1)
+        snapshots = db.snapshot_get_active_by_window(self.context, begin, end,
+                                                     project_id='p1',
+                                                     limit=2)
+        self.assertEqual([u'2', u'3'], [snap.id for snap in snapshots])
+        snapshots = db.snapshot_get_active_by_window(self.context, begin, end,
+                                                     project_id='p1',
+                                                     marker=snapshots[-1].id,
+                                                     limit=2)
+        self.assertEqual([u'4'], [snap.id for snap in snapshots])
+
 
 class DriverTestCase(test.TestCase):
     """Base Test class for Drivers."""
@@ -3871,7 +3954,7 @@ class LVMISCSIVolumeDriverTestCase(DriverTestCase):
 
         self.stubs.Set(volutils, 'copy_volume',
                        lambda x, y, z, sync=False, execute='foo',
-                       blocksize=mox.IgnoreArg(): None)
+                       blocksize=mox.IgnoreArg(), sparse=False: None)
 
         self.stubs.Set(volutils, 'get_all_volume_groups',
                        get_all_volume_groups)
@@ -4066,8 +4149,8 @@ class ISCSITestCase(DriverTestCase):
             cinder.volume.targets.tgt.TgtAdm(
                 configuration=self.configuration)
 
-        utils.execute = lambda *a, **kw: \
-            ("%s dummy" % CONF.iscsi_ip_address, '')
+        self.stubs.Set(utils, 'execute', lambda *a, **kw:
+                       ("%s dummy" % CONF.iscsi_ip_address, ''))
         volume = {"name": "dummy",
                   "host": "0.0.0.0",
                   "id": "12345678-1234-5678-1234-567812345678"}
@@ -135,6 +135,12 @@ class VolumeRpcAPITestCase(test.TestCase):
         for kwarg, value in self.fake_kwargs.items():
             self.assertEqual(value, expected_msg[kwarg])
 
+    def test_publish_service_capabilities_to_host(self):
+        self._test_volume_api('publish_service_capabilities',
+                              rpc_method='cast',
+                              host='fake_host',
+                              version='1.2')
+
     def test_create_volume(self):
         self._test_volume_api('create_volume',
                               rpc_method='cast',
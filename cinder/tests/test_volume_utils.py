@@ -15,9 +15,15 @@
 
 """Tests For miscellaneous util methods used with volume."""
 
+import hashlib
+import os
+import shutil
+import tempfile
+
 import mock
 from oslo_concurrency import processutils
 from oslo_config import cfg
+from oslo_utils import units
 
 from cinder import exception
 from cinder.openstack.common import log as logging
@@ -418,6 +424,74 @@ class ClearVolumeTestCase(test.TestCase):
         mock_exec.assert_called_once_with(
             'shred', '-n3', "volume_path", run_as_root=True)
 
+    @mock.patch('cinder.volume.utils._discard_zeroes_data',
+                return_value=True)
+    @mock.patch('cinder.utils.execute')
+    @mock.patch('cinder.volume.utils.CONF')
+    def test_clear_volume_discard(self, mock_conf, mock_exec, mock_zeroes):
+        mock_conf.volume_clear = 'discard'
+        mock_conf.volume_clear_size = 1
+        mock_conf.volume_clear_ionice = None
+        output = volume_utils.clear_volume(1024, 'volume_path')
+        self.assertIsNone(output)
+        mock_zeroes.assert_called_once_with('volume_path')
+        mock_exec.assert_called_once_with(
+            'blkdiscard', '-l', '1048576', 'volume_path', run_as_root=True)
+
+    @mock.patch('cinder.volume.utils._discard_zeroes_data',
+                return_value=False)
+    @mock.patch('cinder.volume.utils.copy_volume', return_value=None)
+    @mock.patch('cinder.utils.execute')
+    @mock.patch('cinder.volume.utils.CONF')
+    def test_clear_volume_discard_not_zeroing(self, mock_conf, mock_exec,
+                                              mock_copy, mock_zeroes):
+        mock_conf.volume_clear = 'discard'
+        mock_conf.volume_clear_size = 0
+        mock_conf.volume_dd_blocksize = '1M'
+        mock_conf.volume_clear_ionice = None
+        output = volume_utils.clear_volume(1024, 'volume_path')
+        self.assertIsNone(output)
+        self.assertFalse(mock_exec.called)
+        mock_copy.assert_called_once_with('/dev/zero', 'volume_path', 1024,
+                                          '1M', sync=True,
+                                          execute=utils.execute, ionice=None)
+
+    @mock.patch('cinder.volume.utils._zero_volume_written')
+    @mock.patch('cinder.volume.utils.copy_volume', return_value=None)
+    @mock.patch('cinder.volume.utils.CONF')
+    def test_clear_volume_zero_written_with_ionice(self, mock_conf,
+                                                   mock_copy, mock_zero):
+        mock_conf.volume_clear = 'zero_written'
+        mock_conf.volume_clear_size = 0
+        mock_conf.volume_dd_blocksize = '1M'
+        mock_conf.volume_clear_ionice = '-c3'
+        mock_conf.volume_copy_method = 'native'
+        mock_conf.volume_copy_bps_limit = 0
+        output = volume_utils.clear_volume(1024, 'volume_path')
+        self.assertIsNone(output)
+        self.assertFalse(mock_zero.called)
+        mock_copy.assert_called_once_with('/dev/zero', 'volume_path', 1024,
+                                          '1M', sync=True,
+                                          execute=utils.execute, ionice='-c3')
+
+    @mock.patch('cinder.utils.get_blkdev_major_minor', return_value='8:0')
+    def test_discard_zeroes_data(self, mock_devnum):
+        queue = {'/sys/dev/block/8:0/queue/discard_max_bytes': '2147450880\n',
+                 '/sys/dev/block/8:0/queue/discard_zeroes_data': '1\n'}
+
+        def _open(path):
+            return mock.mock_open(read_data=queue[path])(path)
+
+        with mock.patch('__builtin__.open', side_effect=_open):
+            self.assertTrue(volume_utils._discard_zeroes_data('/dev/sda'))
+            queue['/sys/dev/block/8:0/queue/discard_zeroes_data'] = '0\n'
+            self.assertFalse(volume_utils._discard_zeroes_data('/dev/sda'))
+        mock_devnum.assert_called_with('/dev/sda', lookup_for_file=False)
+
+    @mock.patch('cinder.utils.get_blkdev_major_minor', return_value=None)
+    def test_discard_zeroes_data_not_block_device(self, mock_devnum):
+        self.assertFalse(volume_utils._discard_zeroes_data('/dev/zero'))
+
     @mock.patch('cinder.volume.utils.CONF')
     def test_clear_volume_invalid_opt(self, mock_conf):
         mock_conf.volume_clear = 'non_existent_volume_clearer'
@@ -530,6 +604,167 @@ class CopyVolumeTestCase(test.TestCase):
                                           'count=5678', 'bs=1234',
                                           'conv=fdatasync', run_as_root=True)
 
+    @mock.patch('cinder.volume.utils.setup_blkio_cgroup',
+                return_value=None)
+    @mock.patch('cinder.volume.utils._calculate_count',
+                return_value=(1234, 5678))
+    @mock.patch('cinder.volume.utils.check_for_odirect_support',
+                return_value=False)
+    @mock.patch('cinder.utils.execute')
+    @mock.patch('cinder.volume.utils.CONF')
+    def test_copy_volume_dd_sparse(self, mock_conf, mock_exec, mock_support,
+                                   mock_count, mock_cg):
+        mock_conf.volume_copy_method = 'dd'
+        volume_utils.copy_volume('/dev/zero', '/dev/null', 1024, 1,
+                                 execute=utils.execute, sparse=True)
+        mock_exec.assert_called_once_with('dd', 'if=/dev/zero', 'of=/dev/null',
+                                          'count=5678', 'bs=1234',
+                                          'conv=sparse', run_as_root=True)
+
+
+class NativeCopyVolumeTestCase(test.TestCase):
+    def setUp(self):
+        super(NativeCopyVolumeTestCase, self).setUp()
+        self.override_config('volume_copy_method', 'native')
+        self.override_config('volume_copy_bps_limit', 0)
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.src = os.path.join(self.tmpdir, 'src')
+        self.dest = os.path.join(self.tmpdir, 'dest')
+        # Data in the 1st and 3rd MiB, a hole in the 2nd and zeros in the
+        # 4th one.
+        self.data = os.urandom(units.Mi)
+        with open(self.src, 'w') as src:
+            src.write(self.data)
+            src.seek(2 * units.Mi)
+            src.write(self.data)
+            src.write('\0' * units.Mi)
+        open(self.dest, 'w').close()
+
+    def _read(self, path):
+        with open(path) as f:
+            return f.read()
+
+    def _assertFileData(self, data, path):
+        # Compare digests, not to dump MiBs of data on failures.
+        self.assertEqual((len(data), hashlib.md5(data).hexdigest()),
+                         (os.path.getsize(path),
+                          hashlib.md5(self._read(path)).hexdigest()))
+
+    @mock.patch('cinder.utils.execute')
+    def test_copy_volume(self, mock_exec):
+        volume_utils.copy_volume(self.src, self.dest, 4, '1M')
+
+        self._assertFileData(self._read(self.src), self.dest)
+        self.assertFalse(mock_exec.called)
+
+    def test_copy_volume_workers(self):
+        self.override_config('volume_copy_workers', 3)
+
+        written, skipped = volume_utils._copy_volume_native(
+            self.src, self.dest, 4, '512K')
+
+        self.assertEqual(4 * units.Mi, written)
+        self.assertEqual(0, skipped)
+        self._assertFileData(self._read(self.src), self.dest)
+
+    def test_copy_volume_sparse(self):
+        written, skipped = volume_utils._copy_volume_native(
+            self.src, self.dest, 4, '1M', sparse=True)
+
+        self.assertEqual(2 * units.Mi, written)
+        self.assertEqual(2 * units.Mi, skipped)
+        self._assertFileData(self._read(self.src), self.dest)
+
+    def test_copy_volume_sparse_trailing_zeros(self):
+        with open(self.src, 'w') as src:
+            src.write(self.data)
+            src.write('\0' * units.Mi)
+
+        written, skipped = volume_utils._copy_volume_native(
+            self.src, self.dest, 4, '1M', sparse=True)
+
+        self.assertEqual(units.Mi, written)
+        self.assertEqual(units.Mi, skipped)
+        self._assertFileData(self._read(self.src), self.dest)
+
+    def test_copy_volume_sparse_workers(self):
+        self.override_config('volume_copy_workers', 3)
+        # Each worker range ends in holes, which must not cut the data
+        # written past them by the next workers.
+        with open(self.src, 'w') as src:
+            for offset in (0, 4, 8):
+                src.seek(offset * units.Mi)
+                src.write(self.data)
+        expected = self._read(self.src)
+
+        for _i in range(10):
+            open(self.dest, 'w').close()
+            written, skipped = volume_utils._copy_volume_native(
+                self.src, self.dest, 9, '1M', sparse=True)
+
+            self.assertEqual(3 * units.Mi, written)
+            self.assertEqual(6 * units.Mi, skipped)
+            self._assertFileData(expected, self.dest)
+
+    def test_copy_volume_short_source_workers(self):
+        self.override_config('volume_copy_workers', 4)
+        with open(self.src, 'w') as src:
+            src.write(self.data[:1000])
+
+        written, skipped = volume_utils._copy_volume_native(
+            self.src, self.dest, 4, '1M', sparse=True)
+
+        self.assertEqual(1000, written)
+        self._assertFileData(self.data[:1000], self.dest)
+
+    def test_copy_volume_short_source(self):
+        with open(self.src, 'w') as src:
+            src.write(self.data[:1000])
+
+        written, skipped = volume_utils._copy_volume_native(
+            self.src, self.dest, 2, '1M')
+
+        self.assertEqual(1000, written)
+        self._assertFileData(self.data[:1000], self.dest)
+
+    def test_clear_volume(self):
+        shutil.copyfile(self.src, self.dest)
+
+        volume_utils.clear_volume(2, self.dest, volume_clear='zero',
+                                  volume_clear_size=0)
+
+        self._assertFileData('\0' * 2 * units.Mi + self.data +
+                             '\0' * units.Mi, self.dest)
+
+    def test_clear_volume_zero_written(self):
+        shutil.copyfile(self.src, self.dest)
+
+        volume_utils.clear_volume(4, self.dest, volume_clear='zero_written',
+                                  volume_clear_size=0,
+                                  volume_clear_ionice=None)
+
+        self._assertFileData('\0' * 4 * units.Mi, self.dest)
+
+    def test_zero_written_range(self):
+        written, skipped, end = volume_utils._zero_written_range(
+            self.src, 0, 4 * units.Mi, units.Mi, False)
+
+        # Only the two MiBs of data are written.
+        self.assertEqual(2 * units.Mi, written)
+        self.assertEqual(2 * units.Mi, skipped)
+        self.assertEqual(4 * units.Mi, end)
+        self._assertFileData('\0' * 4 * units.Mi, self.src)
+
+    @mock.patch('cinder.volume.utils._copy_volume_with_dd')
+    def test_copy_volume_with_ionice_uses_dd(self, mock_dd):
+        volume_utils.copy_volume(self.src, self.dest, 4, '1M', ionice='-c3')
+
+        mock_dd.assert_called_once_with(self.src, self.dest, 4, '1M',
+                                        sync=False, execute=utils.execute,
+                                        ionice='-c3', sparse=False)
+        self.assertEqual('', self._read(self.dest))
+
 
 class BlkioCgroupTestCase(test.TestCase):
     def test_bps_limit_zero(self):
@@ -812,3 +812,76 @@ def retry(exceptions, interval=1, retries=3, backoff_rate=2):
         return _wrapper
 
     return _decorator
+
+
+def _pools_by_name(capabilities):
+    pools = capabilities.get('pools')
+    if not isinstance(pools, list):
+        return None
+    return dict((pool['pool_name'], pool) for pool in pools)
+
+
+def get_capabilities_delta(old, new):
+    """Get the changes between two capability reports of a backend.
+
+    Backend level keys are compared one by one.  Pools are compared as a
+    whole, so only the pools which changed are carried in the delta.
+
+    For example:
+        old = {'vendor_name': 'OpenStack', 'free_capacity_gb': 10,
+               'pools': [{'pool_name': 'a', 'free_capacity_gb': 5},
+                         {'pool_name': 'b', 'free_capacity_gb': 5}]}
+        new = {'vendor_name': 'OpenStack',
+               'pools': [{'pool_name': 'a', 'free_capacity_gb': 4},
+                         {'pool_name': 'b', 'free_capacity_gb': 5}]}
+        ret = get_capabilities_delta(old, new)
+        # ret is {'updated': {}, 'removed': ['free_capacity_gb'],
+        #         'updated_pools': [{'pool_name': 'a',
+        #                            'free_capacity_gb': 4}],
+        #         'removed_pools': []}
+    """
+    old_pools = _pools_by_name(old)
+    new_pools = _pools_by_name(new)
+    compare_pools = old_pools is not None and new_pools is not None
+
+    delta = {'updated': {}, 'removed': [],
+             'updated_pools': [], 'removed_pools': []}
+    for key, value in new.iteritems():
+        if compare_pools and key == 'pools':
+            continue
+        if key not in old or old[key] != value:
+            delta['updated'][key] = value
+    delta['removed'] = [key for key in old if key not in new]
+
+    if compare_pools:
+        delta['updated_pools'] = [pool for pool in new['pools']
+                                  if old_pools.get(pool['pool_name']) != pool]
+        delta['removed_pools'] = [name for name in old_pools
+                                  if name not in new_pools]
+    return delta
+
+
+def apply_capabilities_delta(capabilities, delta):
+    """Build a new capability report from a previous one and a delta.
+
+    The delta is one returned by get_capabilities_delta(), capabilities
+    itself is left untouched.
+    """
+    result = dict((key, value) for key, value in capabilities.iteritems()
+                  if key not in delta['removed'])
+    result.update(delta['updated'])
+
+    if delta['updated_pools'] or delta['removed_pools']:
+        updated_pools = _pools_by_name({'pools': delta['updated_pools']})
+        removed_pools = set(delta['removed_pools'])
+        pools = []
+        for pool in result.get('pools', []):
+            pool_name = pool['pool_name']
+            if pool_name in removed_pools:
+                continue
+            pools.append(updated_pools.pop(pool_name, pool))
+        # Pools reported for the first time
+        pools.extend(pool for pool in delta['updated_pools']
+                     if pool['pool_name'] in updated_pools)
+        result['pools'] = pools
+    return result
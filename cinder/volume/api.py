@@ -374,7 +374,8 @@ class API(base.Base):
         return b
 
     def get_all(self, context, marker=None, limit=None, sort_key='created_at',
-                sort_dir='desc', filters=None, viewable_admin_meta=False):
+                sort_dir='desc', filters=None, viewable_admin_meta=False,
+                use_slave=False):
         check_policy(context, 'get_all')
 
         if filters is None:
@@ -406,7 +407,8 @@ class API(base.Base):
             # Need to remove all_tenants to pass the filtering below.
             del filters['all_tenants']
             volumes = self.db.volume_get_all(context, marker, limit, sort_key,
-                                             sort_dir, filters=filters)
+                                             sort_dir, filters=filters,
+                                             use_slave=use_slave)
         else:
             if viewable_admin_meta:
                 context = context.elevated()
@@ -414,7 +416,8 @@ class API(base.Base):
                                                         context.project_id,
                                                         marker, limit,
                                                         sort_key, sort_dir,
-                                                        filters=filters)
+                                                        filters=filters,
+                                                        use_slave=use_slave)
 
         return volumes
 
@@ -428,31 +431,30 @@ class API(base.Base):
         rv = self.db.volume_get(context, volume_id)
         return dict(rv.iteritems())
 
-    def get_all_snapshots(self, context, search_opts=None):
+    def get_all_snapshots(self, context, search_opts=None, marker=None,
+                          limit=None, sort_key=None, sort_dir=None,
+                          use_slave=False):
         check_policy(context, 'get_all_snapshots')
 
         search_opts = search_opts or {}
 
+        if search_opts:
+            LOG.debug("Searching by: %s" % search_opts)
+
         if (context.is_admin and 'all_tenants' in search_opts):
-            # Need to remove all_tenants to pass the filtering below.
+            # all_tenants is not a snapshot filter.
             del search_opts['all_tenants']
-            snapshots = self.db.snapshot_get_all(context)
+            snapshots = self.db.snapshot_get_all(context,
+                                                 filters=search_opts,
+                                                 marker=marker, limit=limit,
+                                                 sort_key=sort_key,
+                                                 sort_dir=sort_dir,
+                                                 use_slave=use_slave)
         else:
             snapshots = self.db.snapshot_get_all_by_project(
-                context, context.project_id)
-
-        if search_opts:
-            LOG.debug("Searching by: %s" % search_opts)
-
-            results = []
-            not_found = object()
-            for snapshot in snapshots:
-                for opt, value in search_opts.iteritems():
-                    if snapshot.get(opt, not_found) != value:
-                        break
-                else:
-                    results.append(snapshot)
-            snapshots = results
+                context, context.project_id, filters=search_opts,
+                marker=marker, limit=limit, sort_key=sort_key,
+                sort_dir=sort_dir, use_slave=use_slave)
         return snapshots
 
     @wrap_check_policy
@@ -953,6 +955,17 @@ class API(base.Base):
                                                      meta_entry['value']})
         return results
 
+    def get_list_volumes_image_metadata(self, context, volume_id_list,
+                                        use_slave=False):
+        check_policy(context, 'get_volumes_image_metadata')
+        db_data = self.db.volume_glance_metadata_list_get(
+            context, volume_id_list, use_slave=use_slave)
+        results = collections.defaultdict(dict)
+        for meta_entry in db_data:
+            results[meta_entry['volume_id']].update({meta_entry['key']:
+                                                     meta_entry['value']})
+        return results
+
     @wrap_check_policy
     def get_volume_image_metadata(self, context, volume):
         db_data = self.db.volume_glance_metadata_get(context, volume['id'])
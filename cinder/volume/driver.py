@@ -76,7 +76,10 @@ volume_opts = [
     cfg.StrOpt('volume_clear',
                default='zero',
                help='Method used to wipe old volumes (valid options are: '
-                    'none, zero, shred)'),
+                    'none, zero, shred, discard, zero_written). discard '
+                    'only applies to devices whose discarded blocks are '
+                    'zeroed, zero_written only zeroes the blocks which are '
+                    'not zeroed yet, both fall back to zero.'),
     cfg.IntOpt('volume_clear_size',
                default=0,
                help='Size in MiB to wipe at start of old volumes. 0 => all'),
@@ -119,6 +122,18 @@ volume_opts = [
                default=0,
                help='The upper limit of bandwidth of volume copy. '
                     '0 => unlimited'),
+    cfg.StrOpt('volume_copy_method',
+               default='native',
+               choices=['native', 'dd'],
+               help='Method used to copy and zero volumes. native copies '
+                    'within the volume service, skipping the unallocated '
+                    'and zeroed regions of the source when the destination '
+                    'is thin provisioned. dd is used anyway when '
+                    'volume_copy_bps_limit or an ionice flag is set.'),
+    cfg.IntOpt('volume_copy_workers',
+               default=1,
+               help='Number of parallel I/O workers of a native volume '
+                    'copy'),
     cfg.StrOpt('iscsi_write_cache',
                default='on',
                help='Sets the behavior of the iSCSI target to either '
@@ -155,6 +170,21 @@ volume_opts = [
                       'provisioned capacity cannot exceed the total physical '
                       'capacity. A ratio lower than 1.0 will be ignored and '
                       'the default value will be used instead.'),
+    cfg.BoolOpt('image_volume_cache_enabled',
+                default=False,
+                help='Enable the image volume cache for this backend. Volumes '
+                     'created from an image are then cloned from a volume '
+                     'of the image kept by the backend, owned by the Cinder '
+                     'internal tenant, instead of downloading the image '
+                     'each time.'),
+    cfg.IntOpt('image_volume_cache_max_size_gb',
+               default=0,
+               help='Max size of the image volume cache for this backend in '
+                    'GB. 0 => unlimited.'),
+    cfg.IntOpt('image_volume_cache_max_count',
+               default=0,
+               help='Max number of entries allowed in the image volume cache. '
+                    '0 => unlimited.'),
 ]
 
 # for backward compatibility
@@ -227,6 +257,10 @@ class VolumeDriver(object):
 
         self.pools = []
 
+        # Set by drivers whose new volumes read zeros, e.g. thin provisioned
+        # ones, so that copies to them skip the zeroed regions of the source.
+        self.sparse_copy_volume = False
+
         # We set these mappings up in the base driver so they
         # can be used by children
         # (intended for LVM and BlockDevice, but others could use as well)
@@ -446,7 +480,8 @@ class VolumeDriver(object):
                 src_attach_info['device']['path'],
                 dest_attach_info['device']['path'],
                 size_in_mb,
-                self.configuration.volume_dd_blocksize)
+                self.configuration.volume_dd_blocksize,
+                sparse=self.sparse_copy_volume and not dest_remote)
             copy_error = False
         except Exception:
             with excutils.save_and_reraise_exception():
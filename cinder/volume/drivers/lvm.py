@@ -96,6 +96,7 @@ class LVMVolumeDriver(driver.VolumeDriver):
             db=self.db,
             executor=self._execute)
         self.protocol = self.target_driver.protocol
+        self.sparse_copy_volume = self.configuration.lvm_type == 'thin'
 
     def _sizestr(self, size_in_g):
         return '%sg' % size_in_g
@@ -314,7 +315,8 @@ class LVMVolumeDriver(driver.VolumeDriver):
                              self.local_path(volume),
                              snapshot['volume_size'] * units.Ki,
                              self.configuration.volume_dd_blocksize,
-                             execute=self._execute)
+                             execute=self._execute,
+                             sparse=self.sparse_copy_volume)
 
     def delete_volume(self, volume):
         """Deletes a logical volume."""
@@ -410,7 +412,8 @@ class LVMVolumeDriver(driver.VolumeDriver):
                 self.local_path(volume),
                 src_vref['size'] * units.Ki,
                 self.configuration.volume_dd_blocksize,
-                execute=self._execute)
+                execute=self._execute,
+                sparse=self.sparse_copy_volume)
         finally:
             self.delete_snapshot(temp_snapshot)
 
@@ -556,11 +559,13 @@ class LVMVolumeDriver(driver.VolumeDriver):
                                 lvm_mirrors,
                                 dest_vg_ref)
 
+            # copy_volume expects sizes in MiB, we store integer GiB
             volutils.copy_volume(self.local_path(volume),
                                  self.local_path(volume, vg=dest_vg),
-                                 volume['size'],
+                                 volume['size'] * units.Ki,
                                  self.configuration.volume_dd_blocksize,
-                                 execute=self._execute)
+                                 execute=self._execute,
+                                 sparse=lvm_type == 'thin')
             self._delete_volume(volume)
             model_update = self.create_export(ctxt, volume, vg=dest_vg)
 
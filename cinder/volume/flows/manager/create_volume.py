@@ -14,16 +14,19 @@ import traceback
 
 from oslo_concurrency import processutils
 from oslo_config import cfg
+from oslo_utils import excutils
 from oslo_utils import timeutils
 import taskflow.engines
 from taskflow.patterns import linear_flow
 from taskflow.types import failure as ft
 
+from cinder import context as cinder_context
 from cinder import exception
 from cinder import flow_utils
-from cinder.i18n import _, _LE, _LI
+from cinder.i18n import _, _LE, _LI, _LW
 from cinder.image import glance
 from cinder.openstack.common import log as logging
+from cinder import quota
 from cinder import utils
 from cinder.volume.flows import common
 from cinder.volume import utils as volume_utils
@@ -32,6 +35,7 @@ LOG = logging.getLogger(__name__)
 
 ACTION = 'volume:create'
 CONF = cfg.CONF
+QUOTAS = quota.QUOTAS
 
 # These attributes we will attempt to save for the volume if they exist
 # in the source image metadata.
@@ -330,10 +334,11 @@ class CreateVolumeFromSpecTask(flow_utils.CinderTask):
 
     default_provides = 'volume'
 
-    def __init__(self, db, driver):
+    def __init__(self, db, driver, image_volume_cache=None):
         super(CreateVolumeFromSpecTask, self).__init__(addons=[ACTION])
         self.db = db
         self.driver = driver
+        self.image_volume_cache = image_volume_cache
 
     def _handle_bootable_volume_glance_meta(self, context, volume_id,
                                             **kwargs):
@@ -572,6 +577,22 @@ class CreateVolumeFromSpecTask(flow_utils.CinderTask):
                                                        image_location,
                                                        image_meta,
                                                        image_service)
+        internal_context = None
+        should_create_cache_entry = False
+        if not cloned and self.image_volume_cache:
+            internal_context = cinder_context.get_internal_tenant_context()
+            if not internal_context:
+                LOG.warning(_LW('Unable to get Cinder internal context, will '
+                                'not use image-volume cache.'))
+            else:
+                cache_entry = self.image_volume_cache.get_entry(
+                    internal_context, volume_ref, image_id, image_meta)
+                if cache_entry:
+                    model_update, cloned = self._create_from_image_cache(
+                        context, volume_ref, cache_entry)
+                else:
+                    should_create_cache_entry = True
+
         if not cloned:
             # TODO(harlowja): what needs to be rolled back in the clone if this
             # volume create fails?? Likely this should be a subflow or broken
@@ -593,12 +614,122 @@ class CreateVolumeFromSpecTask(flow_utils.CinderTask):
                                'updates': updates})
             self._copy_image_to_volume(context, volume_ref,
                                        image_id, image_location, image_service)
+            if should_create_cache_entry:
+                self._create_image_cache_volume_entry(
+                    internal_context, volume_ref, image_id, image_meta)
 
         self._handle_bootable_volume_glance_meta(context, volume_ref['id'],
                                                  image_id=image_id,
                                                  image_meta=image_meta)
         return model_update
 
+    def _create_from_image_cache(self, context, volume_ref, cache_entry):
+        """Clone the volume from the image volume of a cache entry.
+
+        Returns the model update and whether the volume was cloned; it is
+        not if the image volume cannot be used, the image is then
+        downloaded as without the cache.
+        """
+        image_volume_id = cache_entry['volume_id']
+
+        # Make sure the image volume is not evicted while it is cloned.
+        @utils.synchronized('%s-delete_volume' % image_volume_id,
+                            external=True)
+        def _clone_image_volume():
+            try:
+                image_volume = self.db.volume_get(context, image_volume_id)
+            except exception.VolumeNotFound:
+                LOG.info(_LI('Image volume %(image_volume_id)s of the '
+                             'image-volume cache was deleted.'),
+                         {'image_volume_id': image_volume_id})
+                self.db.image_volume_cache_delete(context, image_volume_id)
+                return None, False
+
+            if image_volume['status'] != 'available':
+                LOG.debug('Image volume %(image_volume_id)s is %(status)s, '
+                          'not using the image-volume cache.',
+                          {'image_volume_id': image_volume_id,
+                           'status': image_volume['status']})
+                return None, False
+            if image_volume['size'] > volume_ref['size']:
+                LOG.debug('Volume %(volume_id)s is smaller than image volume '
+                          '%(image_volume_id)s, not using the image-volume '
+                          'cache.',
+                          {'volume_id': volume_ref['id'],
+                           'image_volume_id': image_volume_id})
+                return None, False
+
+            LOG.debug('Cloning volume %(volume_id)s from image volume '
+                      '%(image_volume_id)s of the image-volume cache.',
+                      {'volume_id': volume_ref['id'],
+                       'image_volume_id': image_volume_id})
+            return self.driver.create_cloned_volume(volume_ref,
+                                                    image_volume), True
+
+        return _clone_image_volume()
+
+    def _create_image_cache_volume_entry(self, internal_context, volume_ref,
+                                         image_id, image_meta):
+        """Create a new image volume and cache entry for it.
+
+        The image volume, owned by the internal tenant, is cloned from the
+        volume described by volume_ref, to which the image has already been
+        downloaded.  Failures are only logged: the volume itself is fine.
+        """
+        try:
+            if not self.image_volume_cache.ensure_space(internal_context,
+                                                        volume_ref['size'],
+                                                        volume_ref['host']):
+                LOG.warning(_LW('Unable to ensure space for image-volume in '
+                                'cache. Will skip creating entry for image '
+                                '%(image)s on host %(host)s.'),
+                            {'image': image_id, 'host': volume_ref['host']})
+                return
+
+            image_volume = self._create_image_volume(internal_context,
+                                                     volume_ref, image_id)
+            self.image_volume_cache.create_cache_entry(internal_context,
+                                                       image_volume,
+                                                       image_id,
+                                                       image_meta)
+        except Exception as e:
+            LOG.warning(_LW('Failed to create new image-volume cache entry '
+                            'for image %(image)s. Error: %(exception)s'),
+                        {'image': image_id, 'exception': e})
+
+    def _create_image_volume(self, internal_context, volume_ref, image_id):
+        reserve_opts = {'volumes': 1, 'gigabytes': volume_ref['size']}
+        QUOTAS.add_volume_type_opts(internal_context, reserve_opts,
+                                    volume_ref['volume_type_id'])
+        reservations = QUOTAS.reserve(internal_context, **reserve_opts)
+        try:
+            image_volume = self.db.volume_create(internal_context, {
+                'size': volume_ref['size'],
+                'user_id': internal_context.user_id,
+                'project_id': internal_context.project_id,
+                'host': volume_ref['host'],
+                'availability_zone': volume_ref['availability_zone'],
+                'volume_type_id': volume_ref['volume_type_id'],
+                'status': 'creating',
+                'attach_status': 'detached',
+                'display_name': 'image-%s' % image_id,
+            })
+            try:
+                model_update = self.driver.create_cloned_volume(image_volume,
+                                                                volume_ref)
+            except Exception:
+                with excutils.save_and_reraise_exception():
+                    self.db.volume_destroy(internal_context,
+                                           image_volume['id'])
+            updates = dict(model_update or dict(), status='available')
+            image_volume = self.db.volume_update(internal_context,
+                                                 image_volume['id'], updates)
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                QUOTAS.rollback(internal_context, reservations)
+        QUOTAS.commit(internal_context, reservations)
+        return image_volume
+
     def _create_raw_volume(self, context, volume_ref, **kwargs):
         return self.driver.create_volume(volume_ref)
 
@@ -711,7 +842,7 @@ def get_flow(context, db, driver, scheduler_rpcapi, host, volume_id,
              allow_reschedule, reschedule_context, request_spec,
              filter_properties, snapshot_id=None, image_id=None,
              source_volid=None, source_replicaid=None,
-             consistencygroup_id=None):
+             consistencygroup_id=None, image_volume_cache=None):
     """Constructs and returns the manager entrypoint flow.
 
     This flow will do the following:
@@ -753,7 +884,8 @@ def get_flow(context, db, driver, scheduler_rpcapi, host, volume_id,
 
     volume_flow.add(ExtractVolumeSpecTask(db),
                     NotifyVolumeActionTask(db, "create.start"),
-                    CreateVolumeFromSpecTask(db, driver),
+                    CreateVolumeFromSpecTask(
+                        db, driver, image_volume_cache=image_volume_cache),
                     CreateVolumeOnFinishTask(db, "create.end"))
 
     # Now load (but do not run) the flow using the provided initial data.
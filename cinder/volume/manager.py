@@ -53,6 +53,7 @@ from cinder import context
 from cinder import exception
 from cinder import flow_utils
 from cinder.i18n import _, _LE, _LI, _LW
+from cinder.image import cache as image_cache
 from cinder.image import glance
 from cinder import manager
 from cinder.openstack.common import log as logging
@@ -206,6 +207,26 @@ class VolumeManager(manager.SchedulerDependentManager):
                 LOG.error("Invalid JSON: %s" %
                           self.driver.configuration.extra_capabilities)
 
+        if self.driver.configuration.safe_get('image_volume_cache_enabled'):
+            max_cache_size = self.driver.configuration.safe_get(
+                'image_volume_cache_max_size_gb')
+            max_cache_entries = self.driver.configuration.safe_get(
+                'image_volume_cache_max_count')
+            # NOTE: cinder.volume.API cannot be imported here, the volume
+            # API module imports this one.
+            self.image_volume_cache = image_cache.ImageVolumeCache(
+                self.db,
+                importutils.import_object(CONF.volume_api_class),
+                max_cache_size,
+                max_cache_entries
+            )
+            LOG.info(_LI('Image-volume cache enabled for host %(host)s.'),
+                     {'host': self.host})
+        else:
+            LOG.info(_LI('Image-volume cache disabled for host %(host)s.'),
+                     {'host': self.host})
+            self.image_volume_cache = None
+
     def _add_to_threadpool(self, func, *args, **kwargs):
         self._tp.spawn_n(func, *args, **kwargs)
 
@@ -375,7 +396,8 @@ class VolumeManager(manager.SchedulerDependentManager):
                 image_id=image_id,
                 source_volid=source_volid,
                 source_replicaid=source_replicaid,
-                consistencygroup_id=consistencygroup_id)
+                consistencygroup_id=consistencygroup_id,
+                image_volume_cache=self.image_volume_cache)
         except Exception:
             LOG.exception(_LE("Failed to create manager volume flow"))
             raise exception.CinderException(
@@ -482,6 +504,13 @@ class VolumeManager(manager.SchedulerDependentManager):
                                       volume_ref['id'],
                                       {'status': 'error_deleting'})
 
+        # If this is an image volume of the cache, drop its cache entry.
+        if self.image_volume_cache:
+            cache_entry = self.image_volume_cache.get_by_image_volume(
+                context, volume_id)
+            if cache_entry:
+                self.db.image_volume_cache_delete(context, volume_id)
+
         # If deleting the source volume in a migration, we want to skip quotas
         # and other database updates.
         if volume_ref['migration_status']:
@@ -525,7 +554,7 @@ class VolumeManager(manager.SchedulerDependentManager):
             self.stats['pools'][pool] = dict(
                 allocated_capacity_gb=-size)
 
-        self.publish_service_capabilities(context)
+        self.publish_service_capabilities(context, full_report=False)
 
         return True
 
@@ -1267,8 +1296,14 @@ class VolumeManager(manager.SchedulerDependentManager):
 
                 pool.update(pool_stats)
 
-    def publish_service_capabilities(self, context):
-        """Collect driver status and then publish."""
+    def publish_service_capabilities(self, context, full_report=True):
+        """Collect driver status and then publish.
+
+        Schedulers call this to ask for a full report; the volume manager
+        itself only publishes what changed since the last update.
+        """
+        if full_report:
+            self.reset_published_capabilities()
         self._report_driver_status(context)
         self._publish_service_capabilities(context)
 
@@ -1513,7 +1548,7 @@ class VolumeManager(manager.SchedulerDependentManager):
             QUOTAS.commit(context, old_reservations, project_id=project_id)
         if new_reservations:
             QUOTAS.commit(context, new_reservations, project_id=project_id)
-        self.publish_service_capabilities(context)
+        self.publish_service_capabilities(context, full_report=False)
 
     def manage_existing(self, ctxt, volume_id, ref=None):
         LOG.debug('manage_existing: managing %s.' % ref)
@@ -1806,7 +1841,7 @@ class VolumeManager(manager.SchedulerDependentManager):
                  group_id)
         self._notify_about_consistencygroup_usage(
             context, group_ref, "delete.end")
-        self.publish_service_capabilities(context)
+        self.publish_service_capabilities(context, full_report=False)
 
         return True
 
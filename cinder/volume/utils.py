@@ -15,18 +15,29 @@
 """Volume-related Utilities and helpers."""
 
 
+import contextlib
+import errno
+import fcntl
+import functools
+import io
 import math
+import mmap
+import os
+import stat
 
 from Crypto.Random import random
+import eventlet
+from eventlet import tpool
 from oslo_concurrency import processutils
 from oslo_config import cfg
+from oslo_utils import excutils
 from oslo_utils import strutils
 from oslo_utils import timeutils
 from oslo_utils import units
 
 from cinder.brick.local_dev import lvm as brick_lvm
 from cinder import exception
-from cinder.i18n import _, _LI, _LW
+from cinder.i18n import _, _LE, _LI, _LW
 from cinder.openstack.common import log as logging
 from cinder import rpc
 from cinder import utils
@@ -332,8 +343,255 @@ def check_for_odirect_support(src, dest, flag='oflag=direct'):
         return False
 
 
-def copy_volume(srcstr, deststr, size_in_m, blocksize, sync=False,
-                execute=utils.execute, ionice=None):
+# Linux values of the SEEK_DATA and SEEK_HOLE whence of lseek(), which the
+# os module of Python 2 does not define.
+SEEK_DATA = getattr(os, 'SEEK_DATA', 3)
+SEEK_HOLE = getattr(os, 'SEEK_HOLE', 4)
+
+# O_DIRECT I/O must be aligned on the logical block size of the devices,
+# 4096 bytes covers both 512 byte and 4K sector devices.
+DIRECT_IO_ALIGNMENT = 4096
+
+
+def _open_volume_path(path, flags, direct=True):
+    """Open path, with O_DIRECT when possible.
+
+    Returns the file descriptor and whether O_DIRECT is used.
+    """
+    if direct and hasattr(os, 'O_DIRECT'):
+        try:
+            return os.open(path, flags | os.O_DIRECT), True
+        except OSError as e:
+            if e.errno != errno.EINVAL:
+                raise
+    return os.open(path, flags), False
+
+
+def _next_data_extent(fd, offset, end):
+    """Return the bounds of the first data extent of fd after offset.
+
+    Returns None if the file system does not report holes, block devices
+    report a single data extent.
+    """
+    try:
+        data_start = os.lseek(fd, offset, SEEK_DATA)
+    except OSError as e:
+        if e.errno == errno.ENXIO:
+            # Only a hole is left after offset.
+            return end, end
+        if e.errno == errno.EINVAL:
+            return None
+        raise
+    data_end = os.lseek(fd, data_start, SEEK_HOLE)
+    return min(data_start, end), min(data_end, end)
+
+
+def _disable_odirect(fd):
+    flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+    fcntl.fcntl(fd, fcntl.F_SETFL, flags & ~os.O_DIRECT)
+
+
+def _copy_volume_range(srcstr, deststr, start, end, blocksize, sparse,
+                       sync):
+    """Copy the bytes [start, end) of srcstr to deststr.
+
+    Zeros are written if srcstr is None.  With sparse, the destination
+    must read zeros where it is not written to, and neither the holes nor
+    the zeroed blocks of the source are written.  Returns the number of
+    bytes written and skipped, and the offset the copy ended at.
+    """
+    # Anonymous mappings are page aligned, as O_DIRECT requires.
+    buf = mmap.mmap(-1, blocksize)
+    zeros = '\0' * blocksize
+    direct = blocksize % DIRECT_IO_ALIGNMENT == 0
+    src_fd = None
+    if srcstr is not None:
+        src_fd, _direct = _open_volume_path(srcstr, os.O_RDONLY, direct)
+        src_file = io.FileIO(src_fd, 'r', closefd=False)
+        src_stat = os.fstat(src_fd)
+        if stat.S_ISREG(src_stat.st_mode):
+            end = min(end, src_stat.st_size)
+    try:
+        dest_fd, direct = _open_volume_path(deststr, os.O_WRONLY, direct)
+    except Exception:
+        with excutils.save_and_reraise_exception():
+            if src_fd is not None:
+                os.close(src_fd)
+
+    written = skipped = 0
+    offset = start
+    data_end = start
+    seek_data = sparse and src_fd is not None
+    try:
+        while offset < end:
+            if seek_data and offset >= data_end:
+                extent = _next_data_extent(src_fd, offset, end)
+                if extent is None:
+                    seek_data = False
+                else:
+                    data_start, data_end = extent
+                    # Skip whole blocks of holes only.
+                    data_start -= (data_start - start) % blocksize
+                    if data_start > offset:
+                        skipped += data_start - offset
+                        offset = data_start
+                        continue
+
+            length = min(blocksize, end - offset)
+            if src_fd is not None:
+                os.lseek(src_fd, offset, os.SEEK_SET)
+                # A short read is the end of the source, as for dd.
+                length = min(src_file.readinto(buf), length)
+                if not length:
+                    break
+                if sparse and (buffer(buf, 0, length) ==
+                               buffer(zeros, 0, length)):
+                    skipped += length
+                    offset += length
+                    continue
+
+            if direct and length % DIRECT_IO_ALIGNMENT:
+                _disable_odirect(dest_fd)
+                direct = False
+            os.lseek(dest_fd, offset, os.SEEK_SET)
+            data = buffer(buf, 0, length)
+            while data:
+                data = data[os.write(dest_fd, data):]
+            written += length
+            offset += length
+            if length < blocksize and offset < end:
+                break
+
+        if sync:
+            os.fsync(dest_fd)
+    finally:
+        os.close(dest_fd)
+        if src_fd is not None:
+            os.close(src_fd)
+        buf.close()
+
+    # A range past the end of the source ends where the source does.
+    return written, skipped, min(offset, end)
+
+
+def _zero_written_range(path, start, end, blocksize, sync):
+    """Zero the blocks of [start, end) of path which are not zeroed yet.
+
+    Returns the number of bytes written and skipped, and the offset the
+    zeroing ended at.
+    """
+    buf = mmap.mmap(-1, blocksize)
+    zeros = mmap.mmap(-1, blocksize)
+    fd, direct = _open_volume_path(path, os.O_RDWR,
+                                   blocksize % DIRECT_IO_ALIGNMENT == 0)
+    volume_file = io.FileIO(fd, 'r+', closefd=False)
+    written = skipped = 0
+    offset = start
+    try:
+        while offset < end:
+            os.lseek(fd, offset, os.SEEK_SET)
+            length = min(volume_file.readinto(buf), end - offset)
+            if not length:
+                break
+            if buffer(buf, 0, length) == buffer(zeros, 0, length):
+                skipped += length
+            else:
+                if direct and length % DIRECT_IO_ALIGNMENT:
+                    _disable_odirect(fd)
+                    direct = False
+                os.lseek(fd, offset, os.SEEK_SET)
+                data = buffer(zeros, 0, length)
+                while data:
+                    data = data[os.write(fd, data):]
+                written += length
+            offset += length
+
+        if sync:
+            os.fsync(fd)
+    finally:
+        os.close(fd)
+        buf.close()
+        zeros.close()
+
+    return written, skipped, offset
+
+
+def _run_volume_io(func, srcstr, deststr, size_in_m, blocksize, *args):
+    """Run func on the ranges of a volume split between I/O workers.
+
+    func is called with srcstr if not None, deststr, the bounds of its
+    range, the block size in bytes and args, in native threads not to
+    block the other greenthreads.  It returns the number of bytes written
+    and skipped and the offset it ended at.  Returns the total number of
+    bytes written and skipped.
+    """
+    blocksize, count = _calculate_count(size_in_m, blocksize)
+    bs = int(strutils.string_to_bytes('%sB' % blocksize))
+    size = int(size_in_m * units.Mi)
+    workers = max(1, min(CONF.volume_copy_workers, count))
+    worker_size = int(math.ceil(float(count) / workers)) * bs
+    ranges = [(start, min(start + worker_size, size))
+              for start in range(0, size, worker_size)]
+
+    paths = [path for path in (srcstr, deststr) if path is not None]
+    with contextlib.nested(*[utils.temporary_chown(path)
+                             for path in paths]):
+        threads = [eventlet.spawn(tpool.execute, func,
+                                  *(paths + [start, end, bs] + list(args)))
+                   for start, end in ranges]
+        results = []
+        failure = None
+        for thread in threads:
+            try:
+                results.append(thread.wait())
+            except Exception as e:
+                LOG.error(_LE('I/O on %(paths)s failed: %(error)s'),
+                          {'paths': paths, 'error': e})
+                failure = failure or e
+        if failure:
+            raise failure
+
+        # Once every worker is done, so that none of them truncates what
+        # another one wrote past its range.
+        _extend_regular_file(deststr, max(end for _written, _skipped, end
+                                          in results))
+
+    return (sum(written for written, _skipped, _end in results),
+            sum(skipped for _written, skipped, _end in results))
+
+
+def _extend_regular_file(path, size):
+    """Extend path to size if it is a shorter regular file.
+
+    Blocks skipped at the end of a sparse copy must still be allocated.
+    """
+    fd = os.open(path, os.O_WRONLY)
+    try:
+        path_stat = os.fstat(fd)
+        if stat.S_ISREG(path_stat.st_mode) and path_stat.st_size < size:
+            os.ftruncate(fd, size)
+            os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _copy_volume_native(srcstr, deststr, size_in_m, blocksize, sync=False,
+                        sparse=False):
+    """Copy a volume within this process.
+
+    Returns the number of bytes written and skipped.
+    """
+    if srcstr == '/dev/zero':
+        srcstr = None
+        func = functools.partial(_copy_volume_range, None)
+    else:
+        func = _copy_volume_range
+    return _run_volume_io(func, srcstr, deststr, size_in_m, blocksize,
+                          sparse, sync)
+
+
+def _copy_volume_with_dd(srcstr, deststr, size_in_m, blocksize, sync=False,
+                         execute=utils.execute, ionice=None, sparse=False):
     # Use O_DIRECT to avoid thrashing the system buffer cache
     extra_flags = []
     if check_for_odirect_support(srcstr, deststr, 'iflag=direct'):
@@ -348,6 +606,9 @@ def copy_volume(srcstr, deststr, size_in_m, blocksize, sync=False,
     if sync and not extra_flags:
         extra_flags.append('conv=fdatasync')
 
+    if sparse:
+        extra_flags.append('conv=sparse')
+
     blocksize, count = _calculate_count(size_in_m, blocksize)
 
     cmd = ['dd', 'if=%s' % srcstr, 'of=%s' % deststr,
@@ -361,24 +622,94 @@ def copy_volume(srcstr, deststr, size_in_m, blocksize, sync=False,
     if cgcmd:
         cmd = cgcmd + cmd
 
-    # Perform the copy
-    start_time = timeutils.utcnow()
     execute(*cmd, run_as_root=True)
+
+
+def _use_native_copy(ionice):
+    # The blkio cgroup and ionice only apply to an external command.
+    return (CONF.volume_copy_method == 'native' and ionice is None and
+            not CONF.volume_copy_bps_limit)
+
+
+def copy_volume(srcstr, deststr, size_in_m, blocksize, sync=False,
+                execute=utils.execute, ionice=None, sparse=False):
+    """Copy size_in_m MiB from srcstr to deststr.
+
+    Set sparse when the destination reads zeros where it was not written
+    to, e.g. a new thin provisioned volume, so that the unallocated and
+    zeroed regions of the source are not copied.  dd is used instead of
+    the native copy when the copy is throttled or given an ionice flag.
+    execute only applies to dd, the native copy runs in this process.
+    """
+    start_time = timeutils.utcnow()
+    if _use_native_copy(ionice):
+        written, skipped = _copy_volume_native(srcstr, deststr, size_in_m,
+                                               blocksize, sync=sync,
+                                               sparse=sparse)
+        written_m = float(written) / units.Mi
+        skipped_m = float(skipped) / units.Mi
+    else:
+        _copy_volume_with_dd(srcstr, deststr, size_in_m, blocksize,
+                             sync=sync, execute=execute, ionice=ionice,
+                             sparse=sparse)
+        written_m = size_in_m
+        skipped_m = 0
     duration = timeutils.delta_seconds(start_time, timeutils.utcnow())
 
     # NOTE(jdg): use a default of 1, mostly for unit test, but in
     # some incredible event this is 0 (cirros image?) don't barf
     if duration < 1:
         duration = 1
-    mbps = (size_in_m / duration)
+    mbps = (written_m / duration)
     mesg = ("Volume copy details: src %(src)s, dest %(dest)s, "
-            "size %(sz).2f MB, duration %(duration).2f sec")
+            "size %(sz).2f MB, skipped %(skipped).2f MB, "
+            "duration %(duration).2f sec")
     LOG.debug(mesg % {"src": srcstr,
                       "dest": deststr,
                       "sz": size_in_m,
+                      "skipped": skipped_m,
                       "duration": duration})
     mesg = _("Volume copy %(size_in_m).2f MB at %(mbps).2f MB/s")
-    LOG.info(mesg % {'size_in_m': size_in_m, 'mbps': mbps})
+    LOG.info(mesg % {'size_in_m': written_m, 'mbps': mbps})
+
+
+def _discard_zeroes_data(path):
+    """Whether the discarded blocks of a block device read as zeros."""
+    try:
+        devnum = utils.get_blkdev_major_minor(path, lookup_for_file=False)
+    except (OSError, exception.Error):
+        return False
+    if not devnum:
+        return False
+
+    queue_dir = '/sys/dev/block/%s/queue' % devnum
+    try:
+        with open(os.path.join(queue_dir, 'discard_max_bytes')) as f:
+            discard_max_bytes = int(f.read())
+        with open(os.path.join(queue_dir, 'discard_zeroes_data')) as f:
+            discard_zeroes_data = int(f.read())
+    except (IOError, ValueError):
+        return False
+    return bool(discard_max_bytes and discard_zeroes_data)
+
+
+def _zero_volume_written(volume_path, volume_clear_size):
+    """Zero the blocks of a volume which are not zeroed yet.
+
+    Blocks are read before being zeroed, the unallocated blocks of thin
+    provisioned devices and those never written to since the volume was
+    last cleared are read as zeros and not written.
+    """
+    start_time = timeutils.utcnow()
+    written, skipped = _run_volume_io(_zero_written_range, None,
+                                      volume_path, volume_clear_size,
+                                      CONF.volume_dd_blocksize, True)
+    duration = max(timeutils.delta_seconds(start_time, timeutils.utcnow()),
+                   1)
+    LOG.info(_LI('Zeroed %(written).2f MB of volume %(path)s in %(duration)'
+                 '.2f sec, %(skipped).2f MB were already zeroed.'),
+             {'written': float(written) / units.Mi, 'path': volume_path,
+              'duration': duration, 'skipped': float(skipped) / units.Mi})
 
 
 def clear_volume(volume_size, volume_path, volume_clear=None,
@@ -398,15 +729,33 @@ def clear_volume(volume_size, volume_path, volume_clear=None,
 
     LOG.info(_LI("Performing secure delete on volume: %s") % volume_path)
 
+    if volume_clear == 'discard' and not _discard_zeroes_data(volume_path):
+        LOG.warning(_LW('Discarded blocks of %s are not guaranteed to be '
+                        'zeroed, zeroing the volume instead.'), volume_path)
+        volume_clear = 'zero'
+    elif (volume_clear == 'zero_written' and
+            not _use_native_copy(volume_clear_ionice)):
+        LOG.warning(_LW('Only a native volume copy without throttling nor '
+                        'ionice can find the written blocks of %s, zeroing '
+                        'the whole volume instead.'), volume_path)
+        volume_clear = 'zero'
+
     if volume_clear == 'zero':
         return copy_volume('/dev/zero', volume_path, volume_clear_size,
                            CONF.volume_dd_blocksize,
                            sync=True, execute=utils.execute,
                            ionice=volume_clear_ionice)
+    elif volume_clear == 'zero_written':
+        return _zero_volume_written(volume_path,
+                                    volume_clear_size or volume_size)
     elif volume_clear == 'shred':
         clear_cmd = ['shred', '-n3']
         if volume_clear_size:
             clear_cmd.append('-s%dMiB' % volume_clear_size)
+    elif volume_clear == 'discard':
+        clear_cmd = ['blkdiscard']
+        if volume_clear_size:
+            clear_cmd.extend(['-l', '%d' % (volume_clear_size * units.Mi)])
     else:
         raise exception.InvalidConfigurationValue(
             option='volume_clear',
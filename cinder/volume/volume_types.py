@@ -29,6 +29,7 @@ from cinder import db
 from cinder import exception
 from cinder.i18n import _, _LE
 from cinder.openstack.common import log as logging
+from cinder import quota
 
 
 CONF = cfg.CONF
@@ -55,6 +56,7 @@ def create(context,
         LOG.exception(_LE('DB error: %s') % six.text_type(e))
         raise exception.VolumeTypeCreateFailed(name=name,
                                                extra_specs=extra_specs)
+    quota.QUOTAS.invalidate_resources()
     return type_ref
 
 
@@ -80,6 +82,7 @@ def destroy(context, id):
         raise exception.InvalidVolumeType(reason=msg)
     else:
         db.volume_type_destroy(context, id)
+        quota.QUOTAS.invalidate_resources()
 
 
 def get_all_types(context, inactive=0, search_opts=None):
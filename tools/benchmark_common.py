@@ -0,0 +1,26 @@
+# Copyright (c) 2015 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Helpers shared by the benchmark and simulator tools."""
+
+import math
+
+
+def percentile(sorted_values, fraction):
+    """Return the value below which fraction of sorted_values fall."""
+    if not sorted_values:
+        return 0.0
+    index = int(math.ceil(fraction * len(sorted_values))) - 1
+    return sorted_values[max(index, 0)]
@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+# Copyright (c) 2015 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Offline simulator for the filter scheduler.
+
+Builds a synthetic fleet of hosts and pools in an in-memory SQLite database,
+replays a stream of volume create requests through FilterScheduler and
+reports placement latency, throughput and how capacity ended up spread
+across the pools.  Fleet and requests are generated from a seed, so two runs
+with the same arguments place the same volumes on the same pools.
+
+Example:
+
+    python tools/scheduler_simulator.py --hosts 100 --pools 10 \\
+        --requests 5000 --weighers CapacityWeigher,VolumeNumberWeigher
+"""
+
+from __future__ import print_function
+
+import argparse
+import math
+import random
+import sys
+import time
+
+from oslo.messaging import conffixture as messaging_conffixture
+from oslo_config import cfg
+from oslo_utils import timeutils
+
+from cinder import context
+from cinder import db
+from cinder.db import migration
+from cinder import exception
+from cinder import rpc
+from cinder.scheduler import driver
+from cinder.scheduler import filter_scheduler
+
+from benchmark_common import percentile
+
+
+CONF = cfg.CONF
+CONF.import_opt('scheduler_default_filters', 'cinder.scheduler.host_manager')
+CONF.import_opt('scheduler_default_weighers', 'cinder.scheduler.host_manager')
+
+CAPACITIES_GB = [1024, 2048, 4096, 8192, 16384]
+VOLUME_SIZES_GB = [1, 1, 5, 10, 10, 20, 50, 100, 500]
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--hosts', type=int, default=50,
+                        help='Number of volume hosts in the fleet.')
+    parser.add_argument('--pools', type=int, default=4,
+                        help='Number of pools on each host.')
+    parser.add_argument('--backends', type=int, default=3,
+                        help='Number of distinct volume_backend_name values, '
+                             'one volume type is created for each.')
+    parser.add_argument('--requests', type=int, default=1000,
+                        help='Number of volume create requests to replay.')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed for the fleet and request generators.')
+    parser.add_argument('--filters', default=None,
+                        help='Comma separated scheduler filters, defaults '
+                             'to scheduler_default_filters.')
+    parser.add_argument('--weighers', default=None,
+                        help='Comma separated scheduler weighers, defaults '
+                             'to scheduler_default_weighers.')
+    return parser.parse_args(argv)
+
+
+def setup(args):
+    CONF([], project='cinder', default_config_files=[])
+    CONF.set_override('connection', 'sqlite://', 'database')
+    CONF.set_override('sqlite_synchronous', False, 'database')
+    # Nothing is sent to the volume services, so the fake transport is
+    # enough to build the RPC clients the scheduler needs.
+    messaging_conf = messaging_conffixture.ConfFixture(CONF)
+    messaging_conf.setUp()
+    messaging_conf.transport_driver = 'fake'
+    # Tracing is left to the operator, it is not what is being measured.
+    CONF.set_override('scheduler_trace_history', 0)
+    if args.filters:
+        CONF.set_override('scheduler_default_filters',
+                          args.filters.split(','))
+    if args.weighers:
+        CONF.set_override('scheduler_default_weighers',
+                          args.weighers.split(','))
+    rpc.init(CONF)
+    migration.db_sync()
+
+
+def build_fleet(ctxt, scheduler, args, rng):
+    """Create a service for each host and report its pools' capabilities."""
+    now = timeutils.utcnow()
+    for host_index in range(args.hosts):
+        backend_name = 'backend%d' % (host_index % args.backends)
+        host = 'simhost%d@%s' % (host_index, backend_name)
+        db.service_create(ctxt, {'host': host,
+                                 'binary': 'cinder-volume',
+                                 'topic': CONF.volume_topic,
+                                 'availability_zone': 'nova'})
+        pools = []
+        for pool_index in range(args.pools):
+            total = rng.choice(CAPACITIES_GB)
+            free = total - rng.randint(0, total // 2)
+            thin = rng.random() < 0.5
+            pools.append({
+                'pool_name': 'pool%d' % pool_index,
+                'total_capacity_gb': total,
+                'free_capacity_gb': free,
+                'allocated_capacity_gb': total - free,
+                'provisioned_capacity_gb': total - free,
+                'reserved_percentage': rng.choice([0, 5, 10]),
+                'thin_provisioning_support': thin,
+                'thick_provisioning_support': not thin,
+                'max_over_subscription_ratio': 20.0 if thin else 1.0,
+                'QoS_support': False,
+            })
+        capabilities = {'volume_backend_name': backend_name,
+                        'vendor_name': 'OpenStack',
+                        'driver_version': '1.0',
+                        'storage_protocol': 'iSCSI',
+                        'timestamp': now,
+                        'pools': pools}
+        scheduler.update_service_capabilities('volume', host, capabilities)
+
+
+def build_requests(args, rng):
+    volume_types = [{'name': 'type%d' % index,
+                     'extra_specs': {'volume_backend_name':
+                                     'backend%d' % index}}
+                    for index in range(args.backends)]
+    for _index in range(args.requests):
+        yield {'volume_type': rng.choice(volume_types),
+               'volume_properties': {'project_id': 'simproject',
+                                     'user_id': 'simuser',
+                                     'size': rng.choice(VOLUME_SIZES_GB)}}
+
+
+def replay(ctxt, scheduler, requests):
+    """Place each request.
+
+    Returns the time spent choosing a host for each request, the total time
+    spent placing volumes, including recording the chosen host in the
+    database, and the number of requests no host was found for.
+    """
+    latencies = []
+    placement_time = 0.0
+    failures = 0
+    for request_spec in requests:
+        volume = db.volume_create(
+            ctxt, dict(request_spec['volume_properties'],
+                       status='creating'))
+        request_spec['volume_id'] = volume['id']
+
+        start = time.time()
+        try:
+            weighed_host = scheduler._schedule(ctxt, request_spec, {})
+        except exception.NoValidHost:
+            weighed_host = None
+        latencies.append(time.time() - start)
+
+        if weighed_host:
+            driver.volume_update_db(ctxt, volume['id'],
+                                    weighed_host.obj.host)
+        else:
+            failures += 1
+        placement_time += time.time() - start
+    return latencies, placement_time, failures
+
+
+def report(ctxt, scheduler, latencies, placement_time, failures):
+    latencies = sorted(latencies)
+    placed = len(latencies) - failures
+    print('requests:            %d' % len(latencies))
+    print('placed:              %d' % placed)
+    print('no valid host:       %d' % failures)
+    print('schedule p50:        %.3f ms' % (percentile(latencies, 0.5) * 1000))
+    print('schedule p99:        %.3f ms' % (percentile(latencies, 0.99) *
+                                            1000))
+    print('placements/second:   %.1f' % (placed / placement_time
+                                         if placement_time else 0))
+
+    pools = list(scheduler.host_manager.get_all_host_states(ctxt))
+    used = []
+    for pool in pools:
+        if pool.total_capacity_gb:
+            used.append(1.0 - (float(pool.free_capacity_gb) /
+                               pool.total_capacity_gb))
+    if used:
+        mean = sum(used) / len(used)
+        stddev = math.sqrt(sum((u - mean) ** 2 for u in used) / len(used))
+        print('pool usage min/mean/max: %.1f%% / %.1f%% / %.1f%%' %
+              (min(used) * 100, mean * 100, max(used) * 100))
+        print('pool usage stddev:   %.1f%%' % (stddev * 100))
+
+    hosts = [pool.host for pool in pools]
+    counts = db.volume_count_get_by_host(ctxt, hosts)
+    if hosts:
+        volumes = [counts.get(host, 0) for host in hosts]
+        print('volumes per pool min/max: %d / %d' %
+              (min(volumes), max(volumes)))
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    setup(args)
+
+    rng = random.Random(args.seed)
+    # ChanceWeigher uses the module level generator.
+    random.seed(args.seed)
+
+    ctxt = context.get_admin_context()
+    scheduler = filter_scheduler.FilterScheduler()
+    build_fleet(ctxt, scheduler, args, rng)
+
+    latencies, placement_time, failures = replay(
+        ctxt, scheduler, build_requests(args, rng))
+
+    report(ctxt, scheduler, latencies, placement_time, failures)
+
+
+if __name__ == '__main__':
+    main()